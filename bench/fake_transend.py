@@ -0,0 +1,276 @@
+"""Fake Transend API for offline benchmarks.
+
+Serves deterministic synthetic data for the endpoints the MCP server uses,
+with per-route latency, jitter, error rate and payload size taken from a
+profile (see profile.json). Run it on its own and point the server at it:
+
+    python bench/fake_transend.py --port 8765 &
+    TRANSEND_BASE_URL=http://127.0.0.1:8765 uv run server.py
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+YEARS = list(range(2005, 2025))
+MAKES = {
+    "Ford": ["F-150", "Escape", "Explorer", "Focus", "Mustang"],
+    "Toyota": ["Camry", "Corolla", "RAV4", "Tacoma", "Highlander"],
+    "Honda": ["Accord", "Civic", "CR-V", "Odyssey", "Pilot"],
+    "Chevrolet": ["Silverado", "Malibu", "Equinox", "Tahoe", "Impala"],
+    "Nissan": ["Altima", "Sentra", "Rogue", "Pathfinder", "Frontier"],
+    "Dodge": ["Ram 1500", "Charger", "Durango", "Grand Caravan", "Journey"],
+}
+BRANCHES = [str(n).zfill(3) for n in range(1, 41)]
+ITEMS = [f"ITEM-{n:05d}" for n in range(1, 501)]
+VINS = [f"1FAKEVIN{n:09d}" for n in range(1, 201)]
+
+# Route name, HTTP method, path pattern. Profiles configure routes by name.
+ROUTES: List[Tuple[str, str, "re.Pattern[str]"]] = [
+    (name, method, re.compile(f"^{pattern}$")) for name, method, pattern in [
+        ("vehicle.years", "GET", r"/vehicle/years"),
+        ("vehicle.makes", "GET", r"/vehicle/make/(?P<vhid>[^/]+)"),
+        ("vehicle.models", "GET", r"/vehicle/model/(?P<vhid>[^/]+)"),
+        ("vehicle.submodels", "GET", r"/vehicle/submodel/(?P<vhid>[^/]+)"),
+        ("vehicle.engines", "GET", r"/vehicle/engine/(?P<vhid>[^/]+)"),
+        ("vehicle.drive_types", "GET", r"/vehicle/drivetype/(?P<vhid>[^/]+)"),
+        ("vehicle.vin", "GET", r"/vehicle/vin/(?P<vin>[^/]+)"),
+        ("vehicle.dtcs", "GET", r"/vehicle/dtcs"),
+        ("vehicle.transmissions", "GET", r"/vehicle/transmission"),
+        ("vehicle.vehicle", "GET", r"/vehicle/(?P<vhid>[^/]+)"),
+        ("product.quantity", "GET", r"/product/quantity/available"),
+        ("product.availability", "GET", r"/product/(?P<item>[^/]+)/availability"),
+        ("product.tags", "GET", r"/product/tag"),
+        ("product.sort_types", "GET", r"/product/sort/type"),
+        ("product.brands", "GET", r"/product/brand"),
+        ("product.categories", "GET", r"/product/category"),
+        ("branch.all", "GET", r"/branch/?"),
+        ("branch.one", "GET", r"/branch/(?P<number>[^/]+)"),
+        ("content.articles", "GET", r"/content/article"),
+        ("account.customer", "GET", r"/account/customer/current"),
+    ]
+]
+
+DEFAULT_PROFILE: Dict[str, Any] = {
+    "seed": 0,
+    "default": {"latency_ms": 30, "jitter_ms": 10, "error_rate": 0.0},
+    "routes": {},
+    "payload": {"dtcs": 2000, "tags": 150, "articles": 100, "pad_bytes": 0},
+}
+
+
+def make_vhid(*parts: Any) -> str:
+    """Stable synthetic vhid for a year, make or model"""
+    return hashlib.sha1("/".join(map(str, parts)).encode()).hexdigest()[:12]
+
+
+def _stable_int(*parts: Any) -> int:
+    """Deterministic number derived from request arguments"""
+    return int(hashlib.sha1("/".join(map(str, parts)).encode()).hexdigest()[:8], 16)
+
+
+class Catalog:
+    """Synthetic Transend data, indexed by vhid."""
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+        self.pad = "x" * int(payload.get("pad_bytes", 0))
+        self.makes: Dict[str, List[Dict]] = {}
+        self.models: Dict[str, List[Dict]] = {}
+        self.vehicles: Dict[str, Dict] = {}
+        for year in YEARS:
+            year_vhid = make_vhid(year)
+            self.makes[year_vhid] = []
+            for make, models in MAKES.items():
+                make_id = make_vhid(year, make)
+                self.makes[year_vhid].append({"name": make, "vhid": make_id})
+                self.models[make_id] = []
+                for model in models:
+                    model_vhid = make_vhid(year, make, model)
+                    self.models[make_id].append({"name": model, "vhid": model_vhid})
+                    self.vehicles[model_vhid] = {"vhid": model_vhid, "year": year, "make": make, "model": model}
+        self.vehicle_vhids = sorted(self.vehicles)
+
+    def row(self, **fields) -> Dict[str, Any]:
+        """A record, padded to the configured payload size"""
+        if self.pad:
+            fields["notes"] = self.pad
+        return fields
+
+    def branch(self, number: str) -> Dict[str, Any]:
+        """A branch record, placed at a stable point within a few hundred miles of Dallas"""
+        return self.row(branchNumber=number, name=f"Branch {number}", active=True,
+                        latitude=round(29.0 + _stable_int("lat", number) % 6000 / 1000, 4),
+                        longitude=round(-100.0 + _stable_int("lng", number) % 8000 / 1000, 4))
+
+    def respond(self, route: str, match: Dict[str, str], query: Dict[str, str]) -> Any:
+        """
+        Build the response body of a route.
+
+        Returns:
+            The JSON body, or None for an unknown id (served as 404)
+        """
+        if route == "vehicle.years":
+            return [{"year": year, "vhid": make_vhid(year)} for year in YEARS]
+        if route == "vehicle.makes":
+            return self.makes.get(match["vhid"], [])
+        if route == "vehicle.models":
+            return self.models.get(match["vhid"], [])
+        if route == "vehicle.vehicle":
+            return self.vehicles.get(match["vhid"])
+        if route in ("vehicle.engines", "vehicle.drive_types", "vehicle.submodels"):
+            kind = route.split(".")[1]
+            count = 1 + _stable_int(kind, match["vhid"]) % 4
+            return [self.row(id=n, name=f"{kind} {n}", vhid=match["vhid"]) for n in range(count)]
+        if route == "vehicle.vin":
+            vhid = self.vehicle_vhids[_stable_int(match["vin"]) % len(self.vehicle_vhids)]
+            return [{"vin": match["vin"], "vhid": vhid}]
+        if route == "vehicle.dtcs":
+            return [self.row(code=f"P{n:04d}", description=f"Synthetic trouble code {n} transmission circuit")
+                    for n in range(int(self.payload.get("dtcs", 2000)))]
+        if route == "vehicle.transmissions":
+            return [self.row(tagNumber=f"T{n}", transmissionMfrCode=f"M{n % 7}") for n in range(50)]
+        if route == "product.quantity":
+            item, branch = query.get("itemId", ""), query.get("branchNumber", "")
+            return {"itemId": item, "branchNumber": branch, "quantity": _stable_int(item, branch) % 25}
+        if route == "product.availability":
+            return [{"itemId": match["item"], "branchNumber": branch, "available": _stable_int(match["item"], branch) % 3 > 0}
+                    for branch in BRANCHES[:5]]
+        if route == "product.tags":
+            return [self.row(id=n, name=f"Tag {n}") for n in range(int(self.payload.get("tags", 150)))]
+        if route == "product.sort_types":
+            return [{"id": n, "name": f"Sort {n}"} for n in range(10)]
+        if route in ("product.brands", "product.categories"):
+            return [self.row(id=n, name=f"{route.split('.')[1][:-1]} {n}") for n in range(25)]
+        if route == "branch.all":
+            return [self.branch(number) for number in BRANCHES]
+        if route == "branch.one":
+            if match["number"] not in BRANCHES:
+                return None
+            return self.branch(match["number"])
+        if route == "content.articles":
+            return [self.row(id=n, title=f"Article {n}") for n in range(int(self.payload.get("articles", 100)))]
+        if route == "account.customer":
+            return {"id": 1, "name": "Benchmark Customer"}
+        return []
+
+
+class FakeTransend:
+    """
+    Threaded HTTP server imitating the Transend API.
+
+    Args:
+        profile: Latency, error and payload settings, merged over DEFAULT_PROFILE
+        host: Interface to listen on
+        port: Port to listen on; 0 picks a free one
+    """
+
+    def __init__(self, profile: Optional[Dict[str, Any]] = None, host: str = "127.0.0.1", port: int = 0):
+        profile = profile or {}
+        self.profile = {**DEFAULT_PROFILE, **profile,
+                        "payload": {**DEFAULT_PROFILE["payload"], **profile.get("payload", {})}}
+        self.catalog = Catalog(self.profile["payload"])
+        self.random = random.Random(self.profile.get("seed", 0))
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def settings(self, route: str) -> Dict[str, Any]:
+        """Latency and error settings of a route"""
+        return {**self.profile["default"], **self.profile["routes"].get(route, {})}
+
+    def delay(self, settings: Dict[str, Any]) -> Tuple[float, bool]:
+        """Draw the latency and whether to fail one request"""
+        with self.lock:
+            jitter = self.random.uniform(-1, 1) * settings.get("jitter_ms", 0)
+            failed = self.random.random() < settings.get("error_rate", 0)
+        return max(0.0, settings.get("latency_ms", 0) + jitter) / 1000, failed
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self):
+                url = urlsplit(self.path)
+                for route, method, pattern in ROUTES:
+                    match = pattern.match(url.path)
+                    if match and method == self.command:
+                        break
+                else:
+                    route, match = None, None
+                with fake.lock:
+                    fake.requests[route or "unknown"] = fake.requests.get(route or "unknown", 0) + 1
+                latency, failed = fake.delay(fake.settings(route) if route else fake.profile["default"])
+                time.sleep(latency)
+                if self.headers.get("Content-Length"):
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                if failed:
+                    status, body = 503, {"message": "Injected failure"}
+                elif route is None:
+                    status, body = 404, {"message": "Not found"}
+                else:
+                    query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                    body = fake.catalog.respond(route, match.groupdict(), query)
+                    status, body = (404, {"message": "Not found"}) if body is None else (200, body)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _serve
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeTransend":
+        """Serve requests on a background thread."""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def load_profile(path: Optional[str]) -> Dict[str, Any]:
+    """Read a profile JSON file, or return an empty profile"""
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Transend API for benchmarks")
+    parser.add_argument("--profile", help="Profile JSON with per-route latency, jitter, error rate and payload sizes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    fake = FakeTransend(load_profile(args.profile), args.host, args.port)
+    print(f"Fake Transend API on {fake.base_url}")
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,130 @@
+"""Compare the size of tool results in each output format.
+
+Starts the fake Transend API, calls a set of list-heavy tools through
+FastMCP in-process once per output format, and reports the bytes of the
+content blocks sent to the client, their size as JSON-RPC payload, and
+an estimate of their tokens, against today's pretty-printed JSON.
+
+Tokens are estimated offline by counting words, digit runs, punctuation
+marks and line indents separately, which tracks how tokenizers split JSON
+punctuation and pretty-printing more closely than a characters-per-token
+ratio would.
+
+Usage:
+
+    uv run bench/formats.py --output formats.json
+"""
+
+from typing import Any, Dict, List, Tuple
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_transend import BRANCHES, ITEMS, FakeTransend, load_profile
+from run import ROOT, _change, _git_commit
+
+PIECE = re.compile(r"\n[ \t]*|[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+# Tool calls measured: the big catalog lists and the composite tools
+CALLS: List[Tuple[str, Dict[str, Any]]] = [
+    ("get_all_dtcs", {}),
+    ("get_transmissions", {}),
+    ("get_all_tags", {}),
+    ("get_all_branches", {}),
+    ("get_articles", {}),
+    ("search_dtcs", {"query": "transmission", "limit": 50}),
+    ("get_available_quantities_bulk", {"item_ids": ITEMS[:5], "availability_type_id": "1",
+                                       "branch_numbers": BRANCHES[:4]}),
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: words, digit runs, punctuation marks and line indents each count as one"""
+    return len(PIECE.findall(text))
+
+
+def measure(content: Any) -> Dict[str, int]:
+    """Bytes, JSON-RPC bytes and estimated tokens of the content blocks of a tool result"""
+    if isinstance(content, tuple):
+        content = content[0]
+    texts = [block.text for block in content if getattr(block, "text", None) is not None]
+    blocks = [block.model_dump(mode="json", exclude_none=True) for block in content]
+    return {
+        "blocks": len(blocks),
+        "bytes": sum(len(text.encode()) for text in texts),
+        "wire_bytes": len(json.dumps(blocks, separators=(",", ":")).encode()),
+        "est_tokens": sum(estimate_tokens(text) for text in texts),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Call every tool in every format and return the sizes"""
+    fake = FakeTransend(load_profile(args.profile)).start()
+    os.environ.update({
+        "TRANSEND_API_KEY": "bench",
+        "TRANSEND_API_TOKEN": "bench",
+        "TRANSEND_BASE_URL": fake.base_url,
+        "TRANSEND_CACHE_DIR": tempfile.mkdtemp(prefix="transend-formats-"),
+        "TRANSEND_YMM_BACKGROUND_REFRESH": "0",
+    })
+    sys.path.insert(0, ROOT)
+    import formats
+    import server
+
+    results: Dict[str, Dict[str, Dict[str, int]]] = {}
+    try:
+        for name in args.formats:
+            server.output_format = name
+            results[name] = {tool: measure(await server.mcp.call_tool(tool, arguments))
+                             for tool, arguments in CALLS}
+    finally:
+        fake.stop()
+
+    for sizes in results.values():
+        sizes["ALL"] = {key: sum(row[key] for row in sizes.values()) for key in ("blocks", "bytes", "wire_bytes", "est_tokens")}
+    return {
+        "meta": {"commit": _git_commit(), "orjson": formats.orjson is not None, "yaml": formats.to_yaml([]) is not None},
+        "formats": results,
+    }
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    """Print sizes per tool and format, with the change against the json format"""
+    columns = ("bytes", "wire_bytes", "est_tokens")
+    formats = results["formats"]
+    baseline = formats.get("json", {})
+    print(f"{'tool':<32}{'format':>10}" + "".join(f"{c:>14}{'vs json':>10}" for c in columns))
+    for tool in next(iter(formats.values())):
+        for position, (name, sizes) in enumerate(formats.items()):
+            row, old = sizes[tool], baseline.get(tool, {})
+            print(f"{tool if position == 0 else '':<32}{name:>10}"
+                  + "".join(f"{row[c]:>14}{_change(row[c], old.get(c, 0)):>10}" for c in columns))
+    if "yaml" in formats and not results["meta"]["yaml"]:
+        print("PyYAML is not installed: the yaml rows show the compact JSON it falls back to")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--formats", nargs="+", default=["json", "compact", "columnar", "csv", "yaml"],
+                        help="Output formats to compare; json is today's output")
+    parser.add_argument("--profile", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "profile.json"),
+                        help="Fake API profile; its payload sizes set the catalog sizes")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
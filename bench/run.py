@@ -0,0 +1,273 @@
+"""Benchmark the MCP server against the fake Transend API.
+
+Starts bench/fake_transend.py in-process, launches server.py over the real
+MCP stdio transport, drives a weighted mix of tool calls at a fixed
+concurrency and reports p50/p95/p99 latency and calls/sec per tool.
+
+Usage:
+
+    uv run bench/run.py --mix mixed --calls 500 --concurrency 8 --output results.json
+    uv run bench/run.py --baseline results.json
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_transend import BRANCHES, ITEMS, MAKES, VINS, YEARS, FakeTransend, load_profile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+Call = Tuple[str, Dict[str, Any]]
+
+
+def _ymm(rng: random.Random) -> Dict[str, Any]:
+    make = rng.choice(list(MAKES))
+    return {"year": rng.choice(YEARS), "make": make, "model": rng.choice(MAKES[make])}
+
+
+# Tool-call mixes: (weight, tool, argument generator)
+MIXES: Dict[str, List[Tuple[int, str, Callable[[random.Random], Dict[str, Any]]]]] = {
+    "ymm": [
+        (40, "get_year_make_model_vhid", _ymm),
+        (20, "resolve_vehicle", _ymm),
+        (25, "resolve_vehicle", lambda rng: {"vin": rng.choice(VINS)}),
+        (15, "get_vehicles_by_vin", lambda rng: {"vin": rng.choice(VINS)}),
+    ],
+    "inventory": [
+        (50, "get_available_quantity", lambda rng: {
+            "item_id": rng.choice(ITEMS), "branch_number": rng.choice(BRANCHES), "availability_type_id": "1"}),
+        (15, "get_available_quantities_bulk", lambda rng: {
+            "item_ids": rng.sample(ITEMS, 5), "availability_type_id": "1", "branch_numbers": rng.sample(BRANCHES, 4)}),
+        (25, "get_branch_by_number", lambda rng: {"branch_number": rng.choice(BRANCHES)}),
+        (10, "get_availability_by_item_id", lambda rng: {"item_id": rng.choice(ITEMS)}),
+    ],
+    "mixed": [
+        (20, "get_year_make_model_vhid", _ymm),
+        (15, "resolve_vehicle", lambda rng: {"vin": rng.choice(VINS)}),
+        (25, "get_available_quantity", lambda rng: {
+            "item_id": rng.choice(ITEMS), "branch_number": rng.choice(BRANCHES), "availability_type_id": "1"}),
+        (10, "get_available_quantities_bulk", lambda rng: {
+            "item_ids": rng.sample(ITEMS, 5), "availability_type_id": "1", "branch_numbers": rng.sample(BRANCHES, 4)}),
+        (10, "get_branch_by_number", lambda rng: {"branch_number": rng.choice(BRANCHES)}),
+        (10, "get_all_tags", lambda rng: {}),
+        (10, "search_dtcs", lambda rng: {"query": rng.choice(["P01", "P02", "transmission", "circuit P1"]), "limit": 20}),
+    ],
+}
+
+
+def plan(mix: str, calls: int, seed: int) -> List[Call]:
+    """
+    Draw the sequence of tool calls for a run.
+
+    Args:
+        mix: Name of the mix in MIXES
+        calls: Number of calls
+        seed: Random seed, so runs are comparable
+
+    Returns:
+        (tool, arguments) pairs
+    """
+    rng = random.Random(seed)
+    entries = MIXES[mix]
+    weights = [weight for weight, _, _ in entries]
+    drawn = rng.choices(entries, weights=weights, k=calls)
+    return [(tool, make_args(rng)) for _, tool, make_args in drawn]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, duration: float) -> Dict[str, Any]:
+    """Latency percentiles in milliseconds, error count and throughput"""
+    values = sorted(latencies)
+    return {
+        "calls": len(values),
+        "errors": errors,
+        "calls_per_sec": round(len(values) / duration, 2) if duration else 0.0,
+        "mean_ms": round(1000 * sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(1000 * percentile(values, 0.50), 3),
+        "p95_ms": round(1000 * percentile(values, 0.95), 3),
+        "p99_ms": round(1000 * percentile(values, 0.99), 3),
+        "max_ms": round(1000 * values[-1], 3) if values else 0.0,
+    }
+
+
+def is_error(result: Any) -> bool:
+    """Whether a call_tool result is a failure, including the tools' {"error": ...} results"""
+    if result.isError:
+        return True
+    for block in result.content:
+        # Dict results arrive pretty-printed; other output formats are not JSON objects
+        try:
+            value = json.loads(getattr(block, "text", None) or "null")
+        except ValueError:
+            continue
+        if isinstance(value, dict) and "error" in value:
+            return True
+    return False
+
+
+async def drive(session: ClientSession, calls: List[Call], concurrency: int) -> Tuple[List[Tuple[str, float, bool]], float]:
+    """
+    Run the planned calls with a fixed number of concurrent callers.
+
+    Returns:
+        (tool, latency, failed) per call, and the wall-clock duration
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    for call in calls:
+        queue.put_nowait(call)
+    samples: List[Tuple[str, float, bool]] = []
+
+    async def caller():
+        while not queue.empty():
+            tool, arguments = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                failed = is_error(await session.call_tool(tool, arguments=arguments))
+            except Exception:
+                failed = True
+            samples.append((tool, time.perf_counter() - started, failed))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def report(samples: List[Tuple[str, float, bool]], duration: float) -> Dict[str, Any]:
+    """Overall and per-tool summaries of a run"""
+    by_tool: Dict[str, List[Tuple[float, bool]]] = {}
+    for tool, latency, failed in samples:
+        by_tool.setdefault(tool, []).append((latency, failed))
+    return {
+        "summary": summarize([s[1] for s in samples], sum(s[2] for s in samples), duration),
+        "tools": {
+            tool: summarize([latency for latency, _ in rows], sum(failed for _, failed in rows), duration)
+            for tool, rows in sorted(by_tool.items())
+        },
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one benchmark and return its results"""
+    profile = load_profile(args.profile)
+    fake = FakeTransend(profile).start()
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="transend-bench-")
+    env = {
+        **os.environ,
+        "TRANSEND_API_KEY": "bench",
+        "TRANSEND_API_TOKEN": "bench",
+        "TRANSEND_BASE_URL": fake.base_url,
+        "TRANSEND_CACHE_DIR": cache_dir,
+        "TRANSEND_YMM_BACKGROUND_REFRESH": "0",
+    }
+    server = StdioServerParameters(command=sys.executable, args=[os.path.join(ROOT, "server.py")], env=env, cwd=ROOT)
+    calls = plan(args.mix, args.calls, args.seed)
+    errlog = sys.stderr if args.server_log else open(os.devnull, "w")
+    try:
+        async with stdio_client(server, errlog=errlog) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                if args.warmup:
+                    await drive(session, plan(args.mix, args.warmup, args.seed + 1), args.concurrency)
+                samples, duration = await drive(session, calls, args.concurrency)
+                server_metrics = await session.read_resource("transend://metrics")
+    finally:
+        fake.stop()
+        if errlog is not sys.stderr:
+            errlog.close()
+
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "mix": args.mix,
+            "calls": args.calls,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "profile": fake.profile,
+            "duration_s": round(duration, 3),
+        },
+        **report(samples, duration),
+        "upstream_requests": dict(sorted(fake.requests.items())),
+        "server_metrics": json.loads(server_metrics.contents[0].text),
+    }
+
+
+def _change(new: float, old: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{100 * (new - old) / old:+.1f}%"
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    """Print a table of the results, with changes against a baseline run"""
+    columns = ("calls", "errors", "calls_per_sec", "p50_ms", "p95_ms", "p99_ms")
+    rows = [("ALL", results["summary"])] + list(results["tools"].items())
+    old_rows = {}
+    if baseline:
+        old_rows = {"ALL": baseline["summary"], **baseline.get("tools", {})}
+    print(f"{'tool':<32}" + "".join(f"{c:>16}" for c in columns))
+    for name, row in rows:
+        print(f"{name:<32}" + "".join(f"{row[c]:>16}" for c in columns))
+        if name in old_rows:
+            old = old_rows[name]
+            print(f"{'  vs baseline':<32}" + "".join(f"{_change(row[c], old.get(c, 0)):>16}" for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed", help="Tool-call mix to drive")
+    parser.add_argument("--calls", type=int, default=300, help="Number of measured tool calls")
+    parser.add_argument("--warmup", type=int, default=0, help="Unmeasured calls made first")
+    parser.add_argument("--concurrency", type=int, default=8, help="Tool calls kept in flight")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the call sequence")
+    parser.add_argument("--profile", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "profile.json"),
+                        help="Fake API profile with per-route latency, jitter, error rate and payload sizes")
+    parser.add_argument("--cache-dir", help="Server cache directory; a fresh one by default, so caches start cold")
+    parser.add_argument("--server-log", action="store_true", help="Show the server's log output")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
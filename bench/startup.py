@@ -0,0 +1,145 @@
+"""Benchmark how quickly a new MCP session can use the server.
+
+Spawns server.py over the real MCP stdio transport, as the chatbot client
+does for every session, and times the phases of a cold start: spawn to
+initialized, to list_tools answered, and to the first tool call answered
+by the fake Transend API.
+
+Usage:
+
+    uv run bench/startup.py --runs 20 --output startup.json
+    uv run bench/startup.py --baseline startup.json
+"""
+
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_transend import FakeTransend, load_profile
+from run import ROOT, _change, _git_commit, percentile
+
+PHASES = ("initialize", "list_tools", "first_call")
+
+
+async def cold_start(server: StdioServerParameters, errlog) -> Dict[str, float]:
+    """
+    Start one server process and time each phase of the session.
+
+    Returns:
+        Seconds from spawning the process to the end of each phase
+    """
+    started = time.perf_counter()
+    timings = {}
+    async with stdio_client(server, errlog=errlog) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            timings["initialize"] = time.perf_counter() - started
+            await session.list_tools()
+            timings["list_tools"] = time.perf_counter() - started
+            await session.call_tool("get_all_sort_types", arguments={})
+            timings["first_call"] = time.perf_counter() - started
+    return timings
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Startup percentiles in milliseconds"""
+    values = sorted(samples)
+    return {
+        "runs": len(values),
+        "min_ms": round(1000 * values[0], 3),
+        "p50_ms": round(1000 * percentile(values, 0.50), 3),
+        "p95_ms": round(1000 * percentile(values, 0.95), 3),
+        "max_ms": round(1000 * values[-1], 3),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the cold starts and return their results"""
+    fake = FakeTransend(load_profile(args.profile)).start()
+    env = {
+        **os.environ,
+        "TRANSEND_API_KEY": "bench",
+        "TRANSEND_API_TOKEN": "bench",
+        "TRANSEND_BASE_URL": fake.base_url,
+        "TRANSEND_CACHE_DIR": args.cache_dir or tempfile.mkdtemp(prefix="transend-startup-"),
+        "TRANSEND_YMM_BACKGROUND_REFRESH": "0",
+    }
+    command = args.command.split() if args.command else [sys.executable]
+    server = StdioServerParameters(command=command[0], args=command[1:] + [os.path.join(ROOT, "server.py")],
+                                   env=env, cwd=ROOT)
+    samples: Dict[str, List[float]] = {phase: [] for phase in PHASES}
+    errlog = sys.stderr if args.server_log else open(os.devnull, "w")
+    try:
+        for _ in range(args.warmup + args.runs):
+            timings = await cold_start(server, errlog)
+            if args.warmup:
+                # Unmeasured runs fill the OS and bytecode caches
+                args.warmup -= 1
+                continue
+            for phase in PHASES:
+                samples[phase].append(timings[phase])
+    finally:
+        fake.stop()
+        if errlog is not sys.stderr:
+            errlog.close()
+
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "runs": args.runs,
+            "command": command,
+        },
+        "phases": {phase: summarize(values) for phase, values in samples.items()},
+    }
+
+
+def print_report(results: Dict[str, Any], baseline: Dict[str, Any] = None) -> None:
+    """Print a table of the results, with changes against a baseline run"""
+    columns = ("min_ms", "p50_ms", "p95_ms", "max_ms")
+    old_rows = baseline.get("phases", {}) if baseline else {}
+    print(f"{'spawn to end of':<20}" + "".join(f"{c:>12}" for c in columns))
+    for phase, row in results["phases"].items():
+        print(f"{phase:<20}" + "".join(f"{row[c]:>12}" for c in columns))
+        if phase in old_rows:
+            old = old_rows[phase]
+            print(f"{'  vs baseline':<20}" + "".join(f"{_change(row[c], old.get(c, 0)):>12}" for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="Number of measured cold starts")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured cold starts made first")
+    parser.add_argument("--command", help='Command launching server.py, e.g. "uv run"; this Python by default')
+    parser.add_argument("--profile", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "profile.json"),
+                        help="Fake API profile with per-route latency, jitter, error rate and payload sizes")
+    parser.add_argument("--cache-dir", help="Server cache directory; a fresh one by default")
+    parser.add_argument("--server-log", action="store_true", help="Show the server's log output")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from math import asin, cos, radians, sin, sqrt
+from typing import Any, Dict, List, Optional, Tuple
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Field names branch records may carry coordinates under, at the top level
+# or inside an "address" or "location" object
+LATITUDE_FIELDS = ("latitude", "lat")
+LONGITUDE_FIELDS = ("longitude", "lng", "lon", "long")
+
+
+def distance_miles(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """
+    Great-circle distance between two points.
+
+    Args:
+        a: (latitude, longitude) in degrees
+        b: (latitude, longitude) in degrees
+
+    Returns:
+        The haversine distance in miles
+    """
+    lat1, lon1, lat2, lon2 = map(radians, (*a, *b))
+    h = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * asin(min(1.0, sqrt(h)))
+
+
+def _number(record: Dict[str, Any], fields: Tuple[str, ...]) -> Optional[float]:
+    for field in fields:
+        try:
+            return float(record[field])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+def coordinates(branch: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """
+    Extract the coordinates of a branch record.
+
+    Args:
+        branch: A branch as returned by the branch API
+
+    Returns:
+        (latitude, longitude), or None when the record has no usable coordinates
+    """
+    for record in (branch, branch.get("address"), branch.get("location")):
+        if isinstance(record, dict):
+            latitude, longitude = _number(record, LATITUDE_FIELDS), _number(record, LONGITUDE_FIELDS)
+            if latitude is not None and longitude is not None:
+                return latitude, longitude
+    return None
+
+
+def branch_number(branch: Dict[str, Any]) -> Optional[str]:
+    """Branch number of a record, or None"""
+    for field in ("branchNumber", "number"):
+        if branch.get(field) is not None:
+            return str(branch[field])
+    return None
+
+
+class BranchIndex:
+    """
+    In-memory index over the branch list, for nearest-branch lookups.
+
+    Coordinates, numbers and active flags are extracted once, so ordering
+    branches by distance never re-reads the raw records. Branches without
+    coordinates can still be looked up, but are only ever ordered after
+    every located branch.
+    """
+
+    def __init__(self, branches: List[Dict[str, Any]]):
+        self.source = branches
+        self.by_number: Dict[str, Dict[str, Any]] = {}
+        self.located: List[Tuple[str, Tuple[float, float]]] = []
+        self.unlocated: List[str] = []
+        for branch in branches:
+            number = branch_number(branch) if isinstance(branch, dict) else None
+            if number is None or number in self.by_number:
+                continue
+            self.by_number[number] = branch
+            point = coordinates(branch)
+            if point is None:
+                self.unlocated.append(number)
+            else:
+                self.located.append((number, point))
+
+    def __len__(self) -> int:
+        return len(self.by_number)
+
+    def get(self, number: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up one branch.
+
+        Args:
+            number: The branch number
+
+        Returns:
+            The branch record, or None
+        """
+        return self.by_number.get(str(number))
+
+    def nearby(self, number: str, radius: Optional[float] = None,
+               active_only: bool = True) -> List[Tuple[Optional[float], Dict[str, Any]]]:
+        """
+        Order branches by distance from one branch, starting with that branch.
+
+        Args:
+            number: The origin branch number
+            radius: Optional maximum distance in miles; branches without
+                coordinates are left out when it is given
+            active_only: Leave out branches flagged inactive, except the origin
+
+        Returns:
+            (distance in miles or None when unknown, branch) pairs, nearest first
+        """
+        origin = self.get(number)
+        if origin is None:
+            return []
+        number = str(number)
+        center = coordinates(origin)
+
+        def wanted(other: str) -> bool:
+            return other != number and not (active_only and self.by_number[other].get("active") is False)
+
+        ordered: List[Tuple[Optional[float], Dict[str, Any]]] = [(0.0, origin)]
+        unknown = [other for other in self.unlocated if wanted(other)]
+        if center is None:
+            unknown = [other for other, _ in self.located if wanted(other)] + unknown
+        else:
+            by_distance = sorted(
+                (distance_miles(center, point), other) for other, point in self.located if wanted(other))
+            ordered.extend((round(distance, 1), self.by_number[other]) for distance, other in by_distance
+                           if radius is None or distance <= radius)
+        if radius is None:
+            ordered.extend((None, self.by_number[other]) for other in unknown)
+        return ordered
@@ -0,0 +1,206 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import time
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after a per-entry TTL.
+
+    Keys are tuples whose first element is the tool name, so all entries
+    of one tool can be invalidated together. Expired entries are kept for
+    another stale_ttl seconds, for get_stale() to fall back on. on_evict is
+    called with the key of every entry that is evicted or dropped.
+    """
+
+    def __init__(self, maxsize: int = 256, clock: Callable[[], float] = time.monotonic, stale_ttl: float = 0,
+                 on_evict: Optional[Callable[[Hashable], None]] = None):
+        self.maxsize = maxsize
+        self.clock = clock
+        self.stale_ttl = stale_ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """
+        Look up a live entry and mark it as most recently used.
+
+        Args:
+            key: The cache key
+            default: Value returned when the key is missing or expired
+
+        Returns:
+            The cached value or default
+        """
+        entry = self._data.get(key)
+        now = self.clock()
+        if entry is None or entry[1] <= now:
+            if entry is not None and entry[1] + self.stale_ttl <= now:
+                self._drop(key)
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def get_stale(self, key: Hashable, default: Any = MISSING) -> Any:
+        """
+        Look up an entry that may have expired less than stale_ttl seconds ago.
+
+        Args:
+            key: The cache key
+            default: Value returned when there is no usable entry
+
+        Returns:
+            The cached value or default
+        """
+        entry = self._data.get(key)
+        if entry is None or entry[1] + self.stale_ttl <= self.clock():
+            return default
+        self.stale_hits += 1
+        return entry[0]
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """
+        Get the time left before an entry expires, without touching it.
+
+        Args:
+            key: The cache key
+
+        Returns:
+            Seconds until expiry, negative once expired, or None when absent
+        """
+        entry = self._data.get(key)
+        return None if entry is None else entry[1] - self.clock()
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        """
+        Store a value, evicting the least recently used entry when full.
+
+        Args:
+            key: The cache key
+            value: The value to cache
+            ttl: Seconds until the entry expires
+        """
+        self._data[key] = (value, self.clock() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._drop(next(iter(self._data)))
+            self.evictions += 1
+
+    def invalidate(self, *tools: str, tenant: Optional[str] = None) -> int:
+        """
+        Drop every entry belonging to the given tools.
+
+        Args:
+            *tools: Tool names whose entries should be removed
+            tenant: Only drop entries keyed to this tenant, which account-scoped
+                keys carry right after the tool name
+
+        Returns:
+            Number of entries removed
+        """
+        stale = [key for key in self._data
+                 if key[0] in tools and (tenant is None or (len(key) > 1 and key[1] == tenant))]
+        for key in stale:
+            self._drop(key)
+        return len(stale)
+
+    def _drop(self, key: Hashable) -> None:
+        """Remove an entry and report it to on_evict."""
+        del self._data[key]
+        if self.on_evict is not None:
+            self.on_evict(key)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        self._data.clear()
+        self.hits = self.misses = self.stale_hits = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Size, capacity, hits, misses, stale hits, evictions and hit ratio
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def make_key(tool: str, *args, **kwargs) -> tuple:
+    """
+    Build a cache key from a tool name and its arguments.
+
+    Args:
+        tool: The tool name
+        *args: Positional tool arguments
+        **kwargs: Keyword tool arguments
+
+    Returns:
+        A hashable key
+    """
+    return (tool, *args, *sorted(kwargs.items()))
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one.
+
+    While a call for a key is in flight, later callers with the same key
+    await the same result instead of starting their own call.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run factory() for a key unless a call for it is already in flight.
+
+        Args:
+            key: Identifies calls that can share a result
+            factory: Creates the coroutine doing the actual work
+
+        Returns:
+            The shared result; exceptions are raised to every caller
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shielded so one caller giving up does not cancel the call for the others.
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get coalescing counters.
+
+        Returns:
+            Calls started, calls saved by sharing a result, and calls in flight
+        """
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
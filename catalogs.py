@@ -0,0 +1,142 @@
+from typing import Any, Dict, List, Optional
+from weakref import WeakSet
+import hashlib
+import json
+import threading
+import time
+
+
+def etag(value: Any) -> str:
+    """
+    Content hash of a catalog, stable across refreshes that return the same data.
+
+    Args:
+        value: The catalog as returned by the API
+
+    Returns:
+        A short hex digest
+    """
+    text = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+class CatalogVersions:
+    """
+    Versions of the catalogs served as resources, and the sessions watching them.
+
+    Each catalog's version is the ETag of its content, recomputed whenever a
+    fresh copy is fetched; a refresh that returns the same data keeps the
+    version. Sessions are held weakly, so closed sessions drop out on their own.
+
+    Args:
+        clock: Wall-clock time source for the update timestamps
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._versions: Dict[str, Dict[str, Any]] = {}
+        self._subscribers: Dict[str, WeakSet] = {}
+        self._readers: WeakSet = WeakSet()
+        self.changes = 0
+        self.notifications = 0
+
+    def update(self, uri: str, value: Any) -> bool:
+        """
+        Record a freshly fetched copy of a catalog.
+
+        Args:
+            uri: The catalog's resource URI
+            value: The catalog
+
+        Returns:
+            True when it replaces a known version with different content
+        """
+        tag = etag(value)
+        with self._lock:
+            previous = self._versions.get(uri)
+            if previous is not None and previous["etag"] == tag:
+                return False
+            self._versions[uri] = {
+                "etag": tag,
+                "updated": self.clock(),
+                "count": len(value) if isinstance(value, (list, dict)) else None,
+            }
+            if previous is None:
+                return False
+            self.changes += 1
+            return True
+
+    def version(self, uri: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the current version of a catalog.
+
+        Args:
+            uri: The catalog's resource URI
+
+        Returns:
+            {etag, updated, count}, or None before the catalog was first loaded
+        """
+        with self._lock:
+            version = self._versions.get(uri)
+            return dict(version) if version else None
+
+    def read_by(self, session: Any) -> None:
+        """Remember a session that read a catalog, to tell it when the list's versions change"""
+        self._readers.add(session)
+
+    def subscribe(self, uri: str, session: Any) -> None:
+        """
+        Subscribe a session to updates of one catalog.
+
+        Args:
+            uri: The catalog's resource URI
+            session: The MCP session to notify
+        """
+        with self._lock:
+            self._subscribers.setdefault(uri, WeakSet()).add(session)
+        self._readers.add(session)
+
+    def unsubscribe(self, uri: str, session: Any) -> None:
+        """
+        Stop notifying a session about one catalog.
+
+        Args:
+            uri: The catalog's resource URI
+            session: The MCP session
+        """
+        with self._lock:
+            self._subscribers.get(uri, WeakSet()).discard(session)
+
+    def forget(self, session: Any) -> None:
+        """Drop a session from every subscription, e.g. after sending to it failed"""
+        with self._lock:
+            for subscribers in self._subscribers.values():
+                subscribers.discard(session)
+        self._readers.discard(session)
+
+    def subscribers(self, uri: str) -> List[Any]:
+        """Sessions subscribed to a catalog"""
+        with self._lock:
+            return list(self._subscribers.get(uri, ()))
+
+    def readers(self) -> List[Any]:
+        """Sessions that read or subscribed to any catalog"""
+        return list(self._readers)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get each catalog's version and subscriber count.
+
+        Returns:
+            Versions by URI, plus change and notification counters
+        """
+        with self._lock:
+            catalogs = {uri: {**version, "subscribers": len(self._subscribers.get(uri, ()))}
+                        for uri, version in self._versions.items()}
+        return {
+            "catalogs": catalogs,
+            "sessions": len(self._readers),
+            "changes": self.changes,
+            "notifications": self.notifications,
+        }
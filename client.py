@@ -1,72 +1,212 @@
 from dotenv import load_dotenv
-from anthropic import AnthropicBedrock
+from anthropic import AsyncAnthropicBedrock
 from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
 from typing import List
 import asyncio
-import nest_asyncio
+import json
 import os
-
-nest_asyncio.apply()
+import time
 
 load_dotenv()
 
+MODEL = 'us.anthropic.claude-sonnet-4-20250514-v1:0'
+
+# Prompt-cache breakpoint; the cached prefix is reused for five minutes
+CACHE_CONTROL = {'type': 'ephemeral'}
+
+USAGE_FIELDS = ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens')
+
 class MCP_ChatBot:
 
-    def __init__(self):
+    def __init__(self, stream: bool = None):
         # Initialize session and client objects
         self.session: ClientSession = None
-        self.anthropic = AnthropicBedrock()
+        self.anthropic = AsyncAnthropicBedrock()
         self.available_tools: List[dict] = []
+        # Stream responses unless MCP_CHATBOT_STREAM=0
+        self.stream = os.getenv('MCP_CHATBOT_STREAM', '1') == '1' if stream is None else stream
+        # Latency and token usage of every model turn
+        self.turn_stats: List[dict] = []
+        # Once the conversation is estimated above this many tokens, older
+        # tool results are cut down to their first compact_chars characters
+        # until it is back under compact_target of the budget
+        self.token_budget = int(os.getenv('MCP_CHATBOT_TOKEN_BUDGET', '60000'))
+        self.compact_chars = int(os.getenv('MCP_CHATBOT_COMPACT_CHARS', '2000'))
+        self.compact_target = float(os.getenv('MCP_CHATBOT_COMPACT_TARGET', '0.6'))
 
     async def process_query(self, query):
         messages = [{'role':'user', 'content':query}]
-        response = self.anthropic.messages.create(max_tokens = 2024,
-                                      model = 'us.anthropic.claude-sonnet-4-20250514-v1:0', 
-                                      tools = self.available_tools, # tools exposed to the LLM
-                                      messages = messages)
-        process_query = True
-        while process_query:
-            assistant_content = []
-            for content in response.content:
-                if content.type =='text':
-                    print(content.text)
-                    assistant_content.append(content)
-                    if(len(response.content) == 1):
-                        process_query= False
-                elif content.type == 'tool_use':
-                    assistant_content.append(content)
-                    messages.append({'role':'assistant', 'content':assistant_content})
-                    tool_id = content.id
-                    tool_args = content.input
-                    tool_name = content.name
-    
-                    print(f"Calling tool {tool_name} with args {tool_args}")
-                    
-                    # Call a tool
-                    #result = execute_tool(tool_name, tool_args): not anymore needed
-                    # tool invocation through the client session
-                    result = await self.session.call_tool(tool_name, arguments=tool_args)
-                    messages.append({"role": "user", 
-                                      "content": [
-                                          {
-                                              "type": "tool_result",
-                                              "tool_use_id":tool_id,
-                                              "content": result.content
-                                          }
-                                      ]
-                                    })
-                    response = self.anthropic.messages.create(max_tokens = 2024,
-                                      model = 'us.anthropic.claude-sonnet-4-20250514-v1:0', 
-                                      tools = self.available_tools,
-                                      messages = messages)
-                    
-                    if(len(response.content) == 1 and response.content[0].type == "text"):
-                        print(response.content[0].text)
-                        process_query= False
+        while True:
+            turn = {'ttft': None, 'tool_dispatch': [], 'usage': {}}
+            started = time.perf_counter()
+            if self.stream:
+                content, tool_calls = await self._stream_turn(messages, turn, started)
+            else:
+                content, tool_calls = await self._create_turn(messages, turn, started)
+            turn['total'] = time.perf_counter() - started
+            self.turn_stats.append(turn)
+            print(self._format_turn_stats(turn))
+            messages.append({'role':'assistant', 'content':content})
+
+            if not tool_calls:
+                break
+
+            # Tool calls were dispatched as soon as their blocks were complete;
+            # answer them all in one user message, as the Messages API expects.
+            results = await asyncio.gather(*(task for _, task in tool_calls), return_exceptions=True)
+            messages.append({'role':'user', 'content':[
+                self._tool_result(tool_id, result) for (tool_id, _), result in zip(tool_calls, results)
+            ]})
+
+    async def _create_turn(self, messages, turn, started):
+        """Request one complete response, then dispatch its tool calls"""
+        response = await self.anthropic.messages.create(**self._request_args(messages))
+        turn['ttft'] = time.perf_counter() - started
+        self._record_usage(turn, response.usage)
+        tool_calls = []
+        for content in response.content:
+            if content.type == 'text':
+                print(content.text)
+            elif content.type == 'tool_use':
+                tool_calls.append((content.id, self._dispatch_tool(content.name, content.input, turn, started)))
+        return response.content, tool_calls
+
+    async def _stream_turn(self, messages, turn, started):
+        """Stream one response, printing text as it arrives and dispatching
+        each tool call the moment its block closes"""
+        blocks = {}
+        partial_json = {}
+        tool_calls = []
+        stream = await self.anthropic.messages.create(**self._request_args(messages), stream = True)
+        async for event in stream:
+            if event.type == 'message_start':
+                self._record_usage(turn, event.message.usage)
+            elif event.type == 'message_delta':
+                self._record_usage(turn, event.usage)
+            elif event.type == 'content_block_start':
+                block = event.content_block
+                if block.type == 'text':
+                    blocks[event.index] = {'type': 'text', 'text': ''}
+                elif block.type == 'tool_use':
+                    blocks[event.index] = {'type': 'tool_use', 'id': block.id, 'name': block.name, 'input': {}}
+                    partial_json[event.index] = []
+            elif event.type == 'content_block_delta' and event.index in blocks:
+                if turn['ttft'] is None:
+                    turn['ttft'] = time.perf_counter() - started
+                if event.delta.type == 'text_delta':
+                    print(event.delta.text, end='', flush=True)
+                    blocks[event.index]['text'] += event.delta.text
+                elif event.delta.type == 'input_json_delta':
+                    partial_json[event.index].append(event.delta.partial_json)
+            elif event.type == 'content_block_stop' and event.index in blocks:
+                block = blocks[event.index]
+                if block['type'] == 'text':
+                    print()
+                else:
+                    raw_input = ''.join(partial_json.pop(event.index))
+                    block['input'] = json.loads(raw_input) if raw_input else {}
+                    tool_calls.append((block['id'], self._dispatch_tool(block['name'], block['input'], turn, started)))
+        return [blocks[index] for index in sorted(blocks)], tool_calls
+
+    def _request_args(self, messages):
+        """Build the messages.create arguments, compacting the history and
+        marking the tool definitions and the conversation so far for caching"""
+        self._compact(messages)
+        tools = [dict(tool) for tool in self.available_tools] # tools exposed to the LLM
+        if tools:
+            tools[-1]['cache_control'] = CACHE_CONTROL
+        return {'max_tokens': 2024, 'model': MODEL, 'tools': tools,
+                'messages': self._with_cache_breakpoint(messages)}
+
+    @staticmethod
+    def _with_cache_breakpoint(messages):
+        """Copy the messages with a cache breakpoint on the last block, so the
+        whole conversation so far is cached for the next turn"""
+        last = messages[-1]
+        content = last['content']
+        if isinstance(content, str):
+            content = [{'type': 'text', 'text': content}]
+        content = [*content[:-1], {**content[-1], 'cache_control': CACHE_CONTROL}]
+        return [*messages[:-1], {**last, 'content': content}]
+
+    def _compact(self, messages):
+        """Once the conversation is over the token budget, truncate the oldest tool
+        results in one pass until it is under compact_target of the budget. Cutting
+        well below the budget leaves room for many more turns before the next cut,
+        so the cached prefix stays the same between them. The latest message is
+        left intact, since the model has not seen it yet."""
+        if self._estimate_tokens(messages) <= self.token_budget:
+            return
+        target = int(self.token_budget * self.compact_target)
+        for message in messages[:-1]:
+            if self._estimate_tokens(messages) <= target:
+                return
+            if message['role'] != 'user' or isinstance(message['content'], str):
+                continue
+            for block in message['content']:
+                # Results that were already compacted (or are errors) are strings
+                if block.get('type') != 'tool_result' or isinstance(block['content'], str):
+                    continue
+                text = self._content_text(block['content'])
+                if len(text) > self.compact_chars:
+                    block['content'] = (text[:self.compact_chars] +
+                                        f"\n[{len(text) - self.compact_chars} more characters truncated to save context]")
+
+    @staticmethod
+    def _content_text(content):
+        """Flatten tool result content blocks to text"""
+        parts = []
+        for item in content:
+            text = item.get('text') if isinstance(item, dict) else getattr(item, 'text', None)
+            parts.append(text if isinstance(text, str) else json.dumps(item, default=str))
+        return '\n'.join(parts)
+
+    @staticmethod
+    def _estimate_tokens(messages):
+        """Roughly estimate the token count of the messages (about 4 characters per token)"""
+        def to_text(o):
+            text = getattr(o, 'text', None)
+            return text if isinstance(text, str) else str(o)
+        return len(json.dumps(messages, default=to_text)) // 4
+
+    @staticmethod
+    def _record_usage(turn, usage):
+        """Copy the token counts reported by the API into the turn stats"""
+        for field in USAGE_FIELDS:
+            value = getattr(usage, field, None)
+            if isinstance(value, int):
+                turn['usage'][field] = value
+
+    def _dispatch_tool(self, name, arguments, turn, started):
+        """Start a tool call in the background and record when it was dispatched"""
+        print(f"Calling tool {name} with args {arguments}")
+        turn['tool_dispatch'].append(time.perf_counter() - started)
+        return asyncio.create_task(self.session.call_tool(name, arguments=arguments))
+
+    @staticmethod
+    def _tool_result(tool_id, result):
+        """Build the tool_result block answering one tool_use block"""
+        if isinstance(result, BaseException):
+            return {"type": "tool_result", "tool_use_id": tool_id,
+                    "content": f"Tool call failed: {result}", "is_error": True}
+        return {"type": "tool_result", "tool_use_id": tool_id, "content": result.content}
+
+    @staticmethod
+    def _format_turn_stats(turn):
+        """Summarize the latency of one model turn"""
+        ttft = f"{turn['ttft']:.2f}s" if turn['ttft'] is not None else "n/a"
+        summary = f"[ttft {ttft}"
+        if turn['tool_dispatch']:
+            summary += ", tools dispatched at " + ", ".join(f"{t:.2f}s" for t in turn['tool_dispatch'])
+        usage = turn['usage']
+        if usage:
+            cached = usage.get('cache_read_input_tokens', 0)
+            prompt = usage.get('input_tokens', 0) + cached + usage.get('cache_creation_input_tokens', 0)
+            summary += (f", tokens in {prompt} (cache read {cached}, written {usage.get('cache_creation_input_tokens', 0)}"
+                        f", hit {cached / prompt if prompt else 0:.0%}) out {usage.get('output_tokens', 0)}")
+        return summary + f", turn {turn['total']:.2f}s]"
 
-    
-    
     async def chat_loop(self):
         """Run an interactive chat loop"""
         print("\nMCP Chatbot Started!")
@@ -74,7 +214,8 @@ class MCP_ChatBot:
         
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                # Read input off the event loop so it stays free while waiting
+                query = (await asyncio.to_thread(input, "\nQuery: ")).strip()
         
                 if query.lower() == 'quit':
                     break
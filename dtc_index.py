@@ -0,0 +1,126 @@
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Set
+import base64
+import json
+import re
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def encode_cursor(query: str, offset: int) -> str:
+    """
+    Build an opaque cursor for the next page of a search.
+
+    Args:
+        query: The search query the cursor belongs to
+        offset: Position of the first result of the next page
+
+    Returns:
+        URL-safe cursor string
+    """
+    raw = json.dumps({"q": query, "o": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, query: str) -> int:
+    """
+    Read the offset from a cursor issued for the same query.
+
+    Args:
+        cursor: A cursor returned by a previous search
+        query: The current search query
+
+    Returns:
+        The offset of the next page
+    """
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset = int(state["o"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if state.get("q") != query or offset < 0:
+        raise ValueError("Cursor belongs to a different query")
+    return offset
+
+
+class DTCIndex:
+    """
+    In-memory index over the Diagnostic Trouble Code catalog.
+
+    Codes are kept in a prefix trie and description words in an inverted
+    index, so lookups never scan the whole catalog.
+    """
+
+    def __init__(self, dtcs: List[Dict[str, Any]]):
+        self.source = dtcs
+        self.dtcs = sorted((dtc for dtc in dtcs if dtc.get("code")), key=lambda dtc: str(dtc["code"]).upper())
+        self.by_code: Dict[str, int] = {}
+        self.trie: Dict[str, Any] = {"ids": []}
+        self.words: Dict[str, Set[int]] = {}
+        for position, dtc in enumerate(self.dtcs):
+            code = str(dtc["code"]).upper()
+            self.by_code[code] = position
+            node = self.trie
+            for char in code:
+                node = node.setdefault(char, {"ids": []})
+                node["ids"].append(position)
+            for word in WORD.findall(str(dtc.get("description", "")).lower()):
+                self.words.setdefault(word, set()).add(position)
+        self.vocabulary = sorted(self.words)
+
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up one code.
+
+        Args:
+            code: The DTC code, case-insensitive
+
+        Returns:
+            The DTC record, or None when the code is unknown
+        """
+        position = self.by_code.get(code.strip().upper())
+        return None if position is None else self.dtcs[position]
+
+    def _code_prefix(self, prefix: str) -> List[int]:
+        """Positions of codes starting with a prefix"""
+        node = self.trie
+        for char in prefix.upper():
+            node = node.get(char)
+            if node is None:
+                return []
+        return node["ids"]
+
+    def _word_prefix(self, prefix: str) -> Set[int]:
+        """Positions of DTCs whose description has a word starting with a prefix"""
+        positions: Set[int] = set()
+        for i in range(bisect_left(self.vocabulary, prefix), len(self.vocabulary)):
+            word = self.vocabulary[i]
+            if not word.startswith(prefix):
+                break
+            positions |= self.words[word]
+        return positions
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        """
+        Find DTCs matching every term of a query.
+
+        Each term matches a code prefix or, as a prefix, a word of the
+        description. Exact code matches come first, then code order.
+
+        Args:
+            query: Search terms, e.g. "P07" or "transmission solenoid"
+
+        Returns:
+            Matching DTC records; the whole catalog for an empty query
+        """
+        terms = WORD.findall(query.lower())
+        if not terms:
+            return self.dtcs
+        matched: Optional[Set[int]] = None
+        for term in terms:
+            positions = set(self._code_prefix(term)) | self._word_prefix(term)
+            matched = positions if matched is None else matched & positions
+            if not matched:
+                return []
+        exact = {self.by_code.get(term.upper()) for term in terms}
+        return [self.dtcs[position] for position in sorted(matched, key=lambda p: (p not in exact, p))]
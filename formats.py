@@ -0,0 +1,178 @@
+from typing import Any, Dict, List, Optional
+import csv
+import io
+import json
+import logging
+
+logger = logging.getLogger("transend")
+
+# "json" leaves results to FastMCP, which pretty-prints them
+FORMATS = ("json", "compact", "columnar", "csv", "yaml")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_warned_yaml = False
+
+
+def parse_format(value: str) -> str:
+    """
+    Validate an output format name.
+
+    Args:
+        value: The format name, case-insensitive
+
+    Returns:
+        The normalized name
+    """
+    name = value.strip().lower()
+    if name not in FORMATS:
+        raise ValueError(f"Unknown output format {value!r}; expected one of {', '.join(FORMATS)}")
+    return name
+
+
+def parse_tool_formats(value: str) -> Dict[str, str]:
+    """
+    Parse per-tool formats such as "get_all_dtcs=columnar,get_transmissions=csv".
+
+    Args:
+        value: Comma-separated tool=format pairs
+
+    Returns:
+        Format by tool name
+    """
+    formats = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        tool, _, name = entry.partition("=")
+        if not name:
+            raise ValueError(f"Expected tool=format, got {entry!r}")
+        formats[tool.strip()] = parse_format(name)
+    return formats
+
+
+def dumps(value: Any) -> str:
+    """
+    Serialize to minified JSON, with orjson when it is installed.
+
+    Args:
+        value: A JSON-like value; other objects are written as strings
+
+    Returns:
+        The JSON text
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _is_table(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(row, dict) for row in value)
+
+
+def columnar(value: Any) -> Any:
+    """
+    Replace lists of records with {"columns": [...], "rows": [[...]]}.
+
+    Lists directly in a dict, such as the items of a page, are converted
+    too. Columns are the union of the records' keys in first-seen order;
+    a record without a column has null in its place.
+
+    Args:
+        value: A tool result
+
+    Returns:
+        The result with its record lists in columnar layout
+    """
+    if _is_table(value):
+        columns: List[str] = []
+        seen = set()
+        for row in value:
+            for key in row:
+                if key not in seen:
+                    seen.add(key)
+                    columns.append(key)
+        return {"columns": columns, "rows": [[row.get(column) for column in columns] for row in value]}
+    if isinstance(value, dict):
+        return {key: columnar(item) if _is_table(item) else item for key, item in value.items()}
+    return value
+
+
+def to_csv(value: Any) -> Optional[str]:
+    """
+    Write a list of records, or a page of them, as CSV.
+
+    A page's total and offsets come first as "# name: value" lines. Nested
+    values are written as JSON and nulls as empty cells.
+
+    Args:
+        value: A tool result
+
+    Returns:
+        The CSV text, or None when the result is not tabular
+    """
+    meta: Dict[str, Any] = {}
+    if isinstance(value, dict) and _is_table(value.get("items")):
+        meta = {key: item for key, item in value.items() if key != "items"}
+        value = value["items"]
+    if not _is_table(value):
+        return None
+    table = columnar(value)
+    out = io.StringIO()
+    for key, item in meta.items():
+        out.write(f"# {key}: {'' if item is None else item}\n")
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(table["columns"])
+    for row in table["rows"]:
+        writer.writerow(["" if cell is None else dumps(cell) if isinstance(cell, (dict, list)) else cell
+                         for cell in row])
+    return out.getvalue()
+
+
+def to_yaml(value: Any) -> Optional[str]:
+    """
+    Write a result as block-style YAML, if PyYAML is installed.
+
+    Returns:
+        The YAML text, or None without PyYAML
+    """
+    try:
+        import yaml
+    except ImportError:
+        return None
+    return yaml.safe_dump(json.loads(dumps(value)), sort_keys=False, allow_unicode=True, default_flow_style=False)
+
+
+def render(result: Any, name: str) -> Any:
+    """
+    Render a tool result in an output format.
+
+    Error results are never rewritten, so they keep their {"error": ...}
+    shape. CSV falls back to compact JSON for results that are not tables,
+    and YAML does when PyYAML is not installed.
+
+    Args:
+        result: The tool result
+        name: A format from FORMATS
+
+    Returns:
+        The result unchanged for "json", otherwise its text
+    """
+    if name == "json" or (isinstance(result, dict) and set(result) == {"error"}):
+        return result
+    if name == "columnar":
+        return dumps(columnar(result))
+    if name == "csv":
+        text = to_csv(result)
+        return dumps(result) if text is None else text
+    if name == "yaml":
+        text = to_yaml(result)
+        if text is None:
+            global _warned_yaml
+            if not _warned_yaml:
+                _warned_yaml = True
+                logger.warning("YAML output needs PyYAML; sending compact JSON instead")
+            return dumps(result)
+        return text
+    return dumps(result)
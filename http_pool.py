@@ -0,0 +1,190 @@
+from typing import Any, Dict, Optional, Tuple
+import logging
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import requests
+
+from resilience import attempt_timeout
+
+logger = logging.getLogger("transend")
+
+
+class PoolStats:
+    """Thread-safe counters shared by the connection pools of one adapter."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.requests = 0
+        self.connections_created = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+
+    def connection_created(self) -> None:
+        """Count a newly opened connection."""
+        with self._lock:
+            self.connections_created += 1
+
+    def acquired(self, waited: float) -> None:
+        """Count a connection taken from the pool after waiting for it."""
+        with self._lock:
+            self.requests += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+            # Anything over a millisecond means every connection was busy
+            if waited > 0.001:
+                self.waits += 1
+
+    def released(self) -> None:
+        """Count a connection returned to the pool."""
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy the counters, with derived utilization and reuse."""
+        with self._lock:
+            return {
+                "maxsize": self.maxsize,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "utilization": self.in_use / self.maxsize if self.maxsize else 0.0,
+                "requests": self.requests,
+                "connections_created": self.connections_created,
+                "connections_reused": max(0, self.requests - self.connections_created),
+                "waits": self.waits,
+                "wait_time_total": round(self.wait_time, 6),
+                "wait_time_avg": round(self.wait_time / self.requests, 6) if self.requests else 0.0,
+                "wait_time_max": round(self.max_wait, 6),
+            }
+
+
+class _MeteredPool:
+    """Mixin for urllib3 connection pools that reports to a PoolStats."""
+
+    stats: PoolStats
+
+    def _new_conn(self):
+        self.stats.connection_created()
+        return super()._new_conn()
+
+    def _get_conn(self, timeout: Optional[float] = None):
+        started = time.perf_counter()
+        conn = super()._get_conn(timeout)
+        self.stats.acquired(time.perf_counter() - started)
+        return conn
+
+    def _put_conn(self, conn) -> None:
+        self.stats.released()
+        super()._put_conn(conn)
+
+
+class MeteredAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connection pools block when full and record
+    utilization and wait times.
+    """
+
+    def __init__(self, pool_maxsize: int = 10, **kwargs):
+        self.stats = PoolStats(pool_maxsize)
+        super().__init__(pool_maxsize=pool_maxsize, pool_block=True, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("MeteredHTTPConnectionPool", (_MeteredPool, HTTPConnectionPool), {"stats": self.stats}),
+            "https": type("MeteredHTTPSConnectionPool", (_MeteredPool, HTTPSConnectionPool), {"stats": self.stats}),
+        }
+
+
+def enable_http2() -> bool:
+    """
+    Switch urllib3 HTTPS connections to HTTP/2.
+
+    urllib3's HTTP/2 support is experimental and needs the h2 package; it
+    offers only h2 during TLS negotiation, so enable it only for hosts that
+    speak HTTP/2.
+
+    Returns:
+        True when HTTP/2 was enabled
+    """
+    try:
+        import urllib3.http2
+        urllib3.http2.inject_into_urllib3()
+    except ImportError as e:
+        logger.warning("HTTP/2 unavailable, staying on HTTP/1.1: %s", e)
+        return False
+    return True
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP session shared by Transend SDK clients.
+
+    The SDK opens a new connection for every call; attaching it to a pool
+    reuses connections across calls and threads, caps how many are open,
+    and applies connect and read timeouts.
+    """
+
+    def __init__(self, maxsize: int = 10, connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 http2: bool = False):
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.http2 = enable_http2() if http2 else False
+        self.adapter = MeteredAdapter(pool_maxsize=maxsize)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def attach(self, client: Any) -> Any:
+        """
+        Route every API group of a TransendAPIClient through this pool.
+
+        Args:
+            client: The SDK client
+
+        Returns:
+            The same client
+        """
+        for api in vars(client).values():
+            if hasattr(api, "_make_request"):
+                api._make_request = self._request_for(api)
+        return client
+
+    def _request_for(self, api: Any):
+        """Build a replacement for the SDK's BaseAPI._make_request bound to one API group"""
+        def make_request(method, endpoint, params=None, data=None):
+            timeout = self.timeout
+            left = attempt_timeout.get()
+            if left is not None:
+                # Never outlive the retry deadline of the call
+                timeout = (min(timeout[0], left), min(timeout[1], left))
+            response = self.session.request(method, f"{api.base_url}{endpoint}", headers=api.headers,
+                                            params=params, json=data, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+        return make_request
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get pool counters.
+
+        Returns:
+            Pool size, connections in use, utilization, reuse and wait times
+        """
+        return {
+            **self.adapter.stats.snapshot(),
+            "connect_timeout": self.timeout[0],
+            "read_timeout": self.timeout[1],
+            "http2": self.http2,
+        }
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.session.close()
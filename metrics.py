@@ -0,0 +1,331 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+import json
+import os
+import random
+import threading
+import time
+
+# Seconds; fine-grained at the low end, where cache hits land
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Bytes of serialized tool output
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Lists longer than this are sized from a sample of this many items
+SIZE_SAMPLE = 256
+
+
+class Histogram:
+    """Fixed-bucket histogram with percentile estimates."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record one value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """
+        Estimate a percentile as the upper bound of the bucket it falls in.
+
+        Args:
+            q: The percentile as a fraction, e.g. 0.95
+
+        Returns:
+            The estimate, capped at the largest value seen
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Summarize the histogram, with cumulative bucket counts keyed by upper bound."""
+        cumulative = {}
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            cumulative[str(bound)] = seen
+        cumulative["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "p50": round(self.percentile(0.50), 6),
+            "p95": round(self.percentile(0.95), 6),
+            "p99": round(self.percentile(0.99), 6),
+            "buckets": cumulative,
+        }
+
+
+class ToolStats:
+    """Counters of one tool."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors: Dict[str, int] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cache_only = 0
+        self.cache_hits = 0
+        self.upstream_calls = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.upstream_time = Histogram(LATENCY_BUCKETS)
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy the counters."""
+        return {
+            "calls": self.calls,
+            "errors": dict(self.errors),
+            "error_rate": round(sum(self.errors.values()) / self.calls, 6) if self.calls else 0.0,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "served_from_cache": self.cache_only,
+            "cache_hits": self.cache_hits,
+            "upstream_calls": self.upstream_calls,
+            "latency": self.latency.snapshot(),
+            "upstream_time": self.upstream_time.snapshot(),
+            "response_bytes": self.response_bytes.snapshot(),
+        }
+
+
+class _Call:
+    """What one tool call spent upstream, filled in by the server's call helpers."""
+
+    __slots__ = ("upstream_time", "upstream_calls", "cache_hits", "error")
+
+    def __init__(self):
+        self.upstream_time = 0.0
+        self.upstream_calls = 0
+        self.cache_hits = 0
+        self.error: Optional[str] = None
+
+
+class Metrics:
+    """
+    Per-tool latency, upstream time, response size, error and concurrency
+    metrics.
+
+    Tools are wrapped with instrument(); the server's upstream and cache
+    helpers report into the call in progress with upstream() and cache_hit().
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.tools: Dict[str, ToolStats] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.started = time.time()
+        self._current: ContextVar[Optional[_Call]] = ContextVar("transend_tool_call", default=None)
+        self._lock = threading.Lock()
+
+    def instrument(self, func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """
+        Wrap an async tool so every call is measured.
+
+        Tools report failures as {"error": ...} results; those are counted as
+        errors under the class of the upstream exception, if any.
+
+        Args:
+            func: The tool function
+
+        Returns:
+            The wrapped tool, with the same signature
+        """
+        name = func.__name__
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            stats = self._begin(name)
+            call = _Call()
+            token = self._current.set(call)
+            started = self.clock()
+            result = None
+            failed = False
+            try:
+                result = await func(*args, **kwargs)
+                if _is_error(result):
+                    failed = True
+                    call.error = call.error or "ToolError"
+                return result
+            except Exception as e:
+                failed = True
+                call.error = type(e).__name__
+                raise
+            finally:
+                self._current.reset(token)
+                self._end(stats, call, self.clock() - started, result, failed)
+        return wrapper
+
+    def upstream(self, seconds: float, error: Optional[BaseException] = None) -> None:
+        """
+        Record an upstream call made by the tool call in progress.
+
+        Args:
+            seconds: Time spent waiting for the upstream response
+            error: The exception the call raised, if any
+        """
+        call = self._current.get()
+        if call is not None:
+            call.upstream_time += seconds
+            call.upstream_calls += 1
+            if error is not None:
+                call.error = type(error).__name__
+
+    def cache_hit(self) -> None:
+        """Record that the tool call in progress was served a cached result."""
+        call = self._current.get()
+        if call is not None:
+            call.cache_hits += 1
+
+    def _begin(self, name: str) -> ToolStats:
+        """Count a tool call as started."""
+        with self._lock:
+            stats = self.tools.get(name)
+            if stats is None:
+                stats = self.tools[name] = ToolStats()
+            stats.calls += 1
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return stats
+
+    def _end(self, stats: ToolStats, call: _Call, elapsed: float, result: Any, failed: bool) -> None:
+        """Record a finished tool call."""
+        size = response_bytes(result) if result is not None else 0
+        with self._lock:
+            stats.in_flight -= 1
+            self.in_flight -= 1
+            stats.latency.observe(elapsed)
+            stats.upstream_time.observe(call.upstream_time)
+            stats.response_bytes.observe(size)
+            stats.upstream_calls += call.upstream_calls
+            stats.cache_hits += call.cache_hits
+            if call.cache_hits and not call.upstream_calls:
+                stats.cache_only += 1
+            if failed:
+                stats.errors[call.error] = stats.errors.get(call.error, 0) + 1
+
+    def clear(self) -> None:
+        """Forget all recorded calls."""
+        with self._lock:
+            self.tools.clear()
+            self.max_in_flight = self.in_flight
+            self.started = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get all metrics.
+
+        Returns:
+            Process-wide concurrency and the stats of every tool called so far
+        """
+        with self._lock:
+            return {
+                "uptime": round(time.time() - self.started, 3),
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "tools": {name: stats.snapshot() for name, stats in sorted(self.tools.items())},
+            }
+
+    def prometheus(self) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Returns:
+            The exposition text
+        """
+        snapshot = self.snapshot()
+        lines: List[str] = [
+            "# TYPE transend_in_flight gauge",
+            f"transend_in_flight {snapshot['in_flight']}",
+        ]
+        tools = snapshot["tools"]
+        for metric, kind, field in (
+            ("transend_tool_calls_total", "counter", "calls"),
+            ("transend_tool_in_flight", "gauge", "in_flight"),
+            ("transend_tool_cache_hits_total", "counter", "cache_hits"),
+            ("transend_tool_upstream_calls_total", "counter", "upstream_calls"),
+        ):
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.extend(f'{metric}{{tool="{name}"}} {stats[field]}' for name, stats in tools.items())
+        lines.append("# TYPE transend_tool_errors_total counter")
+        for name, stats in tools.items():
+            lines.extend(f'transend_tool_errors_total{{tool="{name}",class="{error}"}} {count}'
+                         for error, count in stats["errors"].items())
+        for metric, field in (
+            ("transend_tool_latency_seconds", "latency"),
+            ("transend_tool_upstream_seconds", "upstream_time"),
+            ("transend_tool_response_bytes", "response_bytes"),
+        ):
+            lines.append(f"# TYPE {metric} histogram")
+            for name, stats in tools.items():
+                histogram = stats[field]
+                lines.extend(f'{metric}_bucket{{tool="{name}",le="{bound}"}} {count}'
+                             for bound, count in histogram["buckets"].items())
+                lines.append(f'{metric}_sum{{tool="{name}"}} {histogram["sum"]}')
+                lines.append(f'{metric}_count{{tool="{name}"}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """
+        Write a JSON snapshot of the metrics, replacing the file atomically.
+
+        Args:
+            path: Destination file
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"time": time.time(), **self.snapshot()}, f, indent=2)
+        os.replace(tmp, path)
+
+
+def response_bytes(value: Any) -> int:
+    """
+    Estimate the size of a tool result as compact UTF-8 JSON, without serializing all of it.
+
+    Lists longer than SIZE_SAMPLE, at any depth, are extrapolated from one
+    item picked at random from each of SIZE_SAMPLE equal slices, so whole
+    catalogs are not serialized a second time on the event loop; anything
+    smaller is measured exactly.
+
+    Args:
+        value: The tool result; strings are results already rendered
+
+    Returns:
+        Size in bytes
+    """
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, list) and len(value) > SIZE_SAMPLE:
+        step = len(value) / SIZE_SAMPLE
+        # Seeded by the length, so the same result is always sized the same
+        rng = random.Random(len(value))
+        sampled = sum(response_bytes(value[int((i + rng.random()) * step)]) for i in range(SIZE_SAMPLE))
+        # Brackets and commas, plus the items
+        return len(value) + 1 + round(sampled * len(value) / SIZE_SAMPLE)
+    if isinstance(value, dict) and any(isinstance(item, list) and len(item) > SIZE_SAMPLE for item in value.values()):
+        return len(value) + 1 + sum(response_bytes(str(key)) + 3 + response_bytes(item) for key, item in value.items())
+    return len(json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str).encode())
+
+
+def _is_error(result: Any) -> bool:
+    """Whether a tool result is the {"error": ...} failure shape"""
+    return isinstance(result, dict) and set(result) == {"error"}
@@ -0,0 +1,123 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import re
+
+from ymm_index import match_score
+
+WORD = re.compile(r"[a-z0-9]+")
+
+# Field names the catalog uses for the same thing across record types
+NAME_FIELDS = ("name", "description", "title")
+PHID_FIELDS = ("phid", "productHierarchyId", "id")
+ITEM_FIELDS = ("itemId", "item_id", "itemNumber")
+
+
+def first_field(record: Any, fields: Iterable[str]) -> Optional[Any]:
+    """
+    Get the first of several alternative fields a record has.
+
+    Args:
+        record: A catalog record
+        fields: Field names, in order of preference
+
+    Returns:
+        The field's value, or None
+    """
+    if not isinstance(record, dict):
+        return None
+    for field in fields:
+        if record.get(field) is not None:
+            return record[field]
+    return None
+
+
+def term_score(terms: List[str], name: Any) -> Optional[int]:
+    """
+    Score how well a record name matches every search term.
+
+    Each term is scored against its best matching word of the name, see
+    ymm_index.match_score. A term matches words it is a prefix of, not words
+    that are a prefix of it, so "cool" does not match the "a" of "A/C";
+    misspellings only match words of similar length.
+
+    Args:
+        terms: Lowercased search terms
+        name: The record name
+
+    Returns:
+        The summed score, lower is better, or None when a term matches no word
+    """
+    words = WORD.findall(str(name).lower())
+    total = 0
+    for term in terms:
+        scores = [score for score in (match_score(term, word, reverse_prefix=False) for word in words) if score is not None]
+        if not scores:
+            return None
+        total += min(scores)
+    return total
+
+
+def rank(records: Any, query: Optional[str]) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Rank catalog records against a search query.
+
+    Args:
+        records: Records as returned by the product API
+        query: Optional search terms, e.g. "brake pads"
+
+    Returns:
+        (score, record) pairs, best first and otherwise in catalog order;
+        every record scores 0 without a query. Non-dict entries are skipped.
+    """
+    if not isinstance(records, list):
+        return []
+    terms = WORD.findall((query or "").lower())
+    ranked = []
+    for position, record in enumerate(records):
+        if not isinstance(record, dict):
+            continue
+        score = term_score(terms, first_field(record, NAME_FIELDS) or "") if terms else 0
+        if score is not None:
+            ranked.append((score, position, record))
+    ranked.sort(key=lambda entry: entry[:2])
+    return [(score, record) for score, _, record in ranked]
+
+
+def item_ids(records: Iterable[Any], limit: int) -> List[str]:
+    """
+    Collect distinct item ids carried by records, in order.
+
+    Args:
+        records: Catalog records; those without an item id are skipped
+        limit: Maximum number of ids
+
+    Returns:
+        Up to limit item ids
+    """
+    found: List[str] = []
+    for record in records:
+        item = first_field(record, ITEM_FIELDS)
+        if item is not None and str(item) not in found:
+            found.append(str(item))
+            if len(found) >= limit:
+                break
+    return found
+
+
+def fit(document: Dict[str, Any], key: str, max_bytes: int) -> Dict[str, Any]:
+    """
+    Drop entries from the end of one list of a document until it fits a size budget.
+
+    Args:
+        document: The result document; modified in place
+        key: The list to shorten, ranked best first
+        max_bytes: Size budget for the serialized document
+
+    Returns:
+        The document, with "truncated" set when entries were dropped
+    """
+    entries = document[key]
+    while len(entries) > 1 and len(json.dumps(document, separators=(",", ":"), default=str)) > max_bytes:
+        entries.pop()
+        document["truncated"] = True
+    return document
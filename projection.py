@@ -0,0 +1,103 @@
+from typing import Any, Dict, List, Optional
+import json
+
+
+def matches(row: Any, filter: Dict[str, Any]) -> bool:
+    """
+    Check a row against a field filter.
+
+    String values match case-insensitively as substrings; any other value
+    must be equal.
+
+    Args:
+        row: A list item as returned by the Transend API
+        filter: Field name to expected value
+
+    Returns:
+        True when every filtered field matches
+    """
+    if not isinstance(row, dict):
+        return False
+    for field, expected in filter.items():
+        if field not in row:
+            return False
+        actual = row[field]
+        if isinstance(expected, str):
+            if expected.lower() not in str(actual).lower():
+                return False
+        elif actual != expected:
+            return False
+    return True
+
+
+def _page_size(total: int, offset: int) -> int:
+    """Size of an empty page's envelope, pretty-printed, with room for its items list to open"""
+    sizes = [len(json.dumps({"items": [], "total": total, "offset": offset, "next_offset": next_offset}, indent=2))
+             for next_offset in (total, None)]
+    return max(sizes) + len("\n  ")
+
+
+def _row_size(row: Any) -> int:
+    """Size of a row pretty-printed as a page item, two levels deep, with its separator"""
+    text = json.dumps(row, indent=2, default=str)
+    return len(text) + len("    ") * (text.count("\n") + 1) + len(",\n")
+
+
+def project(rows: Any, fields: Optional[List[str]] = None, limit: Optional[int] = None, offset: int = 0,
+            filter: Optional[Dict[str, Any]] = None, max_bytes: Optional[int] = None) -> Any:
+    """
+    Filter, page and trim a list response before it is serialized.
+
+    Without any options, a list that fits in max_bytes is returned as is.
+    Otherwise the result is a page:
+    {"items": [...], "total": N, "offset": O, "next_offset": O2 or None},
+    where next_offset is the continuation cursor for the following page.
+    The page is cut short when it would grow past max_bytes, measured with
+    its envelope as pretty-printed JSON, the default output format; the
+    other formats are smaller.
+
+    Args:
+        rows: The full upstream response
+        fields: Optional field names to keep in each row
+        limit: Optional maximum number of rows
+        offset: Number of matching rows to skip
+        filter: Optional field filter, see matches()
+        max_bytes: Optional size budget for the serialized page
+
+    Returns:
+        The rows unchanged, or a page of them; a limit below 1 or a negative
+        offset raises ValueError, as they would never advance the cursor
+    """
+    if limit is not None and limit < 1:
+        raise ValueError(f"limit must be at least 1, got {limit}")
+    if offset < 0:
+        raise ValueError(f"offset must not be negative, got {offset}")
+    if not isinstance(rows, list):
+        return rows
+    paged = fields or limit is not None or offset or filter
+    if filter:
+        rows = [row for row in rows if matches(row, filter)]
+    total = len(rows)
+    end = total if limit is None else min(total, offset + limit)
+
+    items = []
+    size = _page_size(total, offset)
+    for row in rows[offset:end]:
+        if fields and isinstance(row, dict):
+            row = {field: row[field] for field in fields if field in row}
+        if max_bytes is not None:
+            size += _row_size(row)
+            if size > max_bytes and items:
+                paged = True
+                break
+        items.append(row)
+
+    if not paged:
+        return items
+    next_offset = offset + len(items)
+    return {
+        "items": items,
+        "total": total,
+        "offset": offset,
+        "next_offset": next_offset if next_offset < total else None,
+    }
@@ -0,0 +1,196 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import heapq
+import time
+
+# Lower values are served first
+INTERACTIVE = 0
+BULK = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk", BACKGROUND: "background"}
+
+# Priority of the calls made by the current task, e.g. lowered for fan-outs
+current_priority: ContextVar[int] = ContextVar("transend_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Run the enclosed upstream calls, and tasks started from them, at a priority level."""
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+def parse_limit(value: str) -> Optional[Tuple[float, float]]:
+    """
+    Parse a "rate/burst" limit such as "20/40", or just a rate.
+
+    Args:
+        value: Requests per second, optionally followed by the burst size
+
+    Returns:
+        (rate, burst), or None for "0" (unlimited)
+    """
+    rate, _, burst = value.partition("/")
+    rate = float(rate)
+    if rate <= 0:
+        return None
+    return rate, float(burst) if burst else max(1.0, rate)
+
+
+class TokenBucket:
+    """Refills at rate tokens per second up to burst tokens."""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def take(self, cost: float = 1) -> float:
+        """
+        Take tokens if enough are available.
+
+        Args:
+            cost: Tokens needed, capped at the burst size
+
+        Returns:
+            0 when the tokens were taken, otherwise seconds until they will be available
+        """
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        cost = min(cost, self.burst)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class _Group:
+    """One endpoint group: its bucket, queued callers and counters."""
+
+    def __init__(self, name: str, bucket: TokenBucket):
+        self.name = name
+        self.bucket = bucket
+        self.waiters: List[Tuple[int, int, float, asyncio.Future]] = []
+        self.drainer: Optional[asyncio.Task] = None
+        self.acquired = 0
+        self.queued = 0
+        self.max_queue_depth = 0
+        self.wait_time: Dict[int, float] = {}
+        self.max_wait: Dict[int, float] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        """Copy the counters, with wait times split by priority."""
+        by_priority = {
+            PRIORITY_NAMES.get(level, str(level)): {
+                "wait_time_total": round(self.wait_time[level], 6),
+                "wait_time_max": round(self.max_wait[level], 6),
+            }
+            for level in sorted(self.wait_time)
+        }
+        return {
+            "rate": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "tokens": round(self.bucket.tokens, 3),
+            "queue_depth": sum(1 for waiter in self.waiters if not waiter[3].done()),
+            "max_queue_depth": self.max_queue_depth,
+            "acquired": self.acquired,
+            "queued": self.queued,
+            "waits": by_priority,
+        }
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limits per endpoint group, with a priority queue.
+
+    Callers that cannot take a token at once wait in a queue ordered by
+    priority, then arrival, so interactive lookups overtake bulk fetches
+    waiting for the same group. Groups without a limit are not throttled.
+    """
+
+    def __init__(self, limits: Dict[str, Optional[Tuple[float, float]]],
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.groups: Dict[str, _Group] = {
+            name: _Group(name, TokenBucket(*limit, clock=clock)) for name, limit in limits.items() if limit
+        }
+        self._order = count()
+
+    async def acquire(self, group: str, level: Optional[int] = None, cost: float = 1) -> float:
+        """
+        Wait until a group's rate limit allows another upstream request.
+
+        Args:
+            group: The endpoint group
+            level: Priority; the current task's priority by default
+            cost: Tokens the call uses, e.g. the number of HTTP requests it makes
+
+        Returns:
+            Seconds spent waiting
+        """
+        state = self.groups.get(group)
+        if state is None:
+            return 0.0
+        level = current_priority.get() if level is None else level
+        if not state.waiters and state.bucket.take(cost) == 0:
+            self._record(state, level, 0.0)
+            return 0.0
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(state.waiters, (level, next(self._order), cost, waiter))
+        state.queued += 1
+        state.max_queue_depth = max(state.max_queue_depth, len(state.waiters))
+        if state.drainer is None or state.drainer.done():
+            state.drainer = asyncio.create_task(self._drain(state))
+        started = self.clock()
+        await waiter
+        waited = self.clock() - started
+        self._record(state, level, waited)
+        return waited
+
+    async def _drain(self, state: _Group) -> None:
+        """Hand out tokens to queued callers as the bucket refills, best priority first"""
+        while state.waiters:
+            _, _, cost, waiter = state.waiters[0]
+            if waiter.done():
+                # The caller was cancelled while queued
+                heapq.heappop(state.waiters)
+                continue
+            wait = state.bucket.take(cost)
+            if wait:
+                await self.sleep(wait)
+                continue
+            heapq.heappop(state.waiters)
+            waiter.set_result(None)
+
+    def _record(self, state: _Group, level: int, waited: float) -> None:
+        """Count a granted request and its wait"""
+        state.acquired += 1
+        state.wait_time[level] = state.wait_time.get(level, 0.0) + waited
+        state.max_wait[level] = max(state.max_wait.get(level, 0.0), waited)
+
+    def reset(self) -> None:
+        """Refill every bucket and reset the counters."""
+        for name, state in list(self.groups.items()):
+            bucket = state.bucket
+            self.groups[name] = _Group(name, TokenBucket(bucket.rate, bucket.burst, clock=self.clock))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get limiter counters.
+
+        Returns:
+            Per group: limit, tokens left, queue depth and wait times by priority
+        """
+        return {name: state.stats() for name, state in sorted(self.groups.items())}
@@ -0,0 +1,251 @@
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import random
+import time
+
+# Upstream statuses worth retrying: throttling and server-side failures
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Seconds left before the deadline of the current upstream attempt. The
+# connection pool caps its connect and read timeouts to it, so an attempt
+# ends within the deadline and releases its worker thread and connection.
+attempt_timeout: ContextVar[Optional[float]] = ContextVar("attempt_timeout", default=None)
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Check whether an upstream failure may succeed when retried.
+
+    Args:
+        error: The exception raised by an SDK call
+
+    Returns:
+        True for timeouts, connection failures and 429/5xx responses
+    """
+    # Imported here so the server can start without loading requests
+    import requests
+
+    if isinstance(error, (requests.Timeout, requests.ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in RETRYABLE_STATUS
+    return False
+
+
+class UpstreamTimeoutError(TimeoutError):
+    """Raised when retried calls to an endpoint run out of time."""
+
+    def __init__(self, endpoint: str, elapsed: float, cause: Optional[BaseException] = None):
+        detail = f": {cause}" if cause is not None and str(cause) else ""
+        super().__init__(f"Transend {endpoint} timed out after {elapsed:.1f}s{detail}")
+        self.endpoint = endpoint
+        self.elapsed = elapsed
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"Transend {endpoint} is unavailable after repeated failures; retry in {retry_after:.0f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Fail fast on an endpoint that keeps failing.
+
+    After failure_threshold consecutive transient failures the circuit
+    opens and calls are rejected. Once reset_timeout has passed, one probe
+    call is let through: success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        """Let a call through, or raise CircuitOpenError."""
+        if self.opened_at is None:
+            return
+        waited = self.clock() - self.opened_at
+        if waited < self.reset_timeout or self.probing:
+            self.rejected += 1
+            raise CircuitOpenError(self.endpoint, max(0.0, self.reset_timeout - waited))
+        self.probing = True
+
+    def record_success(self) -> None:
+        """Close the circuit after the endpoint answered."""
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def abandon(self) -> None:
+        """Let another probe through after one ended without an answer, e.g. when it was cancelled."""
+        self.probing = False
+
+    def record_failure(self) -> None:
+        """Count a transient failure, opening the circuit at the threshold."""
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.probing:
+                self.trips += 1
+            self.opened_at = self.clock()
+            self.probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get breaker counters.
+
+        Returns:
+            State, consecutive failures, times opened and calls rejected
+        """
+        return {"state": self.state, "failures": self.failures, "trips": self.trips, "rejected": self.rejected}
+
+
+class Resilience:
+    """
+    Retries with jittered exponential backoff and per-endpoint circuit
+    breakers for upstream calls.
+
+    Retried calls share a total deadline, which each attempt receives as
+    attempt_timeout; each backoff is drawn uniformly between zero and
+    base_delay * 2**attempt, capped at max_delay.
+    """
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0, deadline: float = 10.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+                 rng: Callable[[], float] = random.random):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.retries = 0
+        self.deadline_exceeded = 0
+        self.stale_served = 0
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        """Get the circuit breaker of an endpoint, creating it on first use"""
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(
+                endpoint, self.failure_threshold, self.reset_timeout, self.clock)
+        return breaker
+
+    def backoff(self, attempt: int) -> float:
+        """Jittered delay before retry number attempt (starting at 1)"""
+        return self.rng() * min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+
+    async def call(self, endpoint: str, factory: Callable[[], Awaitable[Any]], retry: bool = True,
+                   acquire: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """
+        Call an endpoint through its circuit breaker.
+
+        Args:
+            endpoint: Name of the upstream endpoint, e.g. the tool name
+            factory: Creates the coroutine making one attempt
+            retry: Retry transient failures within the deadline; only safe
+                for idempotent calls, whose attempts are also limited to the
+                time left before the deadline
+            acquire: Optional wait before each attempt, e.g. for a rate
+                limit; time spent in it is not counted against the deadline
+                and never fails the endpoint
+
+        Returns:
+            The result of the first successful attempt
+        """
+        breaker = self.breaker(endpoint)
+        started = self.clock()
+        deadline = started + self.deadline
+        attempt = 0
+        while True:
+            if acquire is not None:
+                queued = self.clock()
+                await acquire()
+                waited = self.clock() - queued
+                started += waited
+                deadline += waited
+            breaker.before_call()
+            attempt += 1
+            # Timeouts must be positive; retries only start with time left
+            token = attempt_timeout.set(max(0.001, deadline - self.clock()) if retry else None)
+            try:
+                result = await factory()
+            except Exception as e:
+                transient = is_transient(e)
+                if transient:
+                    breaker.record_failure()
+                else:
+                    # The endpoint answered, even if it rejected the call
+                    breaker.record_success()
+                if not (retry and transient):
+                    raise
+                if attempt >= self.attempts:
+                    self._raise_timeout(endpoint, e, started)
+                    raise
+                delay = self.backoff(attempt)
+                if self.clock() + delay >= deadline:
+                    self.deadline_exceeded += 1
+                    self._raise_timeout(endpoint, e, started)
+                    raise
+                self.retries += 1
+                await self.sleep(delay)
+                continue
+            except BaseException:
+                breaker.abandon()
+                raise
+            finally:
+                attempt_timeout.reset(token)
+            breaker.record_success()
+            return result
+
+    def _raise_timeout(self, endpoint: str, error: Exception, started: float) -> None:
+        """Replace a timeout given up on with one naming the endpoint and the time spent"""
+        import requests
+
+        if isinstance(error, (TimeoutError, requests.Timeout)) and not isinstance(error, UpstreamTimeoutError):
+            raise UpstreamTimeoutError(endpoint, self.clock() - started, error) from error
+
+    def reset(self) -> None:
+        """Close all circuits and reset the counters."""
+        self.breakers.clear()
+        self.retries = self.deadline_exceeded = self.stale_served = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get retry and circuit breaker counters.
+
+        Returns:
+            Retries, deadlines hit, stale responses served and each endpoint's breaker
+        """
+        return {
+            "retries": self.retries,
+            "deadline_exceeded": self.deadline_exceeded,
+            "stale_served": self.stale_served,
+            "breakers": {endpoint: breaker.stats() for endpoint, breaker in sorted(self.breakers.items())},
+        }
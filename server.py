@@ -1,37 +1,996 @@
-from transend.client import TransendAPIClient
 from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp.resources import FunctionResource
+from mcp.server.lowlevel.server import NotificationOptions, request_ctx
+from pydantic import AnyUrl
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from branch_index import BranchIndex, branch_number as record_branch_number
+from catalogs import CatalogVersions
+from cache import MISSING, SingleFlight, TTLCache, make_key
+from metrics import Metrics
+from formats import parse_format, parse_tool_formats, render
+from dtc_index import DTCIndex, decode_cursor, encode_cursor
+from parts import PHID_FIELDS, first_field, fit, item_ids, rank
+from projection import project
+from rate_limit import BACKGROUND, BULK, INTERACTIVE, RateLimiter, current_priority, parse_limit, priority
+from resilience import CircuitOpenError, Resilience, is_transient
+from tenants import TenantRegistry, tenant_id
+from vehicle_store import PersistentCache
+from ymm_index import YMMIndex
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from contextlib import asynccontextmanager
+from functools import partial, wraps
+import argparse
+import asyncio
+import contextvars
+import logging
 import os
+import threading
+import time
 from uuid import UUID
-from typing import Dict, List, Optional, Any
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Any, Set, Tuple
+
+if TYPE_CHECKING:
+    from http_pool import ConnectionPool
+    from transend.client import TransendAPIClient
 
 # Initialize with your API credentials
 api_key = os.getenv("TRANSEND_API_KEY", "your_api_key_here")
 api_token = os.getenv("TRANSEND_API_TOKEN", "your_api_token_here")
-client = TransendAPIClient(api_key, api_token)
+# Point at another Transend deployment, or at bench/fake_transend.py
+base_url = os.getenv("TRANSEND_BASE_URL", "https://api.transend.us")
+
+# Every client sends its requests through one keep-alive connection pool.
+# The pool holds as many connections as there are workers, so a call never
+# waits for a connection unless other clients are busy with them.
+pool_maxsize = int(os.getenv("TRANSEND_POOL_MAXSIZE", os.getenv("TRANSEND_MAX_WORKERS", "8")))
+connect_timeout = float(os.getenv("TRANSEND_CONNECT_TIMEOUT", "5"))
+read_timeout = float(os.getenv("TRANSEND_READ_TIMEOUT", "30"))
+http2 = os.getenv("TRANSEND_HTTP2", "0") == "1"
+
+# The SDK, requests and the pool are only imported, and the clients only
+# built, on the first upstream call (see _client), so a new session can
+# list the tools without paying for them.
+http_pool: Optional["ConnectionPool"] = None
+client: Optional["TransendAPIClient"] = None
+client_lock = threading.RLock()
+
+# Over HTTP, each session sends its own credentials in these headers.
+# Sessions without them are rejected, unless TRANSEND_ALLOW_SERVER_CREDENTIALS
+# lets them act as the account above; stdio always does. Each credential set is a
+# tenant with its own client and connection pool, built on first use. The
+# least recently used tenants are evicted beyond TRANSEND_MAX_TENANTS, and
+# tenants idle for TRANSEND_TENANT_IDLE_TIMEOUT seconds, dropping their
+# cached account data.
+API_KEY_HEADER = "x-transend-api-key"
+API_TOKEN_HEADER = "x-transend-api-token"
+OUTPUT_FORMAT_HEADER = "x-transend-output-format"
+allow_server_credentials = os.getenv("TRANSEND_ALLOW_SERVER_CREDENTIALS", "0") == "1"
+max_tenants = int(os.getenv("TRANSEND_MAX_TENANTS", "64"))
+tenant_idle_timeout = float(os.getenv("TRANSEND_TENANT_IDLE_TIMEOUT", "1800"))
+
+# The Transend SDK is synchronous, so every upstream call is handed to a
+# bounded thread pool to keep the event loop free for other MCP requests.
+max_workers = int(os.getenv("TRANSEND_MAX_WORKERS", "8"))
+executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transend")
+
+# List tools page their response once it would serialize past this size.
+max_response_bytes = int(os.getenv("TRANSEND_MAX_RESPONSE_BYTES", "65536"))
+
+# Upper bound on upstream calls a single fan-out tool keeps in flight.
+bulk_concurrency = int(os.getenv("TRANSEND_BULK_CONCURRENCY", "8"))
+
+# Near-static catalogs and account reads are cached in-process. TTLs are
+# per tool in seconds; tools not listed here always go upstream.
+CACHE_TTLS = {
+    "get_all_sort_types": 3600,
+    "get_all_tags": 3600,
+    "get_all_dtcs": 3600,
+    "get_articles": 900,
+    "get_all_branches": 900,
+    "get_years": 3600,
+    "get_categories": 3600,
+    "get_active_bank_accounts": 60,
+    "get_verified_bank_accounts": 60,
+    "get_credit_cards": 60,
+    "get_customer_info": 60,
+}
+
+# Cached tools whose results belong to the caller's account; their cache
+# entries are kept apart per credential set.
+ACCOUNT_SCOPED = {
+    "get_active_bank_accounts",
+    "get_verified_bank_accounts",
+    "get_credit_cards",
+    "get_customer_info",
+}
+
+# Cached tools whose entries each mutating tool makes stale.
+INVALIDATES = {
+    "delete_bank_account": ("get_active_bank_accounts", "get_verified_bank_accounts"),
+    "post_bank_account": ("get_active_bank_accounts", "get_verified_bank_accounts"),
+    "verify_bank_account": ("get_active_bank_accounts", "get_verified_bank_accounts"),
+    "update_credit_card_default": ("get_credit_cards",),
+    "delete_credit_card": ("get_credit_cards",),
+    "post_credit_card": ("get_credit_cards",),
+}
+
+# When Transend is down, cached catalogs are served for up to this many
+# seconds past their TTL; 0 disables serving stale data.
+stale_ttl = float(os.getenv("TRANSEND_STALE_TTL", "3600"))
+
+# Request counts and call arguments of cached catalog keys, recorded while the
+# prefetcher runs so it can refresh the hottest ones. Calls keep the SDK group
+# name rather than the method, which would pin the session's tenant client.
+key_hits: Counter = Counter()
+refresh_calls: Dict[tuple, Tuple[str, str, tuple, dict]] = {}
+prefetching = False
+
+def _cache_evicted(key: tuple) -> None:
+    """Forget the request count of a key that left the response cache"""
+    key_hits.pop(key, None)
+    refresh_calls.pop(key, None)
+
+response_cache = TTLCache(maxsize=int(os.getenv("TRANSEND_CACHE_SIZE", "256")), stale_ttl=stale_ttl,
+                          on_evict=_cache_evicted)
+
+# Expired catalog entries within the stale window are served at once while
+# a background task refreshes them, so callers never wait on upstream.
+stale_while_revalidate = os.getenv("TRANSEND_STALE_WHILE_REVALIDATE", "1") == "1"
+revalidating: Dict[tuple, asyncio.Task] = {}
+# Change notifications being sent to sessions, in the background
+notifying: Set[asyncio.Task] = set()
+
+# How the prefetcher loads each catalog it can keep warm: SDK API group and
+# the arguments the tool passes by default.
+PREFETCH_CALLS = {
+    "get_all_branches": ("branch", {"active": None}),
+    "get_all_tags": ("product", {}),
+    "get_all_sort_types": ("product", {}),
+    "get_all_dtcs": ("vehicle", {}),
+    "get_articles": ("content", {}),
+    "get_years": ("vehicle", {"vhid": None}),
+}
+# SDK group of every shared cached tool, to rebuild its call for a refresh
+CACHED_APIS = {**{tool: api for tool, (api, _) in PREFETCH_CALLS.items()}, "get_categories": "product"}
+
+# Every TRANSEND_PREFETCH_INTERVAL seconds, the catalogs listed in
+# TRANSEND_PREFETCH and the most requested cached keys are refreshed before
+# they expire.
+prefetch_tools = [tool for tool in os.getenv("TRANSEND_PREFETCH", "get_all_branches,get_all_tags,get_all_sort_types").split(",") if tool]
+for tool in prefetch_tools:
+    if tool not in PREFETCH_CALLS:
+        raise ValueError(f"TRANSEND_PREFETCH: cannot prefetch {tool!r}; choose from {sorted(PREFETCH_CALLS)}")
+prefetch_interval = float(os.getenv("TRANSEND_PREFETCH_INTERVAL", "60"))
+prefetch_hot_keys = int(os.getenv("TRANSEND_PREFETCH_HOT_KEYS", "16"))
+
+# Reference catalogs are also served as resources, whose _meta carries an
+# ETag of the content. When a fetch finds new content, subscribers get
+# resources/updated and every session that read a catalog list_changed.
+CATALOG_RESOURCES = {
+    "transend://catalog/branches": "get_all_branches",
+    "transend://catalog/sort_types": "get_all_sort_types",
+    "transend://catalog/tags": "get_all_tags",
+    "transend://catalog/dtcs": "get_all_dtcs",
+    "transend://catalog/articles": "get_articles",
+}
+CATALOG_KEYS = {make_key(tool, **PREFETCH_CALLS[tool][1]): uri for uri, tool in CATALOG_RESOURCES.items()}
+catalog_versions = CatalogVersions()
+
+# Upstream calls may be rate limited per endpoint group with token buckets,
+# configured as "rate/burst" in requests per second. Limits are off ("0")
+# by default: Transend publishes no quotas to default them to.
+RATE_GROUPS = {
+    "vehicle": ("get_all_dtcs", "get_drive_types_by_vhid", "get_engines_by_vhid", "get_makes_by_vhid",
+                "get_models_by_vhid", "get_submodels_by_vhid", "get_transmissions", "get_vehicle_by_vhid",
+                "get_vehicles_by_vin", "get_years", "get_year_make_model_vhid"),
+    "product": ("get_all_sort_types", "get_all_tags", "get_availability_by_item_id", "get_available_quantity",
+                "get_brands", "get_categories"),
+    "account": ("delete_bank_account", "update_credit_card_default", "delete_credit_card", "get_active_bank_accounts",
+                "get_credit_cards", "post_credit_card", "get_customer_info", "get_verified_bank_accounts",
+                "post_bank_account", "verify_bank_account"),
+}
+TOOL_GROUPS = {tool: group for group, tools in RATE_GROUPS.items() for tool in tools}
+
+# Whole-catalog fetches wait behind interactive lookups when a group is
+# saturated; fan-out tools and background refreshes lower their own priority.
+BULK_TOOLS = {"get_all_dtcs", "get_all_branches", "get_articles", "get_users", "get_transmissions",
+              "get_all_tags", "get_all_sort_types"}
+
+# SDK methods that make several HTTP requests per call
+REQUEST_COST = {"get_year_make_model_vhid": 3}
+
+rate_limiter = RateLimiter({
+    group: parse_limit(os.getenv(f"TRANSEND_RATE_LIMIT_{group.upper()}", "0"))
+    for group in (*RATE_GROUPS, "other")
+})
+
+# Read calls are retried on timeouts, connection errors and 429/5xx
+# responses; every endpoint fails fast while its circuit breaker is open.
+resilience = Resilience(
+    attempts=int(os.getenv("TRANSEND_RETRY_ATTEMPTS", "3")),
+    base_delay=float(os.getenv("TRANSEND_RETRY_BASE_DELAY", "0.2")),
+    max_delay=float(os.getenv("TRANSEND_RETRY_MAX_DELAY", "2")),
+    deadline=float(os.getenv("TRANSEND_RETRY_DEADLINE", "10")),
+    failure_threshold=int(os.getenv("TRANSEND_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("TRANSEND_BREAKER_RESET", "30")),
+)
+
+# Identical read calls in flight at the same time share one upstream request.
+singleflight = SingleFlight()
+
+# Local year/make/model index, loaded from its last snapshot on first use and
+# refreshed year by year in the background once the server is running.
+cache_dir = os.path.expanduser(os.getenv("TRANSEND_CACHE_DIR", "~/.cache/transend-mcp"))
+ymm_index: Optional[YMMIndex] = None
+ymm_max_age = float(os.getenv("TRANSEND_YMM_MAX_AGE", str(7 * 24 * 3600)))
+ymm_background_refresh = os.getenv("TRANSEND_YMM_BACKGROUND_REFRESH", "1") == "1"
+
+# Vehicle data never changes for a given vhid or VIN, so it is kept in an
+# on-disk cache that survives server restarts.
+vehicle_store = PersistentCache(
+    os.path.join(cache_dir, "vehicles.sqlite3"),
+    max_entries=int(os.getenv("TRANSEND_VEHICLE_CACHE_MAX_ENTRIES", "50000")),
+    eviction=os.getenv("TRANSEND_VEHICLE_CACHE_EVICTION", "lru"),
+    max_age=float(os.getenv("TRANSEND_VEHICLE_CACHE_MAX_AGE", "0")),
+)
+
+# Searchable view of the DTC catalog, rebuilt whenever the cached catalog changes.
+dtc_index: Optional[DTCIndex] = None
+
+# Branch locations for nearest-stock searches, rebuilt whenever the cached
+# branch list changes. find_stock_nearby checks up to stock_search_window
+# branches at a time, nearest first.
+branch_index: Optional[BranchIndex] = None
+stock_search_window = int(os.getenv("TRANSEND_STOCK_SEARCH_WINDOW", "4"))
+
+# Fields the quantity endpoint may report the available quantity under.
+QUANTITY_FIELDS = ("quantity", "availableQuantity", "quantityAvailable", "qty")
+
+logger = logging.getLogger("transend")
+
+# Tool results are sent as pretty-printed JSON unless a more compact output
+# format is chosen: per session with the X-Transend-Output-Format header, per
+# tool with TRANSEND_TOOL_OUTPUT_FORMATS, or for every tool with
+# TRANSEND_OUTPUT_FORMAT, in that order of precedence. See formats.py.
+output_format = parse_format(os.getenv("TRANSEND_OUTPUT_FORMAT", "json"))
+tool_output_formats = parse_tool_formats(os.getenv("TRANSEND_TOOL_OUTPUT_FORMATS", ""))
+
+# Every tool is wrapped with @instrumented, recording its latency, upstream
+# time, response size, errors and concurrency. Set TRANSEND_METRICS_FILE to
+# also write a JSON snapshot every TRANSEND_METRICS_INTERVAL seconds.
+metrics = Metrics()
+instrumented = metrics.instrument
+metrics_file = os.getenv("TRANSEND_METRICS_FILE")
+metrics_interval = float(os.getenv("TRANSEND_METRICS_INTERVAL", "60"))
+
+# Background tasks are shared by all sessions: started with the first
+# session and cancelled when the last one ends.
+background_tasks: List[asyncio.Task] = []
+active_sessions = 0
+
+@asynccontextmanager
+async def _lifespan(server):
+    """Run background maintenance tasks for as long as any session is open."""
+    global active_sessions
+    active_sessions += 1
+    if active_sessions == 1:
+        if ymm_background_refresh:
+            background_tasks.append(asyncio.create_task(_refresh_ymm_index()))
+        if metrics_file:
+            background_tasks.append(asyncio.create_task(_dump_metrics()))
+        if prefetch_tools or prefetch_hot_keys:
+            background_tasks.append(asyncio.create_task(_prefetch()))
+    try:
+        yield {}
+    finally:
+        active_sessions -= 1
+        if active_sessions == 0:
+            for task in background_tasks:
+                task.cancel()
+            background_tasks.clear()
 
 # Initialize FastMCP server
-mcp = FastMCP("transend")
+mcp = FastMCP("transend", lifespan=_lifespan)
+
+def _credentials() -> Tuple[str, str]:
+    """
+    Get the Transend credentials of the current MCP session.
+
+    HTTP sessions sending one header without the other, or neither when
+    the server's credentials are not allowed, get a PermissionError.
+
+    Returns:
+        The (api_key, api_token) sent as HTTP headers by the session, or the
+        server's own credentials for stdio, background tasks and, when
+        allowed, HTTP sessions without them
+    """
+    try:
+        request = request_ctx.get().request
+    except LookupError:
+        request = None
+    if request is None:
+        return api_key, api_token
+    key, token = request.headers.get(API_KEY_HEADER), request.headers.get(API_TOKEN_HEADER)
+    if key and token:
+        return key, token
+    if allow_server_credentials and not key and not token:
+        return api_key, api_token
+    raise PermissionError("HTTP sessions must send their Transend credentials in the "
+                          "X-Transend-Api-Key and X-Transend-Api-Token headers")
+
+def _session_header(name: str) -> Optional[str]:
+    """
+    Get an HTTP header sent by the current MCP session.
+
+    Args:
+        name: The header name
+
+    Returns:
+        The header value, or None for stdio and sessions without it
+    """
+    try:
+        request = request_ctx.get().request
+    except LookupError:
+        return None
+    return request.headers.get(name) if request is not None else None
+
+def formatted(func: Callable) -> Callable:
+    """
+    Render a tool's results in the output format chosen for the session or tool.
+
+    Args:
+        func: The tool function
+
+    Returns:
+        The wrapped tool, with the same signature
+    """
+    name = func.__name__
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        result = await func(*args, **kwargs)
+        requested = _session_header(OUTPUT_FORMAT_HEADER)
+        try:
+            chosen = parse_format(requested) if requested else tool_output_formats.get(name, output_format)
+        except ValueError as e:
+            return {"error": str(e)}
+        return render(result, chosen)
+    return wrapper
+
+def _new_pool() -> "ConnectionPool":
+    """Build a connection pool with the configured size and timeouts"""
+    from http_pool import ConnectionPool
+    return ConnectionPool(maxsize=pool_maxsize, connect_timeout=connect_timeout,
+                          read_timeout=read_timeout, http2=http2)
+
+def _http_pool() -> "ConnectionPool":
+    """Get the connection pool of the server's own client, creating it on first use"""
+    global http_pool
+    with client_lock:
+        if http_pool is None:
+            http_pool = _new_pool()
+    return http_pool
+
+def _new_client(key: str, token: str, pool: Optional["ConnectionPool"] = None) -> "TransendAPIClient":
+    """Build a Transend client that sends its requests through a pool, the shared one by default"""
+    from transend.client import TransendAPIClient
+    return (pool or _http_pool()).attach(TransendAPIClient(key, token, base_url))
+
+def _new_tenant(credentials: Tuple[str, str]) -> Tuple["TransendAPIClient", "ConnectionPool"]:
+    """Build the client and connection pool of a session's credential set"""
+    pool = _new_pool()
+    return _new_client(*credentials, pool=pool), pool
+
+def _tenant_evicted(tenant: str) -> None:
+    """Drop the cached account data of an evicted tenant"""
+    response_cache.invalidate(*ACCOUNT_SCOPED, tenant=tenant)
+
+tenants = TenantRegistry(_new_tenant, max_tenants=max_tenants, idle_timeout=tenant_idle_timeout,
+                         on_evict=_tenant_evicted)
+
+def _client() -> "TransendAPIClient":
+    """
+    Get the Transend client for the current MCP session.
+
+    Returns:
+        The server's own client, or the tenant client built from the
+        session's credentials
+    """
+    global client
+    credentials = _credentials()
+    if credentials == (api_key, api_token):
+        with client_lock:
+            if client is None:
+                client = _new_client(api_key, api_token)
+        return client
+    return tenants.get(credentials)
+
+def _ymm_index() -> YMMIndex:
+    """Get the YMM index, loading its snapshot on first use"""
+    global ymm_index
+    if ymm_index is None:
+        ymm_index = YMMIndex.load(os.path.join(cache_dir, "ymm_index.json"))
+    return ymm_index
+
+def _tenant() -> str:
+    """
+    Identify the credential set of the current MCP session without exposing it.
+
+    Returns:
+        A short hash of the session's credentials
+    """
+    return tenant_id(_credentials())
+
+async def _run(func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a blocking Transend SDK call on the worker pool.
+
+    Args:
+        func: The SDK method to call
+        *args: Positional arguments for the call
+        **kwargs: Keyword arguments for the call
+
+    Returns:
+        Whatever the SDK method returns
+    """
+    loop = asyncio.get_running_loop()
+    # Copy the context, so the SDK call sees its attempt_timeout
+    return await loop.run_in_executor(executor, contextvars.copy_context().run, partial(func, *args, **kwargs))
+
+async def _rate_limit(tool: str) -> None:
+    """
+    Wait until the tool's rate limit allows one more upstream request.
+
+    Args:
+        tool: The tool name, which selects the endpoint group and priority
+    """
+    level = max(current_priority.get(), BULK if tool in BULK_TOOLS else INTERACTIVE)
+    await rate_limiter.acquire(TOOL_GROUPS.get(tool, "other"), level, REQUEST_COST.get(tool, 1))
+
+async def _upstream(tool: str, func: Callable, *args, retry: bool = True, **kwargs) -> Any:
+    """
+    Call upstream through the tool's circuit breaker, each attempt once its rate limit allows it.
+
+    Time queued for the rate limit counts neither against the retry
+    deadline nor as a failure of the endpoint.
+
+    Args:
+        tool: The tool name, which selects the endpoint, group and priority
+        func: The SDK method to call
+        *args: Positional arguments for the call
+        retry: Retry transient failures; only for idempotent calls
+        **kwargs: Keyword arguments for the call
+
+    Returns:
+        Whatever the SDK method returns
+    """
+    return await resilience.call(tool, lambda: _run(func, *args, **kwargs), retry=retry,
+                                 acquire=partial(_rate_limit, tool))
+
+async def _fetch(tool: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    Run a read-only SDK call, sharing it with identical calls already in flight.
+
+    Args:
+        tool: The tool name, used with the arguments to identify identical calls
+        func: The SDK method to call
+        *args: Positional arguments for the call
+        **kwargs: Keyword arguments for the call
+
+    Returns:
+        Whatever the SDK method returns
+    """
+    # Keyed per tenant, so sessions never share results across accounts.
+    key = (_tenant(), *make_key(tool, *args, **kwargs))
+    started = time.perf_counter()
+    error = None
+    try:
+        return await singleflight.do(key, lambda: _upstream(tool, func, *args, **kwargs))
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        metrics.upstream(time.perf_counter() - started, error)
+
+async def _cached(tool: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    Serve a tool result from the response cache, calling upstream on a miss.
+
+    Args:
+        tool: The tool name, used for the TTL lookup and the cache key
+        func: The SDK method to call on a miss
+        *args: Positional arguments for the call
+        **kwargs: Keyword arguments for the call
+
+    Returns:
+        The cached or freshly fetched result
+    """
+    if tool in ACCOUNT_SCOPED:
+        key = make_key(tool, _tenant(), *args, **kwargs)
+    else:
+        key = make_key(tool, *args, **kwargs)
+        if prefetching and prefetch_hot_keys and tool in CACHED_APIS:
+            key_hits[key] += 1
+            refresh_calls[key] = (tool, CACHED_APIS[tool], args, kwargs)
+    result = response_cache.get(key)
+    if result is not MISSING:
+        metrics.cache_hit()
+        return result
+    if stale_while_revalidate and tool not in ACCOUNT_SCOPED:
+        result = response_cache.get_stale(key)
+        if result is not MISSING:
+            _revalidate(key, tool, func, args, kwargs)
+            metrics.cache_hit()
+            return result
+    try:
+        result = await _fetch(tool, func, *args, **kwargs)
+    except Exception as e:
+        # Account data is never served stale
+        if tool in ACCOUNT_SCOPED or not (isinstance(e, CircuitOpenError) or is_transient(e)):
+            raise
+        result = response_cache.get_stale(key)
+        if result is MISSING:
+            raise
+        logger.warning("Serving stale %s while Transend is failing: %s", tool, e)
+        resilience.stale_served += 1
+        metrics.cache_hit()
+        return result
+    response_cache.set(key, result, CACHE_TTLS[tool])
+    await _catalog_stored(key, result)
+    return result
+
+def _revalidate(key: tuple, tool: str, func: Callable, args: tuple, kwargs: dict) -> asyncio.Task:
+    """
+    Refresh a cache entry in the background, once per key at a time.
+
+    Args:
+        key: The cache key
+        tool: The tool name, used for the TTL lookup
+        func: The SDK method to call
+        args: Positional arguments for the call
+        kwargs: Keyword arguments for the call
+
+    Returns:
+        The refresh task
+    """
+    task = revalidating.get(key)
+    if task is None:
+        task = asyncio.create_task(_refresh(key, tool, func, *args, **kwargs))
+        revalidating[key] = task
+        task.add_done_callback(lambda _: revalidating.pop(key, None))
+    return task
+
+async def _refresh(key: tuple, tool: str, func: Callable, *args, **kwargs) -> None:
+    """Fetch a cached tool result again and store it; failures keep the old entry."""
+    with priority(BACKGROUND):
+        try:
+            result = await _fetch(tool, func, *args, **kwargs)
+        except Exception as e:
+            logger.warning("Could not refresh %s: %s", tool, e)
+            return
+    response_cache.set(key, result, CACHE_TTLS[tool])
+    await _catalog_stored(key, result)
+
+async def _catalog_stored(key: tuple, result: Any) -> None:
+    """
+    Version a freshly fetched catalog and tell its watchers when it changed.
+
+    Args:
+        key: The cache key the result was stored under
+        result: The fetched result
+    """
+    uri = CATALOG_KEYS.get(key)
+    if uri is None:
+        return
+    changed = await _run(catalog_versions.update, uri, result)
+    catalog_resources[uri].meta = catalog_versions.version(uri)
+    if not changed:
+        return
+    # Sent in the background, so a slow session never holds up the caller
+    task = asyncio.create_task(_notify_change(uri))
+    notifying.add(task)
+    task.add_done_callback(notifying.discard)
+
+async def _notify_change(uri: str) -> None:
+    """Tell every session that read a catalog that it changed, all at once."""
+    subscribers = set(catalog_versions.subscribers(uri))
+    await asyncio.gather(*(_notify(session, uri, session in subscribers) for session in catalog_versions.readers()))
+
+async def _notify(session: Any, uri: str, subscribed: bool) -> None:
+    """
+    Tell one session that a catalog changed; a session that cannot be reached is forgotten.
+
+    Args:
+        session: The MCP session
+        uri: The changed catalog's resource URI
+        subscribed: Whether the session subscribed to the catalog itself
+    """
+    try:
+        if subscribed:
+            await session.send_resource_updated(AnyUrl(uri))
+        await session.send_resource_list_changed()
+        catalog_versions.notifications += 1
+    except Exception as e:
+        logger.warning("Could not notify a session that %s changed: %s", uri, e)
+        catalog_versions.forget(session)
+
+def _prefetch_targets() -> Dict[tuple, Tuple[str, Callable, tuple, dict]]:
+    """
+    Pick the cache entries the prefetcher keeps warm.
+
+    Returns:
+        The configured catalogs, the catalogs sessions subscribed to and
+        the most requested keys, with the call that refreshes each
+    """
+    calls = {}
+    subscribed = [tool for uri, tool in CATALOG_RESOURCES.items() if catalog_versions.subscribers(uri)]
+    for tool in prefetch_tools + subscribed:
+        api, kwargs = PREFETCH_CALLS[tool]
+        calls[make_key(tool, **kwargs)] = (tool, api, (), kwargs)
+    for key, _ in key_hits.most_common(prefetch_hot_keys):
+        if key in refresh_calls:
+            calls.setdefault(key, refresh_calls[key])
+    sdk = _client()
+    return {key: (tool, getattr(getattr(sdk, api), tool), args, kwargs)
+            for key, (tool, api, args, kwargs) in calls.items()}
+
+async def _prefetch_once() -> None:
+    """Refresh every prefetch target that is missing or expires before the next round."""
+    for key, call in _prefetch_targets().items():
+        expires_in = response_cache.expires_in(key)
+        if expires_in is None or expires_in < 2 * prefetch_interval:
+            await _revalidate(key, *call)
+    # Forget keys that left the cache, and let old popularity fade
+    for key in list(refresh_calls):
+        if response_cache.expires_in(key) is None:
+            del refresh_calls[key]
+            key_hits.pop(key, None)
+    for key in list(key_hits):
+        key_hits[key] //= 2
+        if not key_hits[key]:
+            del key_hits[key]
+
+async def _prefetch() -> None:
+    """Keep hot catalog entries warm for as long as the server runs."""
+    global prefetching
+    await _run(_client)
+    prefetching = True
+    try:
+        while True:
+            try:
+                await _prefetch_once()
+            except Exception:
+                logger.exception("Prefetch round failed")
+            await asyncio.sleep(prefetch_interval)
+    finally:
+        prefetching = False
+        key_hits.clear()
+        refresh_calls.clear()
+
+async def _mutate(tool: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    Call a mutating SDK method and invalidate the cache entries it affects.
+
+    Args:
+        tool: The mutating tool name
+        func: The SDK method to call
+        *args: Positional arguments for the call
+        **kwargs: Keyword arguments for the call
+
+    Returns:
+        Whatever the SDK method returns
+    """
+    started = time.perf_counter()
+    error = None
+    try:
+        # Not retried: the call may have been applied even if it failed
+        return await _upstream(tool, func, *args, retry=False, **kwargs)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        metrics.upstream(time.perf_counter() - started, error)
+        # A failed mutation may still have been applied upstream.
+        response_cache.invalidate(*INVALIDATES.get(tool, ()), tenant=_tenant())
+
+async def _persisted(tool: str, func: Callable, key: str) -> Any:
+    """
+    Serve a vehicle lookup from the on-disk cache, calling upstream on a miss.
+
+    Empty results are not stored, since a VIN or vhid the catalog does not
+    know yet may be added later.
+
+    Args:
+        tool: The tool name, used as the key prefix
+        func: The SDK method to call on a miss
+        key: The vhid or VIN passed to the SDK method
+
+    Returns:
+        The cached or freshly fetched result
+    """
+    store_key = f"{tool}:{key}"
+    result = await _run(vehicle_store.get, store_key)
+    if result is MISSING:
+        result = await _fetch(tool, func, key)
+        if result:
+            await _run(vehicle_store.set, store_key, result)
+    else:
+        metrics.cache_hit()
+    return result
+
+async def _get_dtc_index() -> DTCIndex:
+    """
+    Get the DTC index, rebuilding it when the cached catalog was refreshed.
+
+    Returns:
+        The DTC index
+    """
+    global dtc_index
+    dtcs = await _cached("get_all_dtcs", _client().vehicle.get_all_dtcs)
+    if dtc_index is None or dtc_index.source is not dtcs:
+        dtc_index = await _run(DTCIndex, dtcs)
+    return dtc_index
+
+async def _get_branch_index() -> BranchIndex:
+    """
+    Get the branch index, rebuilding it when the cached branch list changed.
+
+    Returns:
+        An index over all branches, active or not
+    """
+    global branch_index
+    branches = await _cached("get_all_branches", _client().branch.get_all_branches, active=None)
+    if branch_index is None or branch_index.source is not branches:
+        branch_index = await _run(BranchIndex, branches)
+    return branch_index
+
+def _available_quantity(result: Any) -> float:
+    """
+    Extract the available quantity from a quantity response.
+
+    Args:
+        result: The get_available_quantity response
+
+    Returns:
+        The quantity, or 0 when the response has none
+    """
+    if isinstance(result, dict):
+        for field in QUANTITY_FIELDS:
+            try:
+                return float(result[field])
+            except (KeyError, TypeError, ValueError):
+                continue
+    return 0.0
+
+def _branch_number(branch: Dict) -> str:
+    """
+    Extract the branch number from a branch record.
+
+    Args:
+        branch: A branch as returned by the branch API
+
+    Returns:
+        The branch number
+    """
+    number = record_branch_number(branch)
+    if number is None:
+        raise KeyError(f"branch record has no number: {branch}")
+    return number
+
+async def _resolve_vhid(year: Optional[int], make: Optional[str], model: Optional[str], vin: Optional[str]) -> Dict[str, Any]:
+    """
+    Look up the vhid of a vehicle given by VIN or by year, make and model.
+
+    Args:
+        year: Optional vehicle year
+        make: Optional vehicle make
+        model: Optional vehicle model
+        vin: Optional VIN, used instead of year/make/model
+
+    Returns:
+        The vhid, how it was found ("vin" or "ymm") and, for a VIN matching
+        several vehicles, the other candidates; or an error
+    """
+    try:
+        if vin:
+            matches = await _persisted("get_vehicles_by_vin", _client().vehicle.get_vehicles_by_vin, vin)
+            vhids = [match["vhid"] for match in matches if match.get("vhid")]
+            if not vhids:
+                return {"error": "VIN not found"}
+            context = {"vhid": vhids[0], "source": "vin"}
+            if len(vhids) > 1:
+                context["candidates"] = vhids
+            return context
+        if year and make and model:
+            found = await _fetch("get_year_make_model_vhid", _client().vehicle.get_year_make_model_vhid, year, make, model)
+            if "error" in found:
+                return found
+            return {"vhid": found["vhid"], "source": "ymm"}
+        return {"error": "Provide either a VIN or year, make and model"}
+    except Exception as e:
+        return {"error": str(e)}
+
+async def _index_year(year: Any, year_vhid: str) -> None:
+    """
+    Fetch the makes and models of one year into the YMM index.
+
+    Args:
+        year: The vehicle year
+        year_vhid: The year's vhid
+    """
+    makes = await _fetch("get_makes_by_vhid", _client().vehicle.get_makes_by_vhid, year_vhid)
+    semaphore = asyncio.Semaphore(bulk_concurrency)
+
+    async def with_models(make):
+        async with semaphore:
+            models = await _fetch("get_models_by_vhid", _client().vehicle.get_models_by_vhid, make["vhid"])
+        return {"name": make["name"], "vhid": make["vhid"], "models": models}
+
+    _ymm_index().update_year(year, year_vhid, await asyncio.gather(*(with_models(make) for make in makes)))
+
+async def _refresh_ymm_index() -> None:
+    """Refresh stale years of the YMM index, newest first, saving after each."""
+    # Runs in its own task, so the lowered priority only applies to the refresh
+    with priority(BACKGROUND):
+        # Load the SDK off the event loop, which may still be answering the handshake
+        await _run(_client)
+        await _run(_ymm_index)
+        try:
+            years = await _cached("get_years", _client().vehicle.get_years, vhid=None)
+        except Exception:
+            logger.exception("Could not list years for the YMM index")
+            return
+        for entry in sorted(years, key=lambda y: int(y["year"]), reverse=True):
+            if _ymm_index().age(entry["year"]) < ymm_max_age:
+                continue
+            try:
+                await _index_year(entry["year"], entry["vhid"])
+            except Exception:
+                logger.exception("Could not index year %s", entry["year"])
+                continue
+            await _save_ymm_index()
+
+async def _save_ymm_index() -> None:
+    """Write the YMM index snapshot; failures are logged, as lookups keep using the index in memory."""
+    try:
+        await _run(_ymm_index().save)
+    except Exception:
+        logger.exception("Could not save the YMM index to %s", _ymm_index().path)
+
+@mcp.resource("transend://cache/stats", mime_type="application/json")
+def cache_stats() -> Dict[str, Any]:
+    """Counters of the response cache, the on-disk vehicle cache and request coalescing."""
+    return {
+        "response_cache": response_cache.stats(),
+        "vehicle_store": vehicle_store.stats(),
+        "singleflight": singleflight.stats(),
+        "revalidating": len(revalidating),
+    }
+
+@mcp.resource("transend://metrics", mime_type="application/json")
+def tool_metrics() -> Dict[str, Any]:
+    """Per-tool latency, upstream time, response size, error and concurrency metrics."""
+    return metrics.snapshot()
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def prometheus_metrics(request: Request) -> Response:
+    """Serve the tool metrics to Prometheus when running over HTTP."""
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+async def _dump_metrics() -> None:
+    """Periodically write the tool metrics to TRANSEND_METRICS_FILE."""
+    while True:
+        await asyncio.sleep(metrics_interval)
+        try:
+            await _run(metrics.dump, metrics_file)
+        except Exception:
+            logger.exception("Could not write metrics to %s", metrics_file)
+
+@mcp.resource("transend://upstream/health", mime_type="application/json")
+def upstream_health() -> Dict[str, Any]:
+    """Retry counters and the circuit breaker state of every upstream endpoint."""
+    return resilience.stats()
+
+@mcp.resource("transend://upstream/rate_limits", mime_type="application/json")
+def rate_limits() -> Dict[str, Any]:
+    """Token-bucket state, queue depth and wait times by priority of every endpoint group."""
+    return rate_limiter.stats()
+
+@mcp.resource("transend://http/stats", mime_type="application/json")
+def http_stats() -> Dict[str, Any]:
+    """Utilization and wait times of the upstream connection pool."""
+    return _http_pool().stats()
+
+@mcp.resource("transend://tenants", mime_type="application/json")
+def tenant_stats() -> Dict[str, Any]:
+    """Tenants with a client of their own, their idle times and connection pools, and registry counters."""
+    return tenants.stats()
+
+def _catalog_reader(uri: str) -> Callable:
+    """Build the read function of a catalog resource."""
+    tool = CATALOG_RESOURCES[uri]
+    api, kwargs = PREFETCH_CALLS[tool]
+
+    async def read() -> Any:
+        try:
+            catalog_versions.read_by(request_ctx.get().session)
+        except LookupError:
+            pass
+        return await _cached(tool, getattr(getattr(_client(), api), tool), **kwargs)
+    return read
+
+catalog_resources: Dict[str, FunctionResource] = {}
+for uri, tool in CATALOG_RESOURCES.items():
+    catalog_resources[uri] = FunctionResource.from_function(
+        _catalog_reader(uri), uri=uri, name=f"catalog_{uri.rsplit('/', 1)[-1]}", mime_type="application/json",
+        description=f"The full catalog {tool} returns. Its _meta.etag changes only when the content does; "
+                    "subscribe to be notified when it does.")
+    mcp.add_resource(catalog_resources[uri])
+
+@mcp.resource("transend://catalogs", mime_type="application/json")
+def catalog_index() -> Dict[str, Any]:
+    """Catalog resources with the tool each mirrors, their current ETag and subscribers, and notification counters."""
+    stats = catalog_versions.stats()
+    stats["catalogs"] = {uri: {"tool": tool, **stats["catalogs"].get(uri, {"etag": None})}
+                         for uri, tool in CATALOG_RESOURCES.items()}
+    return stats
+
+@mcp._mcp_server.subscribe_resource()
+async def subscribe_catalog(uri: AnyUrl) -> None:
+    """Notify the session with resources/updated when a catalog changes."""
+    if str(uri) not in CATALOG_RESOURCES:
+        raise ValueError(f"Only catalog resources can be subscribed to: {', '.join(CATALOG_RESOURCES)}")
+    catalog_versions.subscribe(str(uri), request_ctx.get().session)
+
+@mcp._mcp_server.unsubscribe_resource()
+async def unsubscribe_catalog(uri: AnyUrl) -> None:
+    """Stop notifying the session about a catalog."""
+    catalog_versions.unsubscribe(str(uri), request_ctx.get().session)
+
+_initialization_options = mcp._mcp_server.create_initialization_options
+
+def _catalog_initialization_options(notification_options: Optional[NotificationOptions] = None,
+                                    experimental_capabilities: Optional[Dict[str, Dict[str, Any]]] = None):
+    """Advertise resource subscriptions and list_changed, which FastMCP leaves off."""
+    notification_options = notification_options or NotificationOptions()
+    notification_options.resources_changed = True
+    options = _initialization_options(notification_options, experimental_capabilities)
+    options.capabilities.resources.subscribe = True
+    return options
+
+mcp._mcp_server.create_initialization_options = _catalog_initialization_options
 
 # BranchAPI Tools
 @mcp.tool()
-def get_all_branches(active: Optional[bool] = None):
+@instrumented
+@formatted
+async def get_all_branches(active: Optional[bool] = None, fields: Optional[List[str]] = None, limit: Optional[int] = None, offset: int = 0, filter: Optional[Dict[str, Any]] = None):
     """
     Get all branches from the Transend API.
     
     Args:
         active: Optional flag to filter branches by active status
+        fields: Optional field names to keep in each branch
+        limit: Optional maximum number of branches to return
+        offset: Number of matching branches to skip, e.g. the next_offset of a previous page
+        filter: Optional field filter; strings match case-insensitively as substrings
     
     Returns:
-        List of branches
+        List of branches, or a page {items, total, offset, next_offset} when
+        paging options are given or the list is too large to return at once
     """
     try:
-        branches = client.branch.get_all_branches(active=active)
-        return branches
+        branches = await _cached("get_all_branches", _client().branch.get_all_branches, active=active)
+        return project(branches, fields, limit, offset, filter, max_response_bytes)
     except Exception as e:
         return {"error": str(e)}
     
 @mcp.tool()
-def get_branch_by_number(branch_number: str):
+@instrumented
+@formatted
+async def get_branch_by_number(branch_number: str):
     """
     Get a specific branch by its number from the Transend API.
     
@@ -42,14 +1001,16 @@ def get_branch_by_number(branch_number: str):
         Branch information
     """
     try:
-        branch = client.branch.get_branch_by_number(branch_number)
+        branch = await _fetch("get_branch_by_number", _client().branch.get_branch_by_number, branch_number)
         return branch
     except Exception as e:
         return {"error": str(e)}
 
 # ProductAPI Tools
 @mcp.tool()
-def get_all_sort_types():
+@instrumented
+@formatted
+async def get_all_sort_types():
     """
     Get all sort types from the Transend API.
     
@@ -57,12 +1018,14 @@ def get_all_sort_types():
         List of sort types
     """
     try:
-        return client.product.get_all_sort_types()
+        return await _cached("get_all_sort_types", _client().product.get_all_sort_types)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_all_tags():
+@instrumented
+@formatted
+async def get_all_tags():
     """
     Get all tags from the Transend API.
     
@@ -70,12 +1033,14 @@ def get_all_tags():
         List of tags
     """
     try:
-        return client.product.get_all_tags()
+        return await _cached("get_all_tags", _client().product.get_all_tags)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_availability_by_item_id(item_id):
+@instrumented
+@formatted
+async def get_availability_by_item_id(item_id):
     """
     Get availability by item id.
     
@@ -86,12 +1051,14 @@ def get_availability_by_item_id(item_id):
         Availability information for the item
     """
     try:
-        return client.product.get_availability_by_item_id(item_id)
+        return await _fetch("get_availability_by_item_id", _client().product.get_availability_by_item_id, item_id)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_available_quantity(item_id, branch_number: str, availability_type_id):
+@instrumented
+@formatted
+async def get_available_quantity(item_id, branch_number: str, availability_type_id):
     """
     Get available quantity for a specific item.
     
@@ -104,12 +1071,147 @@ def get_available_quantity(item_id, branch_number: str, availability_type_id):
         Available quantity information
     """
     try:
-        return client.product.get_available_quantity(item_id, branch_number, availability_type_id)
+        return await _fetch("get_available_quantity", _client().product.get_available_quantity, item_id, branch_number, availability_type_id)
+    except Exception as e:
+        return {"error": str(e)}
+
+@mcp.tool()
+@instrumented
+@formatted
+async def get_available_quantities_bulk(item_ids: List[str], availability_type_id, branch_numbers: Optional[List[str]] = None,
+                                       raw: bool = False):
+    """
+    Get available quantities for many items across many branches in one call.
+
+    Args:
+        item_ids: The IDs of the items
+        availability_type_id: The availability type ID
+        branch_numbers: Optional branch numbers; defaults to all active branches
+        raw: Whether each cell holds the full quantity response instead of just the quantity
+
+    Returns:
+        Matrix of available quantities keyed by item ID, then branch number.
+        Failed cells hold an error instead of a quantity.
+    """
+    try:
+        if branch_numbers is None:
+            branches = await _cached("get_all_branches", _client().branch.get_all_branches, active=True)
+            branch_numbers = [_branch_number(branch) for branch in branches]
+    except Exception as e:
+        return {"error": str(e)}
+
+    semaphore = asyncio.Semaphore(bulk_concurrency)
+
+    async def fetch_cell(item_id, branch_number):
+        async with semaphore:
+            try:
+                with priority(BULK):
+                    result = await _fetch("get_available_quantity", _client().product.get_available_quantity, item_id, branch_number, availability_type_id)
+                return result if raw else _available_quantity(result)
+            except Exception as e:
+                return {"error": str(e)}
+
+    cells = [(item_id, branch_number) for item_id in item_ids for branch_number in branch_numbers]
+    results = await asyncio.gather(*(fetch_cell(*cell) for cell in cells))
+
+    quantities = {str(item_id): {} for item_id in item_ids}
+    errors = 0
+    for (item_id, branch_number), result in zip(cells, results):
+        quantities[str(item_id)][str(branch_number)] = result
+        if isinstance(result, dict) and "error" in result:
+            errors += 1
+    return {"branches": [str(number) for number in branch_numbers], "quantities": quantities, "errors": errors}
+
+@mcp.tool()
+@instrumented
+@formatted
+async def find_stock_nearby(item_id, branch_number: str, availability_type_id, radius: Optional[float] = None, quantity: int = 1):
+    """
+    Find the nearest branches that together have enough stock of an item.
+
+    Checks the given branch first, then other active branches nearest
+    first, a few at a time, and stops as soon as the nearest branches
+    checked have the requested quantity between them.
+
+    Args:
+        item_id: The ID of the item
+        branch_number: The branch to search from
+        availability_type_id: The availability type ID
+        radius: Optional maximum distance in miles; branches without known coordinates are skipped when given
+        quantity: The quantity needed
+
+    Returns:
+        Whether the quantity was found, the branches with stock nearest
+        first (branch number, name, distance in miles and quantity), the
+        nearest single branch with the whole quantity if any, and how many
+        of the candidate branches were checked
+    """
+    try:
+        index = await _get_branch_index()
     except Exception as e:
         return {"error": str(e)}
+    candidates = index.nearby(branch_number, radius)
+    if not candidates:
+        return {"error": f"Branch {branch_number} not found"}
+
+    async def check(branch):
+        try:
+            return await _fetch("get_available_quantity", _client().product.get_available_quantity, item_id, _branch_number(branch), availability_type_id)
+        except Exception as e:
+            return {"error": str(e)}
+
+    # Results are only used up to the first unchecked candidate, so the
+    # options are always the nearest ones whatever order calls finish in.
+    results: Dict[int, Any] = {}
+    pending: Dict[asyncio.Task, int] = {}
+    launched = covered = 0
+    found = 0.0
+    try:
+        while found < quantity:
+            while launched < len(candidates) and len(pending) < max(stock_search_window, 1):
+                pending[asyncio.ensure_future(check(candidates[launched][1]))] = launched
+                launched += 1
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                results[pending.pop(task)] = task.result()
+            while covered in results and found < quantity:
+                found += _available_quantity(results[covered])
+                covered += 1
+    finally:
+        for task in pending:
+            task.cancel()
+
+    options = []
+    errors = 0
+    for position in range(covered):
+        distance, branch = candidates[position]
+        result = results[position]
+        if isinstance(result, dict) and "error" in result:
+            errors += 1
+            continue
+        available = _available_quantity(result)
+        if available > 0:
+            options.append({"branch_number": _branch_number(branch), "name": branch.get("name"),
+                            "distance": distance, "quantity": available})
+    best = next((option for option in options if option["quantity"] >= quantity), None)
+    return {
+        "item_id": item_id,
+        "requested": quantity,
+        "fulfilled": found >= quantity,
+        "found": found,
+        "options": options,
+        "best": best,
+        "checked": covered,
+        "candidates": len(candidates),
+        "errors": errors,
+    }
 
 @mcp.tool()
-def get_brands(vhid: Optional[str] = None, phid: Optional[str] = None):
+@instrumented
+@formatted
+async def get_brands(vhid: Optional[str] = None, phid: Optional[str] = None):
     """
     Get brands information.
     
@@ -121,12 +1223,14 @@ def get_brands(vhid: Optional[str] = None, phid: Optional[str] = None):
         List of brands
     """
     try:
-        return client.product.get_brands(vhid=vhid, phid=phid)
+        return await _fetch("get_brands", _client().product.get_brands, vhid=vhid, phid=phid)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_categories(vhid: Optional[str] = None, phid: Optional[str] = None, search_id: Optional[str] = None):
+@instrumented
+@formatted
+async def get_categories(vhid: Optional[str] = None, phid: Optional[str] = None, search_id: Optional[str] = None):
     """
     Get categories information.
     
@@ -139,13 +1243,15 @@ def get_categories(vhid: Optional[str] = None, phid: Optional[str] = None, searc
         List of categories
     """
     try:
-        return client.product.get_categories(vhid=vhid, phid=phid, search_id=search_id)
+        return await _cached("get_categories", _client().product.get_categories, vhid=vhid, phid=phid, search_id=search_id)
     except Exception as e:
         return {"error": str(e)}
 
 # AccountAPI Tools
 @mcp.tool()
-def delete_bank_account(customer_stripe_id: int):
+@instrumented
+@formatted
+async def delete_bank_account(customer_stripe_id: int):
     """
     Delete a bank account.
     
@@ -156,13 +1262,15 @@ def delete_bank_account(customer_stripe_id: int):
         Success or error message
     """
     try:
-        client.account.delete_bank_account(customer_stripe_id)
+        await _mutate("delete_bank_account", _client().account.delete_bank_account, customer_stripe_id)
         return {"success": True}
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def update_credit_card_default(credit_card_guid: str):
+@instrumented
+@formatted
+async def update_credit_card_default(credit_card_guid: str):
     """
     Update the default credit card.
     
@@ -173,13 +1281,15 @@ def update_credit_card_default(credit_card_guid: str):
         Success or error message
     """
     try:
-        client.account.update_credit_card_default(UUID(credit_card_guid))
+        await _mutate("update_credit_card_default", _client().account.update_credit_card_default, UUID(credit_card_guid))
         return {"success": True}
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def delete_credit_card(credit_card_guid: str):
+@instrumented
+@formatted
+async def delete_credit_card(credit_card_guid: str):
     """
     Delete a credit card.
     
@@ -190,13 +1300,15 @@ def delete_credit_card(credit_card_guid: str):
         Success or error message
     """
     try:
-        client.account.delete_credit_card(UUID(credit_card_guid))
+        await _mutate("delete_credit_card", _client().account.delete_credit_card, UUID(credit_card_guid))
         return {"success": True}
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_active_bank_accounts():
+@instrumented
+@formatted
+async def get_active_bank_accounts():
     """
     Get active bank accounts.
     
@@ -204,12 +1316,14 @@ def get_active_bank_accounts():
         List of active bank accounts
     """
     try:
-        return client.account.get_active_bank_accounts()
+        return await _cached("get_active_bank_accounts", _client().account.get_active_bank_accounts)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_credit_cards():
+@instrumented
+@formatted
+async def get_credit_cards():
     """
     Get credit cards.
     
@@ -217,12 +1331,14 @@ def get_credit_cards():
         List of credit cards
     """
     try:
-        return client.account.get_credit_cards()
+        return await _cached("get_credit_cards", _client().account.get_credit_cards)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def post_credit_card(card_data: Dict):
+@instrumented
+@formatted
+async def post_credit_card(card_data: Dict):
     """
     Post a credit card.
     
@@ -233,12 +1349,14 @@ def post_credit_card(card_data: Dict):
         Credit card GUID or error
     """
     try:
-        return client.account.post_credit_card(card_data)
+        return await _mutate("post_credit_card", _client().account.post_credit_card, card_data)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_customer_info():
+@instrumented
+@formatted
+async def get_customer_info():
     """
     Get customer information.
     
@@ -246,12 +1364,14 @@ def get_customer_info():
         Customer info
     """
     try:
-        return client.account.get_customer_info()
+        return await _cached("get_customer_info", _client().account.get_customer_info)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_verified_bank_accounts():
+@instrumented
+@formatted
+async def get_verified_bank_accounts():
     """
     Get verified bank accounts.
     
@@ -259,12 +1379,14 @@ def get_verified_bank_accounts():
         List of verified bank accounts
     """
     try:
-        return client.account.get_verified_bank_accounts()
+        return await _cached("get_verified_bank_accounts", _client().account.get_verified_bank_accounts)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def post_bank_account(bank_account_data: Dict):
+@instrumented
+@formatted
+async def post_bank_account(bank_account_data: Dict):
     """
     Add a bank account.
     
@@ -275,12 +1397,14 @@ def post_bank_account(bank_account_data: Dict):
         Bank account GUID or error
     """
     try:
-        return client.account.post_bank_account(bank_account_data)
+        return await _mutate("post_bank_account", _client().account.post_bank_account, bank_account_data)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def verify_bank_account(verification_data: Dict):
+@instrumented
+@formatted
+async def verify_bank_account(verification_data: Dict):
     """
     Verify a bank account.
     
@@ -291,13 +1415,15 @@ def verify_bank_account(verification_data: Dict):
         Verification result
     """
     try:
-        return client.account.verify_bank_account(verification_data)
+        return await _mutate("verify_bank_account", _client().account.verify_bank_account, verification_data)
     except Exception as e:
         return {"error": str(e)}
 
 # ContentAPI Tools
 @mcp.tool()
-def get_article_resources(article_id: int):
+@instrumented
+@formatted
+async def get_article_resources(article_id: int):
     """
     Get article resources.
     
@@ -308,26 +1434,37 @@ def get_article_resources(article_id: int):
         List of article resources
     """
     try:
-        return client.content.get_article_resources(article_id)
+        return await _fetch("get_article_resources", _client().content.get_article_resources, article_id)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_articles():
+@instrumented
+@formatted
+async def get_articles(fields: Optional[List[str]] = None, limit: Optional[int] = None, offset: int = 0, filter: Optional[Dict[str, Any]] = None):
     """
     Get articles.
     
+    Args:
+        fields: Optional field names to keep in each article
+        limit: Optional maximum number of articles to return
+        offset: Number of matching articles to skip, e.g. the next_offset of a previous page
+        filter: Optional field filter; strings match case-insensitively as substrings
+    
     Returns:
-        List of articles
+        List of articles, or a page {items, total, offset, next_offset} when
+        paging options are given or the list is too large to return at once
     """
     try:
-        return client.content.get_articles()
+        return project(await _cached("get_articles", _client().content.get_articles), fields, limit, offset, filter, max_response_bytes)
     except Exception as e:
         return {"error": str(e)}
 
 # CoreAPI Tools
 @mcp.tool()
-def get_open_cores():
+@instrumented
+@formatted
+async def get_open_cores():
     """
     Get open cores.
     
@@ -335,40 +1472,107 @@ def get_open_cores():
         List of open cores
     """
     try:
-        return client.core.get_open_cores()
+        return await _fetch("get_open_cores", _client().core.get_open_cores)
     except Exception as e:
         return {"error": str(e)}
 
 # CustomerAPI Tools
 @mcp.tool()
-def get_users():
+@instrumented
+@formatted
+async def get_users(fields: Optional[List[str]] = None, limit: Optional[int] = None, offset: int = 0, filter: Optional[Dict[str, Any]] = None):
     """
     Get users.
     
+    Args:
+        fields: Optional field names to keep in each user
+        limit: Optional maximum number of users to return
+        offset: Number of matching users to skip, e.g. the next_offset of a previous page
+        filter: Optional field filter; strings match case-insensitively as substrings
+    
     Returns:
-        List of users
+        List of users, or a page {items, total, offset, next_offset} when
+        paging options are given or the list is too large to return at once
     """
     try:
-        return client.customer.get_users()
+        return project(await _fetch("get_users", _client().customer.get_users), fields, limit, offset, filter, max_response_bytes)
     except Exception as e:
         return {"error": str(e)}
 
 # VehicleAPI Tools
 @mcp.tool()
-def get_all_dtcs():
+@instrumented
+@formatted
+async def get_all_dtcs(fields: Optional[List[str]] = None, limit: Optional[int] = None, offset: int = 0, filter: Optional[Dict[str, Any]] = None):
     """
     Get all Diagnostic Trouble Codes.
     
+    Args:
+        fields: Optional field names to keep in each DTC
+        limit: Optional maximum number of DTCs to return
+        offset: Number of matching DTCs to skip, e.g. the next_offset of a previous page
+        filter: Optional field filter; strings match case-insensitively as substrings
+    
+    Returns:
+        List of DTCs, or a page {items, total, offset, next_offset} when
+        paging options are given or the list is too large to return at once
+    """
+    try:
+        return project(await _cached("get_all_dtcs", _client().vehicle.get_all_dtcs), fields, limit, offset, filter, max_response_bytes)
+    except Exception as e:
+        return {"error": str(e)}
+
+@mcp.tool()
+@instrumented
+@formatted
+async def search_dtcs(query: str = "", limit: int = 20, cursor: Optional[str] = None):
+    """
+    Search Diagnostic Trouble Codes by code prefix or description words.
+
+    Args:
+        query: Search terms, e.g. "P07" or "shift solenoid"; empty pages through all DTCs
+        limit: Maximum number of DTCs to return; pages are cut short at TRANSEND_MAX_RESPONSE_BYTES
+        cursor: Optional next_cursor from a previous page of the same query
+
+    Returns:
+        Page of matching DTCs with the total match count and a next_cursor, if more remain
+    """
+    try:
+        index = await _get_dtc_index()
+        offset = decode_cursor(cursor, query) if cursor else 0
+        # Pages are also cut at the response size budget, like the list tools
+        page = project(index.search(query), limit=max(limit, 1), offset=offset, max_bytes=max_response_bytes)
+        return {
+            "items": page["items"],
+            "total": page["total"],
+            "next_cursor": encode_cursor(query, page["next_offset"]) if page["next_offset"] is not None else None,
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+@mcp.tool()
+@instrumented
+@formatted
+async def get_dtc(code: str):
+    """
+    Get one Diagnostic Trouble Code.
+
+    Args:
+        code: The DTC code, e.g. P0700
+
     Returns:
-        List of DTCs
+        DTC information
     """
     try:
-        return client.vehicle.get_all_dtcs()
+        dtc = (await _get_dtc_index()).get(code)
+        return dtc if dtc is not None else {"error": f"DTC {code} not found"}
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_drive_types_by_vhid(vhid: str):
+@instrumented
+@formatted
+async def get_drive_types_by_vhid(vhid: str):
     """
     Get drive types by vhid.
     
@@ -379,12 +1583,14 @@ def get_drive_types_by_vhid(vhid: str):
         List of drive types
     """
     try:
-        return client.vehicle.get_drive_types_by_vhid(vhid)
+        return await _persisted("get_drive_types_by_vhid", _client().vehicle.get_drive_types_by_vhid, vhid)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_engines_by_vhid(vhid: str):
+@instrumented
+@formatted
+async def get_engines_by_vhid(vhid: str):
     """
     Get engines by vhid.
     
@@ -395,12 +1601,14 @@ def get_engines_by_vhid(vhid: str):
         List of engines
     """
     try:
-        return client.vehicle.get_engines_by_vhid(vhid)
+        return await _persisted("get_engines_by_vhid", _client().vehicle.get_engines_by_vhid, vhid)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_makes_by_vhid(vhid: str):
+@instrumented
+@formatted
+async def get_makes_by_vhid(vhid: str):
     """
     Get makes by vhid.
     
@@ -411,12 +1619,14 @@ def get_makes_by_vhid(vhid: str):
         List of makes
     """
     try:
-        return client.vehicle.get_makes_by_vhid(vhid)
+        return await _persisted("get_makes_by_vhid", _client().vehicle.get_makes_by_vhid, vhid)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_models_by_vhid(vhid: str):
+@instrumented
+@formatted
+async def get_models_by_vhid(vhid: str):
     """
     Get models by vhid.
     
@@ -427,12 +1637,14 @@ def get_models_by_vhid(vhid: str):
         List of models
     """
     try:
-        return client.vehicle.get_models_by_vhid(vhid)
+        return await _persisted("get_models_by_vhid", _client().vehicle.get_models_by_vhid, vhid)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_submodels_by_vhid(vhid: str):
+@instrumented
+@formatted
+async def get_submodels_by_vhid(vhid: str):
     """
     Get submodels by vhid.
     
@@ -443,29 +1655,39 @@ def get_submodels_by_vhid(vhid: str):
         List of submodels
     """
     try:
-        return client.vehicle.get_submodels_by_vhid(vhid)
+        return await _persisted("get_submodels_by_vhid", _client().vehicle.get_submodels_by_vhid, vhid)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_transmissions(tag_number: Optional[str] = None, transmission_mfr_code: Optional[str] = None):
+@instrumented
+@formatted
+async def get_transmissions(tag_number: Optional[str] = None, transmission_mfr_code: Optional[str] = None, fields: Optional[List[str]] = None, limit: Optional[int] = None, offset: int = 0, filter: Optional[Dict[str, Any]] = None):
     """
     Get transmission information.
     
     Args:
         tag_number: Optional tag number
         transmission_mfr_code: Optional transmission manufacturer code
+        fields: Optional field names to keep in each transmission
+        limit: Optional maximum number of transmissions to return
+        offset: Number of matching transmissions to skip, e.g. the next_offset of a previous page
+        filter: Optional field filter; strings match case-insensitively as substrings
         
     Returns:
-        List of transmissions
+        List of transmissions, or a page {items, total, offset, next_offset} when
+        paging options are given or the list is too large to return at once
     """
     try:
-        return client.vehicle.get_transmissions(tag_number=tag_number, transmission_mfr_code=transmission_mfr_code)
+        transmissions = await _fetch("get_transmissions", _client().vehicle.get_transmissions, tag_number=tag_number, transmission_mfr_code=transmission_mfr_code)
+        return project(transmissions, fields, limit, offset, filter, max_response_bytes)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_vehicle_by_vhid(vhid: str):
+@instrumented
+@formatted
+async def get_vehicle_by_vhid(vhid: str):
     """
     Get vehicle information by vhid.
     
@@ -476,12 +1698,14 @@ def get_vehicle_by_vhid(vhid: str):
         Vehicle information
     """
     try:
-        return client.vehicle.get_vehicle_by_vhid(vhid)
+        return await _persisted("get_vehicle_by_vhid", _client().vehicle.get_vehicle_by_vhid, vhid)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_vehicles_by_vin(vin: str):
+@instrumented
+@formatted
+async def get_vehicles_by_vin(vin: str):
     """
     Get vehicle information by VIN.
     
@@ -492,12 +1716,14 @@ def get_vehicles_by_vin(vin: str):
         Vehicle information
     """
     try:
-        return client.vehicle.get_vehicles_by_vin(vin)
+        return await _persisted("get_vehicles_by_vin", _client().vehicle.get_vehicles_by_vin, vin)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_years(vhid: Optional[str] = None):
+@instrumented
+@formatted
+async def get_years(vhid: Optional[str] = None):
     """
     Get the years for a given vhid.
     
@@ -508,12 +1734,14 @@ def get_years(vhid: Optional[str] = None):
         List of years
     """
     try:
-        return client.vehicle.get_years(vhid=vhid)
+        return await _cached("get_years", _client().vehicle.get_years, vhid=vhid)
     except Exception as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def get_year_make_model_vhid(year: int, make: str, model: str):
+@instrumented
+@formatted
+async def get_year_make_model_vhid(year: int, make: str, model: str):
     """
     Get the vhid for a given year, make, and model.
     
@@ -526,10 +1754,179 @@ def get_year_make_model_vhid(year: int, make: str, model: str):
         Vehicle ID (vhid) information
     """
     try:
-        return client.vehicle.get_year_make_model_vhid(year, make, model)
+        return await _fetch("get_year_make_model_vhid", _client().vehicle.get_year_make_model_vhid, year, make, model)
     except Exception as e:
         return {"error": str(e)}
-    
+
+@mcp.tool()
+@instrumented
+@formatted
+async def find_vehicle_candidates(year: int, make: str, model: Optional[str] = None, limit: int = 5):
+    """
+    Find vehicles matching a possibly misspelled or abbreviated make and model.
+
+    Matches are served from a local year/make/model index, so "Chevy" finds
+    "Chevrolet" and "F150" finds "F-150".
+
+    Args:
+        year: The vehicle year
+        make: The vehicle make, exact, prefix or misspelled
+        model: Optional vehicle model, exact, prefix or misspelled
+        limit: Maximum number of candidates to return
+
+    Returns:
+        Candidates ordered best first, each with year, make, model, vhid and score
+    """
+    try:
+        if str(year) not in _ymm_index().years:
+            years = await _cached("get_years", _client().vehicle.get_years, vhid=None)
+            entry = next((y for y in years if str(y.get("year")) == str(year)), None)
+            if entry is None:
+                return {"error": "Year not found"}
+            await _index_year(entry["year"], entry["vhid"])
+            await _save_ymm_index()
+        return _ymm_index().lookup(year, make, model or "", limit)
+    except Exception as e:
+        return {"error": str(e)}
+
+@mcp.tool()
+@instrumented
+@formatted
+async def resolve_vehicle(year: Optional[int] = None, make: Optional[str] = None, model: Optional[str] = None, vin: Optional[str] = None):
+    """
+    Resolve a vehicle from year/make/model or a VIN into one context document.
+
+    Looks up the vhid, then fetches the vehicle, engines, drive types and
+    submodels concurrently.
+
+    Args:
+        year: Optional vehicle year
+        make: Optional vehicle make
+        model: Optional vehicle model
+        vin: Optional vehicle identification number, used instead of year/make/model
+
+    Returns:
+        Vehicle context with the vhid, vehicle, engines, drive types and submodels
+    """
+    context = await _resolve_vhid(year, make, model, vin)
+    if "error" in context:
+        return context
+    vhid = context.pop("vhid")
+
+    lookups = {
+        "vehicle": ("get_vehicle_by_vhid", _client().vehicle.get_vehicle_by_vhid),
+        "engines": ("get_engines_by_vhid", _client().vehicle.get_engines_by_vhid),
+        "drive_types": ("get_drive_types_by_vhid", _client().vehicle.get_drive_types_by_vhid),
+        "submodels": ("get_submodels_by_vhid", _client().vehicle.get_submodels_by_vhid),
+    }
+
+    async def lookup(tool, func):
+        try:
+            return await _persisted(tool, func, vhid)
+        except Exception as e:
+            return {"error": str(e)}
+
+    results = await asyncio.gather(*(lookup(*entry) for entry in lookups.values()))
+    return {"vhid": vhid, **context, **dict(zip(lookups, results))}
+
+@mcp.tool()
+@instrumented
+@formatted
+async def find_parts_for_vehicle(query: Optional[str] = None, year: Optional[int] = None, make: Optional[str] = None, model: Optional[str] = None, vin: Optional[str] = None, limit: int = 5, brands_limit: int = 10):
+    """
+    Find the part categories and brands that fit a vehicle, in one call.
+
+    Looks up the vhid, fetches the vehicle's categories and brands
+    concurrently, ranks the categories against the query, then fetches the
+    brands of the top categories concurrently and the availability of any
+    items they list.
+
+    Args:
+        query: Optional part search terms matched against category names, e.g. "brake pads"
+        year: Optional vehicle year
+        make: Optional vehicle make
+        model: Optional vehicle model
+        vin: Optional vehicle identification number, used instead of year/make/model
+        limit: Maximum number of categories to return
+        brands_limit: Maximum number of brands listed per category and for the vehicle
+
+    Returns:
+        The vhid, the best matching categories (each with a match score, lower
+        is better, and its brands), the vehicle's brands and availability
+        keyed by item ID. Categories are dropped from the end, and
+        "truncated" set, to keep the document under the response size limit.
+    """
+    vehicle = await _resolve_vhid(year, make, model, vin)
+    if "error" in vehicle:
+        return vehicle
+    vhid = vehicle["vhid"]
+
+    async def attempt(call):
+        try:
+            return await call
+        except Exception as e:
+            return {"error": str(e)}
+
+    def head(rows):
+        return rows[:max(brands_limit, 0)] if isinstance(rows, list) else rows
+
+    categories, brands = await asyncio.gather(
+        attempt(_cached("get_categories", _client().product.get_categories, vhid=vhid, phid=None, search_id=None)),
+        attempt(_fetch("get_brands", _client().product.get_brands, vhid=vhid, phid=None)),
+    )
+    if isinstance(categories, dict) and "error" in categories:
+        return {"vhid": vhid, "error": f"Could not list categories: {categories['error']}"}
+
+    matched = rank(categories, query)
+    top = matched[:max(limit, 0)]
+    semaphore = asyncio.Semaphore(bulk_concurrency)
+
+    async def category_brands(category):
+        phid = first_field(category, PHID_FIELDS)
+        if phid is None:
+            return []
+        async with semaphore:
+            return await attempt(_fetch("get_brands", _client().product.get_brands, vhid=vhid, phid=phid))
+
+    per_category = [head(rows) for rows in await asyncio.gather(*(category_brands(category) for _, category in top))]
+
+    records = [category for _, category in top]
+    for rows in per_category:
+        if isinstance(rows, list):
+            records.extend(rows)
+    items = item_ids(records, limit)
+
+    async def availability(item_id):
+        async with semaphore:
+            return await attempt(_fetch("get_availability_by_item_id", _client().product.get_availability_by_item_id, item_id))
+
+    available = await asyncio.gather(*(availability(item_id) for item_id in items))
+    document = {
+        **vehicle,
+        "query": query,
+        "total_categories": len(matched),
+        "categories": [{**category, "score": score, "brands": rows} for (score, category), rows in zip(top, per_category)],
+        "brands": head(brands),
+        "availability": dict(zip(items, available)),
+        "truncated": False,
+    }
+    return fit(document, "categories", max_response_bytes)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transend MCP server")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http", "sse"],
+                        default=os.getenv("TRANSEND_MCP_TRANSPORT", "stdio"),
+                        help="stdio serves one client; the HTTP transports serve many sessions from one process")
+    parser.add_argument("--host", default=os.getenv("TRANSEND_MCP_HOST", "127.0.0.1"),
+                        help="Interface the HTTP transports listen on")
+    parser.add_argument("--port", type=int, default=int(os.getenv("TRANSEND_MCP_PORT", "8000")),
+                        help="Port the HTTP transports listen on")
+    args = parser.parse_args()
+
     # Initialize and run the server
-    mcp.run(transport='stdio')
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    if args.host not in ("127.0.0.1", "localhost", "::1"):
+        # DNS rebinding protection only applies to servers bound to localhost
+        mcp.settings.transport_security = None
+    mcp.run(transport=args.transport)
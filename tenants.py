@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import hashlib
+import threading
+import time
+
+Credentials = Tuple[str, str]
+
+
+def tenant_id(credentials: Credentials) -> str:
+    """
+    Identify a credential set without exposing it.
+
+    Args:
+        credentials: The (api_key, api_token) pair
+
+    Returns:
+        A short hash of the credentials
+    """
+    return hashlib.sha256("\0".join(credentials).encode()).hexdigest()[:16]
+
+
+class Tenant:
+    """One credential set: its client, its connection pool and when it was last used."""
+
+    def __init__(self, credentials: Credentials, client: Any, pool: Any, now: float):
+        self.id = tenant_id(credentials)
+        self.client = client
+        self.pool = pool
+        self.created = now
+        self.last_used = now
+        self.lookups = 0
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        """Copy the counters, with the pool's if the tenant has one."""
+        stats = {
+            "age": round(now - self.created, 3),
+            "idle": round(now - self.last_used, 3),
+            "lookups": self.lookups,
+        }
+        if self.pool is not None:
+            stats["pool"] = self.pool.stats()
+        return stats
+
+
+class TenantRegistry:
+    """
+    Transend clients per credential set, built on first use.
+
+    Each tenant gets its own client and connection pool. Beyond max_tenants
+    the least recently used tenant is evicted, and tenants unused for
+    idle_timeout seconds are evicted on the next lookup. Evicting closes the
+    tenant's pool; calls still holding its client finish normally and a
+    later call simply builds the tenant again. on_evict is called with the
+    id of each evicted tenant, e.g. to drop its cached account data.
+    """
+
+    def __init__(self, factory: Callable[[Credentials], Tuple[Any, Any]], max_tenants: int = 64,
+                 idle_timeout: float = 0, on_evict: Optional[Callable[[str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.factory = factory
+        self.max_tenants = max_tenants
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self.clock = clock
+        self._tenants: "OrderedDict[Credentials, Tenant]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._tenants)
+
+    def __contains__(self, credentials: Credentials) -> bool:
+        return credentials in self._tenants
+
+    def get(self, credentials: Credentials) -> Any:
+        """
+        Get the client of a credential set, building it on first use.
+
+        Args:
+            credentials: The (api_key, api_token) pair
+
+        Returns:
+            The tenant's client
+        """
+        with self._lock:
+            now = self.clock()
+            evicted = self._evict_idle(now)
+            tenant = self._tenants.get(credentials)
+            if tenant is None:
+                self.misses += 1
+                tenant = self._tenants[credentials] = Tenant(credentials, *self.factory(credentials), now)
+                while len(self._tenants) > self.max_tenants:
+                    evicted.append(self._tenants.popitem(last=False)[1])
+            else:
+                self.hits += 1
+                self._tenants.move_to_end(credentials)
+            tenant.last_used = now
+            tenant.lookups += 1
+        self._close(evicted)
+        return tenant.client
+
+    def _evict_idle(self, now: float) -> list:
+        """Remove tenants idle past the timeout, least recently used first"""
+        evicted = []
+        if self.idle_timeout > 0:
+            while self._tenants:
+                tenant = next(iter(self._tenants.values()))
+                if now - tenant.last_used < self.idle_timeout:
+                    break
+                evicted.append(self._tenants.popitem(last=False)[1])
+        return evicted
+
+    def _close(self, evicted: list) -> None:
+        """Close the pools of evicted tenants, outside the lock"""
+        for tenant in evicted:
+            self.evictions += 1
+            if tenant.pool is not None:
+                tenant.pool.close()
+            if self.on_evict is not None:
+                self.on_evict(tenant.id)
+
+    def clear(self) -> None:
+        """Evict every tenant."""
+        with self._lock:
+            evicted = list(self._tenants.values())
+            self._tenants.clear()
+        self._close(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get registry counters.
+
+        Returns:
+            Size, capacity, hits, misses, evictions and the counters of each
+            tenant keyed by tenant id, most recently used first
+        """
+        now = self.clock()
+        with self._lock:
+            tenants = list(self._tenants.values())
+        return {
+            "size": len(tenants),
+            "max_tenants": self.max_tenants,
+            "idle_timeout": self.idle_timeout,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "tenants": {tenant.id: tenant.stats(now) for tenant in reversed(tenants)},
+        }
@@ -6,6 +6,16 @@ from unittest.mock import Mock, AsyncMock
 from uuid import UUID
 
 
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
 @pytest.fixture
 def mock_env_vars():
     """Mock environment variables for testing"""
@@ -147,7 +157,7 @@ def mock_anthropic_client():
     
     mock_response = Mock()
     mock_response.content = [mock_content]
-    mock_anthropic.messages.create.return_value = mock_response
+    mock_anthropic.messages.create = AsyncMock(return_value=mock_response)
     
     return mock_anthropic
 
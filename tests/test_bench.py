@@ -0,0 +1,30 @@
+"""Tests for the benchmark harness"""
+
+import json
+import os
+import sys
+
+from mcp.types import CallToolResult, TextContent
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"))
+
+from run import is_error
+
+
+def result(*texts, error=False):
+    return CallToolResult(content=[TextContent(type="text", text=text) for text in texts], isError=error)
+
+
+class TestIsError:
+    """Test class for is_error"""
+
+    def test_error_results_are_found_in_any_layout(self):
+        """Test that {"error": ...} results count as failures, pretty-printed or compact"""
+        assert is_error(result(json.dumps({"error": "404 Not Found"}, indent=2)))
+        assert is_error(result('{"error":"404 Not Found"}'))
+        assert is_error(result("", error=True))
+
+    def test_successful_results(self):
+        """Test that other results, including ones mentioning errors, are successes"""
+        assert not is_error(result(json.dumps({"code": "P0700", "description": "error in shift"}, indent=2)))
+        assert not is_error(result("id,error\n1,none\n", '"error"'))
@@ -0,0 +1,58 @@
+"""Tests for the nearest-branch index"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from branch_index import BranchIndex, coordinates, distance_miles
+
+# Dallas, Fort Worth, Austin, Houston, and a branch without coordinates
+BRANCHES = [
+    {"branchNumber": "001", "name": "Dallas", "latitude": 32.7767, "longitude": -96.7970, "active": True},
+    {"branchNumber": "002", "name": "Houston", "latitude": "29.7604", "longitude": "-95.3698", "active": True},
+    {"branchNumber": "003", "name": "Fort Worth", "address": {"lat": 32.7555, "lng": -97.3308}, "active": True},
+    {"branchNumber": "004", "name": "Austin", "location": {"lat": 30.2672, "lon": -97.7431}, "active": False},
+    {"number": 5, "name": "Unknown", "active": True},
+]
+
+
+class TestBranchIndex:
+    """Test class for BranchIndex"""
+
+    def test_distance(self):
+        """Test the haversine distance between two known points"""
+        assert distance_miles((32.7767, -96.7970), (29.7604, -95.3698)) == pytest.approx(225, abs=3)
+        assert distance_miles((1.0, 1.0), (1.0, 1.0)) == 0
+
+    def test_coordinates_from_nested_fields(self):
+        """Test that coordinates are read from top-level, address or location fields"""
+        assert coordinates(BRANCHES[1]) == (29.7604, -95.3698)
+        assert coordinates(BRANCHES[2]) == (32.7555, -97.3308)
+        assert coordinates(BRANCHES[4]) is None
+
+    def test_nearby_orders_by_distance(self):
+        """Test that the origin comes first, then active branches nearest first, then unlocated ones"""
+        index = BranchIndex(BRANCHES)
+        ordered = index.nearby("001")
+
+        assert [branch["name"] for _, branch in ordered] == ["Dallas", "Fort Worth", "Houston", "Unknown"]
+        assert ordered[0][0] == 0.0
+        assert ordered[1][0] == pytest.approx(32, abs=2)
+        assert ordered[-1][0] is None
+
+    def test_nearby_within_radius(self):
+        """Test that a radius drops farther and unlocated branches"""
+        index = BranchIndex(BRANCHES)
+        assert [branch["name"] for _, branch in index.nearby("001", radius=100)] == ["Dallas", "Fort Worth"]
+
+    def test_nearby_inactive_and_unknown(self):
+        """Test inactive branches are skipped unless asked for, and unknown origins give nothing"""
+        index = BranchIndex(BRANCHES)
+        names = [branch["name"] for _, branch in index.nearby("003", active_only=False)]
+        assert "Austin" in names
+        assert index.nearby("999") == []
+        assert index.get(5)["name"] == "Unknown"
+        assert len(index) == 5
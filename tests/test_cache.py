@@ -0,0 +1,145 @@
+"""Tests for the TTL + LRU response cache"""
+
+import pytest
+import asyncio
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import MISSING, SingleFlight, TTLCache, make_key
+from tests.conftest import FakeClock
+
+
+class TestTTLCache:
+    """Test class for TTLCache"""
+
+    def test_get_missing_key(self):
+        """Test lookup of a key that was never stored"""
+        cache = TTLCache()
+        assert cache.get(("tool",)) is MISSING
+        assert cache.stats()["misses"] == 1
+
+    def test_entry_expires_after_ttl(self):
+        """Test that entries are dropped once their TTL has passed"""
+        clock = FakeClock()
+        cache = TTLCache(clock=clock)
+        cache.set(("tool",), "value", ttl=10)
+
+        clock.now = 9.9
+        assert cache.get(("tool",)) == "value"
+        clock.now = 10
+        assert cache.get(("tool",)) is MISSING
+        assert len(cache) == 0
+
+    def test_stale_entries_are_kept_for_fallback(self):
+        """Test that expired entries stay readable with get_stale for stale_ttl seconds"""
+        clock = FakeClock()
+        cache = TTLCache(clock=clock, stale_ttl=100)
+        cache.set(("tool",), "value", ttl=10)
+
+        clock.now = 50
+        assert cache.get(("tool",)) is MISSING
+        assert cache.get_stale(("tool",)) == "value"
+        clock.now = 110
+        assert cache.get_stale(("tool",)) is MISSING
+        assert cache.get(("tool",)) is MISSING
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = TTLCache(maxsize=2)
+        cache.set(("a",), 1, ttl=60)
+        cache.set(("b",), 2, ttl=60)
+        cache.get(("a",))
+        cache.set(("c",), 3, ttl=60)
+
+        assert cache.get(("a",)) == 1
+        assert cache.get(("b",)) is MISSING
+        assert cache.get(("c",)) == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_evicted_keys_are_reported(self):
+        """Test that on_evict hears of every entry that leaves the cache"""
+        evicted = []
+        clock = FakeClock()
+        cache = TTLCache(maxsize=2, clock=clock, on_evict=evicted.append)
+        cache.set(("a",), 1, ttl=60)
+        cache.set(("b",), 2, ttl=10)
+        cache.set(("c",), 3, ttl=60)
+        clock.now = 20
+        cache.get(("b",))
+        cache.invalidate("c")
+
+        assert evicted == [("a",), ("b",), ("c",)]
+
+    def test_invalidate_by_tool(self):
+        """Test that invalidation only drops the named tools"""
+        cache = TTLCache()
+        cache.set(make_key("get_credit_cards"), [1], ttl=60)
+        cache.set(make_key("get_all_tags"), [2], ttl=60)
+
+        assert cache.invalidate("get_credit_cards") == 1
+        assert cache.get(make_key("get_credit_cards")) is MISSING
+        assert cache.get(make_key("get_all_tags")) == [2]
+
+    def test_invalidate_one_tenant(self):
+        """Test that tenant invalidation keeps other tenants' entries"""
+        cache = TTLCache()
+        cache.set(make_key("get_credit_cards", "tenant-a"), [1], ttl=60)
+        cache.set(make_key("get_credit_cards", "tenant-b"), [2], ttl=60)
+
+        assert cache.invalidate("get_credit_cards", tenant="tenant-a") == 1
+        assert cache.get(make_key("get_credit_cards", "tenant-a")) is MISSING
+        assert cache.get(make_key("get_credit_cards", "tenant-b")) == [2]
+
+    def test_make_key_normalizes_kwarg_order(self):
+        """Test that keyword order does not affect the key"""
+        assert make_key("t", 1, a=1, b=2) == make_key("t", 1, b=2, a=1)
+        assert make_key("t", a=None) != make_key("t", a=True)
+
+
+class TestSingleFlight:
+    """Test class for SingleFlight"""
+
+    async def test_concurrent_calls_share_result(self):
+        """Test that callers with the same key share one call"""
+        flight = SingleFlight()
+        started = 0
+
+        async def work():
+            nonlocal started
+            started += 1
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+        assert results == ["result"] * 5
+        assert started == 1
+        assert flight.stats() == {"calls": 1, "coalesced": 4, "in_flight": 0}
+
+    async def test_sequential_calls_are_not_shared(self):
+        """Test that a finished call is not reused"""
+        flight = SingleFlight()
+
+        async def work():
+            return object()
+
+        assert await flight.do("key", work) is not await flight.do("key", work)
+        assert flight.calls == 2
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        """Test that one caller giving up leaves the shared call running"""
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert await second == "result"
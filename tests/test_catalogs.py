@@ -0,0 +1,60 @@
+"""Tests for catalog versioning and subscriptions"""
+
+import gc
+import os
+import sys
+from unittest.mock import Mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalogs import CatalogVersions, etag
+
+
+class TestCatalogVersions:
+    """Test class for CatalogVersions"""
+
+    def test_etag_depends_on_content_only(self):
+        """Test that equal catalogs get the same ETag whatever their key order"""
+        assert etag([{"id": 1, "name": "a"}]) == etag([{"name": "a", "id": 1}])
+        assert etag([{"id": 1}]) != etag([{"id": 2}])
+
+    def test_update_reports_changes(self):
+        """Test that only new content replacing a known version counts as a change"""
+        versions = CatalogVersions(clock=lambda: 100.0)
+
+        assert versions.update("transend://catalog/tags", [{"id": 1}]) is False
+        assert versions.update("transend://catalog/tags", [{"id": 1}]) is False
+        assert versions.update("transend://catalog/tags", [{"id": 1}, {"id": 2}]) is True
+
+        assert versions.version("transend://catalog/tags") == {
+            "etag": etag([{"id": 1}, {"id": 2}]), "updated": 100.0, "count": 2}
+        assert versions.version("transend://catalog/dtcs") is None
+        assert versions.stats()["changes"] == 1
+
+    def test_subscriptions(self):
+        """Test that subscribers are kept per catalog and can leave"""
+        versions = CatalogVersions()
+        first, second = Mock(), Mock()
+
+        versions.subscribe("transend://catalog/tags", first)
+        versions.subscribe("transend://catalog/tags", second)
+        versions.subscribe("transend://catalog/dtcs", second)
+        versions.unsubscribe("transend://catalog/tags", first)
+        versions.forget(second)
+
+        assert versions.subscribers("transend://catalog/tags") == []
+        assert versions.subscribers("transend://catalog/dtcs") == []
+        assert versions.readers() == [first]
+
+    def test_closed_sessions_drop_out(self):
+        """Test that sessions are not kept alive by their subscriptions"""
+        versions = CatalogVersions()
+        session = Mock()
+        versions.subscribe("transend://catalog/tags", session)
+        versions.update("transend://catalog/tags", [])
+
+        del session
+        gc.collect()
+
+        assert versions.subscribers("transend://catalog/tags") == []
+        assert versions.stats()["catalogs"]["transend://catalog/tags"]["subscribers"] == 0
@@ -0,0 +1,288 @@
+"""Tests for the MCP chatbot client"""
+
+import pytest
+import asyncio
+import json
+from unittest.mock import Mock, patch, AsyncMock
+import sys
+import os
+
+# Add the parent directory to the path to import client
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def text_block(text):
+    """Build a text content block"""
+    block = Mock()
+    block.type = 'text'
+    block.text = text
+    return block
+
+
+def tool_use_block(tool_id, name, tool_input):
+    """Build a tool_use content block"""
+    block = Mock()
+    block.type = 'tool_use'
+    block.id = tool_id
+    block.name = name
+    block.input = tool_input
+    return block
+
+
+def response(*blocks):
+    """Build a Messages API response"""
+    mock_response = Mock()
+    mock_response.content = list(blocks)
+    return mock_response
+
+
+def event(event_type, index, **fields):
+    """Build a raw Messages API stream event"""
+    mock_event = Mock()
+    mock_event.type = event_type
+    mock_event.index = index
+    for name, value in fields.items():
+        setattr(mock_event, name, value)
+    return mock_event
+
+
+def delta(delta_type, **fields):
+    """Build a content block delta"""
+    mock_delta = Mock()
+    mock_delta.type = delta_type
+    for name, value in fields.items():
+        setattr(mock_delta, name, value)
+    return mock_delta
+
+
+async def stream_of(events, pause=0.0):
+    """Yield stream events, optionally pausing before each one"""
+    for stream_event in events:
+        await asyncio.sleep(pause)
+        yield stream_event
+
+
+class TestMCPChatBot:
+    """Test class for MCP_ChatBot"""
+
+    @pytest.fixture
+    def chatbot(self, mock_anthropic_client, mock_mcp_session):
+        """Create a chatbot wired to mock Anthropic and MCP clients"""
+        with patch('client.AsyncAnthropicBedrock', return_value=mock_anthropic_client):
+            from client import MCP_ChatBot
+            bot = MCP_ChatBot(stream=False)
+        bot.session = mock_mcp_session
+        return bot
+
+    async def test_text_only_response(self, chatbot, mock_anthropic_client, capsys):
+        """Test that a text-only response ends the turn"""
+        await chatbot.process_query("Hello")
+
+        assert "Test response from Anthropic" in capsys.readouterr().out
+        mock_anthropic_client.messages.create.assert_awaited_once()
+        chatbot.session.call_tool.assert_not_called()
+
+    async def test_tool_uses_run_concurrently(self, chatbot, mock_anthropic_client):
+        """Test that all tool_use blocks of a turn run at once and answer in one message"""
+        mock_anthropic_client.messages.create.side_effect = [
+            response(
+                text_block("Looking that up"),
+                tool_use_block("t1", "get_all_branches", {"active": True}),
+                tool_use_block("t2", "get_vehicles_by_vin", {"vin": "VIN1"}),
+            ),
+            response(text_block("Done")),
+        ]
+
+        async def slow_call(name, arguments):
+            await asyncio.sleep(0.1)
+            result = Mock()
+            result.content = [{"type": "text", "text": name}]
+            return result
+
+        chatbot.session.call_tool.side_effect = slow_call
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await chatbot.process_query("Find branches and my car")
+        elapsed = loop.time() - start
+
+        assert elapsed < 0.19
+        messages = mock_anthropic_client.messages.create.call_args.kwargs["messages"]
+        assert [m["role"] for m in messages] == ["user", "assistant", "user"]
+        assert messages[2]["content"] == [
+            {"type": "tool_result", "tool_use_id": "t1", "content": [{"type": "text", "text": "get_all_branches"}]},
+            {"type": "tool_result", "tool_use_id": "t2", "content": [{"type": "text", "text": "get_vehicles_by_vin"}],
+             "cache_control": {"type": "ephemeral"}},
+        ]
+
+    async def test_failed_tool_call_is_reported_as_error(self, chatbot, mock_anthropic_client):
+        """Test that one failing tool call does not abort the turn"""
+        mock_anthropic_client.messages.create.side_effect = [
+            response(tool_use_block("t1", "get_all_tags", {})),
+            response(text_block("Sorry")),
+        ]
+        chatbot.session.call_tool.side_effect = RuntimeError("connection lost")
+
+        await chatbot.process_query("Tags?")
+
+        messages = mock_anthropic_client.messages.create.call_args.kwargs["messages"]
+        assert messages[2]["content"] == [{
+            "type": "tool_result",
+            "tool_use_id": "t1",
+            "content": "Tool call failed: connection lost",
+            "is_error": True,
+            "cache_control": {"type": "ephemeral"},
+        }]
+
+    async def test_cache_breakpoints(self, chatbot, mock_anthropic_client, sample_tool_schemas):
+        """Test that the tool list and the conversation so far are marked for caching"""
+        chatbot.available_tools = sample_tool_schemas
+
+        await chatbot.process_query("Hello")
+
+        kwargs = mock_anthropic_client.messages.create.call_args.kwargs
+        assert "cache_control" not in kwargs["tools"][0]
+        assert kwargs["tools"][-1]["cache_control"] == {"type": "ephemeral"}
+        assert kwargs["messages"] == [{"role": "user", "content": [
+            {"type": "text", "text": "Hello", "cache_control": {"type": "ephemeral"}}
+        ]}]
+        assert "cache_control" not in chatbot.available_tools[-1]
+
+    def test_compaction_truncates_old_tool_results(self, chatbot):
+        """Test that old tool results are cut once the budget is exceeded"""
+        chatbot.token_budget = 500
+        chatbot.compact_chars = 100
+        big_result = [{"type": "text", "text": "P0700 " * 1000}]
+        messages = [
+            {"role": "user", "content": "List DTCs"},
+            {"role": "assistant", "content": [{"type": "tool_use", "id": "t1", "name": "get_all_dtcs", "input": {}}]},
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t1", "content": big_result}]},
+            {"role": "assistant", "content": [{"type": "tool_use", "id": "t2", "name": "get_all_dtcs", "input": {}}]},
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t2", "content": list(big_result)}]},
+        ]
+
+        chatbot._compact(messages)
+
+        compacted = messages[2]["content"][0]["content"]
+        assert compacted.startswith("P0700 " * 16)
+        assert compacted.endswith("[5900 more characters truncated to save context]")
+        assert messages[4]["content"][0]["content"] == big_result
+
+    def test_compaction_keeps_the_prefix_stable_between_turns(self, chatbot):
+        """Test that one over-budget turn compacts enough that the next turns keep the history"""
+        chatbot.token_budget = 2000
+        chatbot.compact_chars = 100
+        messages = [{"role": "user", "content": "List DTCs"}]
+
+        def add_turn(n):
+            messages.append({"role": "assistant", "content": [
+                {"type": "tool_use", "id": f"t{n}", "name": "get_all_dtcs", "input": {}}]})
+            messages.append({"role": "user", "content": [
+                {"type": "tool_result", "tool_use_id": f"t{n}", "content": [{"type": "text", "text": "P0700 " * 200}]}]})
+
+        for n in range(6):
+            add_turn(n)
+        chatbot._compact(messages)
+        assert chatbot._estimate_tokens(messages) <= 1200
+
+        for n in range(6, 8):
+            history = json.loads(json.dumps(messages))
+            add_turn(n)
+            chatbot._compact(messages)
+            assert messages[:len(history)] == history
+
+    def test_compaction_leaves_small_conversations_alone(self, chatbot):
+        """Test that nothing is cut while under the budget"""
+        messages = [
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t1", "content": [{"type": "text", "text": "x" * 5000}]}]},
+            {"role": "user", "content": "next"},
+        ]
+        chatbot._compact(messages)
+        assert messages[0]["content"][0]["content"] == [{"type": "text", "text": "x" * 5000}]
+
+    async def test_usage_is_reported(self, chatbot, mock_anthropic_client, capsys):
+        """Test that token usage and cache hits are recorded per turn"""
+        usage = Mock(input_tokens=100, output_tokens=20, cache_creation_input_tokens=0, cache_read_input_tokens=900)
+        mock_anthropic_client.messages.create.return_value = response(text_block("Hi"))
+        mock_anthropic_client.messages.create.return_value.usage = usage
+
+        await chatbot.process_query("Hello")
+
+        assert chatbot.turn_stats[0]["usage"] == {
+            "input_tokens": 100, "output_tokens": 20,
+            "cache_creation_input_tokens": 0, "cache_read_input_tokens": 900,
+        }
+        assert "tokens in 1000 (cache read 900, written 0, hit 90%) out 20" in capsys.readouterr().out
+
+
+class TestMCPChatBotStreaming:
+    """Test class for MCP_ChatBot in streaming mode"""
+
+    @pytest.fixture
+    def chatbot(self, mock_anthropic_client, mock_mcp_session):
+        """Create a streaming chatbot wired to mock Anthropic and MCP clients"""
+        with patch('client.AsyncAnthropicBedrock', return_value=mock_anthropic_client):
+            from client import MCP_ChatBot
+            bot = MCP_ChatBot(stream=True)
+        bot.session = mock_mcp_session
+        return bot
+
+    async def test_text_is_printed_as_it_arrives(self, chatbot, mock_anthropic_client, capsys):
+        """Test that text deltas are printed and assembled into the assistant message"""
+        mock_anthropic_client.messages.create.return_value = stream_of([
+            event('message_start', None),
+            event('content_block_start', 0, content_block=text_block('')),
+            event('content_block_delta', 0, delta=delta('text_delta', text='Hello ')),
+            event('content_block_delta', 0, delta=delta('text_delta', text='there')),
+            event('content_block_stop', 0),
+            event('message_stop', None),
+        ])
+
+        await chatbot.process_query("Hi")
+
+        assert "Hello there\n" in capsys.readouterr().out
+        assert mock_anthropic_client.messages.create.call_args.kwargs["stream"] is True
+        assert chatbot.turn_stats[0]['ttft'] is not None
+        assert chatbot.turn_stats[0]['tool_dispatch'] == []
+
+    async def test_tool_dispatched_when_block_closes(self, chatbot, mock_anthropic_client):
+        """Test that a tool call starts before the rest of the response has streamed"""
+        dispatched_before_end = []
+
+        first_turn = [
+            event('content_block_start', 0, content_block=tool_use_block('t1', 'get_years', {})),
+            event('content_block_delta', 0, delta=delta('input_json_delta', partial_json='{"vh')),
+            event('content_block_delta', 0, delta=delta('input_json_delta', partial_json='id": "v1"}')),
+            event('content_block_stop', 0),
+            event('content_block_start', 1, content_block=text_block('')),
+            event('content_block_delta', 1, delta=delta('text_delta', text='Checking years')),
+            event('content_block_stop', 1),
+        ]
+
+        async def first_stream():
+            async for stream_event in stream_of(first_turn, pause=0.01):
+                yield stream_event
+            dispatched_before_end.append(chatbot.session.call_tool.await_count)
+
+        mock_anthropic_client.messages.create.side_effect = [
+            first_stream(),
+            stream_of([
+                event('content_block_start', 0, content_block=text_block('')),
+                event('content_block_delta', 0, delta=delta('text_delta', text='2020')),
+                event('content_block_stop', 0),
+            ]),
+        ]
+
+        await chatbot.process_query("Years?")
+
+        assert dispatched_before_end == [1]
+        chatbot.session.call_tool.assert_awaited_once_with('get_years', arguments={'vhid': 'v1'})
+        messages = mock_anthropic_client.messages.create.call_args.kwargs["messages"]
+        assert messages[1]['content'] == [
+            {'type': 'tool_use', 'id': 't1', 'name': 'get_years', 'input': {'vhid': 'v1'}},
+            {'type': 'text', 'text': 'Checking years'},
+        ]
+        assert messages[2]['content'][0]['tool_use_id'] == 't1'
+        assert len(chatbot.turn_stats) == 2
+        assert len(chatbot.turn_stats[0]['tool_dispatch']) == 1
+        assert chatbot.turn_stats[0]['tool_dispatch'][0] < chatbot.turn_stats[0]['total']
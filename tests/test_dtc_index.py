@@ -0,0 +1,70 @@
+"""Tests for the in-memory DTC index"""
+
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dtc_index import DTCIndex, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def index():
+    """An index over a few DTCs"""
+    return DTCIndex([
+        {"code": "P0700", "description": "Transmission Control System Malfunction"},
+        {"code": "P0750", "description": "Shift Solenoid A Malfunction"},
+        {"code": "P0755", "description": "Shift Solenoid B Malfunction"},
+        {"code": "P0300", "description": "Random/Multiple Cylinder Misfire Detected"},
+        {"code": "U0100", "description": "Lost Communication With ECM/PCM A"},
+    ])
+
+
+class TestDTCIndex:
+    """Test class for DTCIndex"""
+
+    def test_get(self, index):
+        """Test exact, case-insensitive code lookup"""
+        assert index.get("p0700")["description"] == "Transmission Control System Malfunction"
+        assert index.get("P9999") is None
+
+    def test_code_prefix(self, index):
+        """Test that a code prefix lists codes in order"""
+        assert [dtc["code"] for dtc in index.search("P07")] == ["P0700", "P0750", "P0755"]
+
+    def test_description_words(self, index):
+        """Test that every word must match, the last one by prefix"""
+        assert [dtc["code"] for dtc in index.search("shift solen")] == ["P0750", "P0755"]
+        assert [dtc["code"] for dtc in index.search("solenoid b")] == ["P0755"]
+        assert index.search("solenoid misfire") == []
+
+    def test_code_and_words_combined(self, index):
+        """Test mixing a code prefix with a description word"""
+        assert [dtc["code"] for dtc in index.search("P07 malfunction")] == ["P0700", "P0750", "P0755"]
+
+    def test_exact_code_ranks_first(self, index):
+        """Test that an exact code beats other matches"""
+        assert index.search("P0755")[0]["code"] == "P0755"
+
+    def test_empty_query_lists_catalog(self, index):
+        """Test that an empty query returns every DTC in code order"""
+        assert [dtc["code"] for dtc in index.search("")] == ["P0300", "P0700", "P0750", "P0755", "U0100"]
+
+
+class TestCursor:
+    """Test class for search cursors"""
+
+    def test_round_trip(self):
+        """Test that a cursor carries its offset"""
+        assert decode_cursor(encode_cursor("P07", 40), "P07") == 40
+
+    def test_rejects_other_query(self):
+        """Test that a cursor cannot be replayed against another query"""
+        with pytest.raises(ValueError):
+            decode_cursor(encode_cursor("P07", 40), "P03")
+
+    def test_rejects_garbage(self):
+        """Test that a malformed cursor is rejected"""
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor", "P07")
@@ -0,0 +1,85 @@
+"""Tests for compact tool output formats"""
+
+import csv
+import io
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import formats
+from formats import columnar, dumps, parse_format, parse_tool_formats, render, to_csv
+
+ROWS = [
+    {"code": "P0700", "description": "Transmission control system"},
+    {"code": "P0715", "description": "Input speed sensor", "severity": 2},
+]
+
+
+class TestFormats:
+    """Test class for the output formats"""
+
+    def test_columnar_lists_and_pages(self):
+        """Test that record lists, also inside a page, become columns and rows"""
+        assert columnar(ROWS) == {
+            "columns": ["code", "description", "severity"],
+            "rows": [["P0700", "Transmission control system", None], ["P0715", "Input speed sensor", 2]],
+        }
+        page = columnar({"items": ROWS, "total": 9, "next_offset": 2})
+        assert page["items"]["columns"] == ["code", "description", "severity"]
+        assert page["total"] == 9
+        assert columnar({"quantity": 3}) == {"quantity": 3}
+        assert columnar([]) == []
+
+    def test_compact_json_round_trips(self):
+        """Test that compact output is minified and parses back to the same value"""
+        text = render(ROWS, "compact")
+        assert "\n" not in text and ": " not in text
+        assert json.loads(text) == ROWS
+
+    def test_csv_tables_and_pages(self):
+        """Test that tables become CSV with page metadata as comment lines"""
+        text = to_csv({"items": ROWS + [{"code": "P0720", "notes": ["a", "b"]}], "total": 3, "next_offset": None})
+        lines = text.splitlines()
+        assert lines[:2] == ["# total: 3", "# next_offset: "]
+        rows = list(csv.reader(io.StringIO("\n".join(lines[2:]))))
+        assert rows[0] == ["code", "description", "severity", "notes"]
+        assert rows[2] == ["P0715", "Input speed sensor", "2", ""]
+        assert json.loads(rows[3][3]) == ["a", "b"]
+        assert to_csv({"quantity": 3}) is None
+        assert json.loads(render({"quantity": 3}, "csv")) == {"quantity": 3}
+
+    def test_errors_and_json_untouched(self):
+        """Test that error results and the default format are returned as is"""
+        assert render({"error": "Timeout"}, "csv") == {"error": "Timeout"}
+        assert render(ROWS, "json") is ROWS
+
+    def test_yaml_falls_back_without_pyyaml(self):
+        """Test that YAML output degrades to compact JSON when PyYAML is missing"""
+        with patch('formats.to_yaml', return_value=None):
+            assert json.loads(render(ROWS, "yaml")) == ROWS
+
+    def test_yaml(self):
+        """Test YAML output when PyYAML is installed"""
+        yaml = pytest.importorskip("yaml")
+        assert yaml.safe_load(render(ROWS, "yaml")) == ROWS
+
+    def test_dumps_without_orjson(self):
+        """Test the standard library fallback encoder"""
+        with patch.object(formats, "orjson", None):
+            assert dumps({"a": [1, None], 2: "é"}) == '{"a":[1,null],"2":"é"}'
+
+    def test_parse_formats(self):
+        """Test format names and per-tool settings are validated"""
+        assert parse_format(" CSV ") == "csv"
+        assert parse_tool_formats("get_all_dtcs=columnar, get_transmissions=csv") == {
+            "get_all_dtcs": "columnar", "get_transmissions": "csv"}
+        assert parse_tool_formats("") == {}
+        with pytest.raises(ValueError):
+            parse_format("xml")
+        with pytest.raises(ValueError):
+            parse_tool_formats("get_all_dtcs")
@@ -0,0 +1,123 @@
+"""Tests for the pooled HTTP session used by the Transend SDK clients"""
+
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_pool import ConnectionPool
+from resilience import attempt_timeout
+from transend.client import TransendAPIClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.startswith("/branch/slow"):
+            time.sleep(1)
+        if self.path.startswith("/branch/missing"):
+            body = b'{"message": "not found"}'
+            self.send_response(404)
+        else:
+            body = json.dumps({"path": self.path, "key": self.headers.get("x-api-key")}).encode()
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+class TestConnectionPool:
+    """Test cases for ConnectionPool"""
+
+    def test_attached_client_reuses_connections(self, base_url):
+        """Test that sequential SDK calls share one keep-alive connection"""
+        pool = ConnectionPool(maxsize=2)
+        client = pool.attach(TransendAPIClient("key", "token", base_url=base_url))
+
+        for _ in range(5):
+            assert client.branch.get_branch_by_number("12") == {"path": "/branch/12", "key": "key"}
+
+        stats = pool.stats()
+        assert stats["requests"] == 5
+        assert stats["connections_created"] == 1
+        assert stats["connections_reused"] == 4
+        assert stats["in_use"] == 0
+        pool.close()
+
+    def test_concurrent_calls_are_capped_by_maxsize(self, base_url):
+        """Test that concurrent calls never open more connections than the pool holds"""
+        pool = ConnectionPool(maxsize=2)
+        client = pool.attach(TransendAPIClient("key", "token", base_url=base_url))
+
+        with ThreadPoolExecutor(max_workers=8) as workers:
+            results = list(workers.map(lambda n: client.branch.get_branch_by_number(str(n)), range(40)))
+
+        assert [r["path"] for r in results] == [f"/branch/{n}" for n in range(40)]
+        stats = pool.stats()
+        assert stats["requests"] == 40
+        assert stats["max_in_use"] <= 2
+        assert stats["in_use"] == 0
+        pool.close()
+
+    def test_http_errors_are_raised_and_connection_released(self, base_url):
+        """Test that error responses raise like the SDK and free their connection"""
+        pool = ConnectionPool(maxsize=1)
+        client = pool.attach(TransendAPIClient("key", "token", base_url=base_url))
+
+        with pytest.raises(requests.HTTPError):
+            client.branch.get_branch_by_number("missing")
+
+        assert client.branch.get_branch_by_number("1")["path"] == "/branch/1"
+        assert pool.stats()["in_use"] == 0
+        pool.close()
+
+    def test_attempt_timeout_caps_read_timeout(self, base_url):
+        """Test that a call ends when its retry deadline does, not after the pool's read timeout"""
+        pool = ConnectionPool(maxsize=1, read_timeout=30)
+        client = pool.attach(TransendAPIClient("key", "token", base_url=base_url))
+
+        token = attempt_timeout.set(0.1)
+        started = time.monotonic()
+        try:
+            with pytest.raises(requests.Timeout):
+                client.branch.get_branch_by_number("slow")
+        finally:
+            attempt_timeout.reset(token)
+
+        assert time.monotonic() - started < 0.9
+        pool.close()
+
+    def test_stats_report_timeouts(self):
+        """Test that the configured timeouts are reported"""
+        pool = ConnectionPool(maxsize=4, connect_timeout=1.5, read_timeout=10)
+
+        stats = pool.stats()
+
+        assert stats["maxsize"] == 4
+        assert stats["connect_timeout"] == 1.5
+        assert stats["read_timeout"] == 10
+        assert stats["http2"] is False
+        assert stats["utilization"] == 0.0
@@ -0,0 +1,206 @@
+"""Tests for the per-tool instrumentation"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Histogram, Metrics, response_bytes
+from tests.conftest import FakeClock
+
+
+class TestHistogram:
+    """Test class for Histogram"""
+
+    def test_percentiles_use_bucket_bounds(self):
+        """Test that percentiles are estimated from bucket upper bounds"""
+        histogram = Histogram((0.01, 0.1, 1.0))
+        for value in [0.005] * 90 + [0.05] * 9 + [0.5]:
+            histogram.observe(value)
+
+        assert histogram.percentile(0.5) == 0.01
+        assert histogram.percentile(0.95) == 0.1
+        assert histogram.percentile(1.0) == 0.5
+        snapshot = histogram.snapshot()
+        assert snapshot["count"] == 100
+        assert snapshot["buckets"] == {"0.01": 90, "0.1": 99, "1.0": 100, "+Inf": 100}
+
+    def test_empty(self):
+        """Test that an empty histogram reports zeros"""
+        assert Histogram((1.0,)).snapshot()["p99"] == 0.0
+
+
+class TestResponseBytes:
+    """Test class for response_bytes"""
+
+    def test_small_results_are_exact(self):
+        """Test that small results and rendered strings are measured exactly, in UTF-8 bytes"""
+        result = {"id": 1, "name": "Müller", "tags": [1, 2]}
+        assert response_bytes(result) == len(json.dumps(result, separators=(",", ":"), ensure_ascii=False).encode())
+        assert response_bytes("id,name\nMüller\n") == len("id,name\nMüller\n".encode())
+
+    def test_long_lists_are_sampled(self):
+        """Test that large catalogs, bare or paged, are estimated closely from a sample"""
+        dtcs = [{"code": f"P{n:04d}", "description": "x" * (n % 50)} for n in range(10000)]
+        for result in (dtcs, {"items": dtcs, "total": 10000, "next_offset": None}):
+            exact = len(json.dumps(result, separators=(",", ":")))
+            assert abs(response_bytes(result) - exact) < exact * 0.02
+
+
+class TestMetrics:
+    """Test class for Metrics"""
+
+    async def test_records_latency_upstream_time_and_size(self):
+        """Test that a tool call records latency, upstream time and response size"""
+        clock = FakeClock()
+        metrics = Metrics(clock=clock)
+
+        @metrics.instrument
+        async def get_thing(thing_id):
+            """Get a thing"""
+            clock.now += 0.02
+            metrics.upstream(0.015)
+            return {"id": thing_id}
+
+        assert await get_thing("a1") == {"id": "a1"}
+        assert get_thing.__name__ == "get_thing"
+        assert get_thing.__doc__ == "Get a thing"
+
+        stats = metrics.snapshot()["tools"]["get_thing"]
+        assert stats["calls"] == 1
+        assert stats["upstream_calls"] == 1
+        assert stats["latency"]["sum"] == 0.02
+        assert stats["upstream_time"]["sum"] == 0.015
+        assert stats["response_bytes"]["sum"] == len('{"id":"a1"}')
+        assert stats["errors"] == {}
+
+    async def test_counts_calls_served_from_cache(self):
+        """Test that calls without upstream work are counted as served from cache"""
+        metrics = Metrics()
+
+        @metrics.instrument
+        async def get_tags():
+            metrics.cache_hit()
+            return []
+
+        await get_tags()
+
+        stats = metrics.snapshot()["tools"]["get_tags"]
+        assert stats["served_from_cache"] == 1
+        assert stats["cache_hits"] == 1
+
+    async def test_error_results_are_counted_by_upstream_class(self):
+        """Test that {"error": ...} results count under the upstream exception class"""
+        metrics = Metrics()
+
+        @metrics.instrument
+        async def get_branch(number):
+            try:
+                metrics.upstream(0.1, TimeoutError("read timed out"))
+                raise TimeoutError("read timed out")
+            except Exception as e:
+                return {"error": str(e)}
+
+        @metrics.instrument
+        async def get_dtc(code):
+            return {"error": "Unknown DTC code"}
+
+        await get_branch("1")
+        await get_dtc("X")
+
+        tools = metrics.snapshot()["tools"]
+        assert tools["get_branch"]["errors"] == {"TimeoutError": 1}
+        assert tools["get_branch"]["error_rate"] == 1.0
+        assert tools["get_dtc"]["errors"] == {"ToolError": 1}
+
+    async def test_handled_upstream_errors_are_not_tool_errors(self):
+        """Test that a tool which recovers from an upstream error is not counted as failed"""
+        metrics = Metrics()
+
+        @metrics.instrument
+        async def bulk():
+            metrics.upstream(0.1, ConnectionError("reset"))
+            return {"quantities": {}, "errors": {"1": "reset"}}
+
+        await bulk()
+
+        assert metrics.snapshot()["tools"]["bulk"]["errors"] == {}
+
+    async def test_raised_exceptions_are_counted(self):
+        """Test that exceptions escaping a tool are counted and re-raised"""
+        metrics = Metrics()
+
+        @metrics.instrument
+        async def broken():
+            raise KeyError("x")
+
+        with pytest.raises(KeyError):
+            await broken()
+
+        stats = metrics.snapshot()["tools"]["broken"]
+        assert stats["errors"] == {"KeyError": 1}
+        assert stats["in_flight"] == 0
+
+    async def test_tracks_concurrency(self):
+        """Test that concurrent calls raise the in-flight high-water mark"""
+        import asyncio
+        metrics = Metrics()
+        release = asyncio.Event()
+
+        @metrics.instrument
+        async def slow():
+            await release.wait()
+
+        tasks = [asyncio.create_task(slow()) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert metrics.snapshot()["in_flight"] == 3
+        release.set()
+        await asyncio.gather(*tasks)
+
+        snapshot = metrics.snapshot()
+        assert snapshot["in_flight"] == 0
+        assert snapshot["max_in_flight"] == 3
+        assert snapshot["tools"]["slow"]["max_in_flight"] == 3
+
+    def test_reports_outside_a_tool_call_are_ignored(self):
+        """Test that upstream() and cache_hit() are no-ops outside instrumented tools"""
+        metrics = Metrics()
+        metrics.upstream(1.0)
+        metrics.cache_hit()
+        assert metrics.snapshot()["tools"] == {}
+
+    async def test_prometheus_exposition(self):
+        """Test the Prometheus text format"""
+        metrics = Metrics()
+
+        @metrics.instrument
+        async def get_years():
+            return {"error": "boom"}
+
+        await get_years()
+        text = metrics.prometheus()
+
+        assert 'transend_tool_calls_total{tool="get_years"} 1' in text
+        assert 'transend_tool_errors_total{tool="get_years",class="ToolError"} 1' in text
+        assert 'transend_tool_latency_seconds_bucket{tool="get_years",le="+Inf"} 1' in text
+        assert 'transend_tool_response_bytes_count{tool="get_years"} 1' in text
+        assert text.endswith("\n")
+
+    async def test_dump_writes_json(self, tmp_path):
+        """Test the JSON snapshot file"""
+        metrics = Metrics()
+
+        @metrics.instrument
+        async def get_tags():
+            return []
+
+        await get_tags()
+        path = tmp_path / "out" / "metrics.json"
+        metrics.dump(str(path))
+
+        data = json.loads(path.read_text())
+        assert data["tools"]["get_tags"]["calls"] == 1
+        assert "time" in data
@@ -0,0 +1,66 @@
+"""Tests for ranking and shaping parts search results"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parts import first_field, fit, item_ids, rank
+
+CATEGORIES = [
+    {"phid": "1", "name": "Air Filters"},
+    {"phid": "2", "name": "Brake Rotors"},
+    {"phid": "3", "name": "Brake Pads"},
+    {"phid": "4", "description": "Brake Pad Hardware Kits"},
+]
+
+
+class TestRank:
+    """Test class for rank"""
+
+    def test_best_match_first(self):
+        """Test that exact words outrank near matches, ties keeping catalog order"""
+        ranked = rank(CATEGORIES, "brake pads")
+        assert [record["phid"] for _, record in ranked] == ["3", "4"]
+        assert [score for score, _ in ranked] == [0, 3]
+        assert [score for score, _ in rank(CATEGORIES, "brake pa")] == [1, 1]
+
+    def test_misspelled_terms(self):
+        """Test that close misspellings still match"""
+        assert [record["phid"] for _, record in rank(CATEGORIES, "brkae pads")] == ["3", "4"]
+        assert rank(CATEGORIES, "wiper") == []
+
+    def test_short_words_do_not_match_longer_terms(self):
+        """Test that a word the term starts with is not a prefix match"""
+        records = [{"name": "A/C Compressor"}, {"name": "Cooling System"}]
+        assert rank(records, "cool") == [(1, {"name": "Cooling System"})]
+        assert [score for score, _ in rank([{"name": "Brake Pads"}], "brakes")] == [3]
+
+    def test_no_query_keeps_catalog(self):
+        """Test that without a query every record is returned in order"""
+        assert [record["phid"] for _, record in rank(CATEGORIES + ["junk"], None)] == ["1", "2", "3", "4"]
+        assert rank({"error": "Timeout"}, "pads") == []
+
+
+class TestShaping:
+    """Test class for item and size helpers"""
+
+    def test_first_field(self):
+        """Test that alternative field names are tried in order"""
+        assert first_field({"id": 7, "phid": "p"}, ("phid", "id")) == "p"
+        assert first_field({"name": "x"}, ("phid", "id")) is None
+
+    def test_item_ids_distinct_and_limited(self):
+        """Test that item ids are collected once each, up to the limit"""
+        records = [{"itemId": "A"}, {"name": "no item"}, {"item_id": "A"}, {"itemNumber": 5}, {"itemId": "C"}]
+        assert item_ids(records, 2) == ["A", "5"]
+
+    def test_fit_drops_from_the_end(self):
+        """Test that entries are dropped until the document fits"""
+        document = {"categories": [{"notes": "x" * 100} for _ in range(5)], "truncated": False}
+        fit(document, "categories", 350)
+        assert len(document["categories"]) == 2
+        assert document["truncated"] is True
+
+        small = {"categories": [{"a": 1}], "truncated": False}
+        assert fit(small, "categories", 10)["categories"] == [{"a": 1}]
@@ -0,0 +1,87 @@
+"""Tests for response projection and paging"""
+
+import pytest
+import json
+import pydantic_core
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projection import matches, project
+
+
+@pytest.fixture
+def dtcs():
+    """A small DTC catalog"""
+    return [
+        {"code": f"P07{n:02d}", "description": f"Transmission fault {n}", "severity": "high" if n % 2 else "low"}
+        for n in range(10)
+    ]
+
+
+class TestProjection:
+    """Test class for project()"""
+
+    def test_small_list_without_options_is_unchanged(self, dtcs):
+        """Test that the plain list is returned when nothing is asked"""
+        assert project(dtcs, max_bytes=65536) == dtcs
+
+    def test_non_list_is_unchanged(self):
+        """Test that errors and single records pass through"""
+        assert project({"error": "API Error"}, limit=1) == {"error": "API Error"}
+
+    def test_fields_limit_offset(self, dtcs):
+        """Test field selection with a page window"""
+        assert project(dtcs, fields=["code"], limit=3, offset=2) == {
+            "items": [{"code": "P0702"}, {"code": "P0703"}, {"code": "P0704"}],
+            "total": 10,
+            "offset": 2,
+            "next_offset": 5,
+        }
+
+    def test_last_page_has_no_next_offset(self, dtcs):
+        """Test that the final page ends the cursor chain"""
+        assert project(dtcs, limit=5, offset=8)["next_offset"] is None
+
+    def test_invalid_paging_is_rejected(self, dtcs):
+        """Test that paging options that would never advance the cursor are errors"""
+        with pytest.raises(ValueError, match="limit"):
+            project(dtcs, limit=0)
+        with pytest.raises(ValueError, match="offset"):
+            project(dtcs, offset=-3)
+
+    def test_filter(self, dtcs):
+        """Test substring and equality filters"""
+        page = project(dtcs, filter={"severity": "HIGH", "code": "p070"})
+        assert [row["code"] for row in page["items"]] == ["P0701", "P0703", "P0705", "P0707", "P0709"]
+        assert page["total"] == 5
+        assert matches({"count": 2}, {"count": 2})
+        assert not matches({"count": 2}, {"count": 3})
+        assert not matches({"code": "P0700"}, {"missing": "x"})
+
+    def test_truncates_to_byte_budget(self, dtcs):
+        """Test that an oversized list is cut and carries a continuation cursor"""
+        budget = len(json.dumps({"items": dtcs[:3], "total": 10, "offset": 0, "next_offset": 3}, indent=2)) + 10
+        page = project(dtcs, max_bytes=budget)
+
+        assert page["items"] == dtcs[:3]
+        assert page["next_offset"] == 3
+        assert project(dtcs, offset=page["next_offset"], max_bytes=budget)["items"][0] == dtcs[3]
+
+    @pytest.mark.parametrize("budget", [300, 1000, 4096])
+    def test_page_fits_the_budget_as_sent(self, budget):
+        """Test that a page, envelope included, stays within the budget when pretty-printed"""
+        rows = [{"code": f"P{n:04d}", "description": "Transmission fault " * (n % 5 + 1)} for n in range(2000)]
+        offset = 0
+        while offset is not None:
+            page = project(rows, offset=offset, max_bytes=budget)
+            sent = pydantic_core.to_json(page, indent=2)
+            assert len(sent) <= budget or len(page["items"]) == 1
+            offset = page["next_offset"]
+
+    def test_oversized_single_row_is_still_returned(self, dtcs):
+        """Test that paging always makes progress"""
+        page = project(dtcs, max_bytes=10)
+        assert page["items"] == dtcs[:1]
+        assert page["next_offset"] == 1
@@ -0,0 +1,149 @@
+"""Tests for the upstream rate limiter"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limit import BACKGROUND, BULK, INTERACTIVE, RateLimiter, TokenBucket, current_priority, parse_limit, priority
+from tests.conftest import FakeClock
+
+
+def make_limiter(clock, limits):
+    """Limiter whose waits advance the fake clock instead of sleeping"""
+    async def sleep(seconds):
+        await asyncio.sleep(0)
+        clock.now += seconds
+    return RateLimiter(limits, clock=clock, sleep=sleep)
+
+
+class TestParseLimit:
+    """Test class for parse_limit"""
+
+    def test_formats(self):
+        """Test rate/burst, rate only and disabled limits"""
+        assert parse_limit("20/40") == (20.0, 40.0)
+        assert parse_limit("5") == (5.0, 5.0)
+        assert parse_limit("0.5") == (0.5, 1.0)
+        assert parse_limit("0") is None
+
+
+class TestTokenBucket:
+    """Test class for TokenBucket"""
+
+    def test_refills_over_time(self):
+        """Test that tokens refill at the configured rate up to the burst"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=2, clock=clock)
+
+        assert bucket.take() == 0
+        assert bucket.take() == 0
+        assert bucket.take() == 0.5
+        clock.now = 0.5
+        assert bucket.take() == 0
+        clock.now = 100
+        assert bucket.take(5) == 0  # cost is capped at the burst
+        assert bucket.take() == 0.5
+
+
+class TestRateLimiter:
+    """Test class for RateLimiter"""
+
+    async def test_within_burst_does_not_wait(self):
+        """Test that calls within the burst are granted immediately"""
+        limiter = make_limiter(FakeClock(), {"vehicle": (10, 3)})
+
+        waits = [await limiter.acquire("vehicle") for _ in range(3)]
+
+        assert waits == [0, 0, 0]
+        assert limiter.stats()["vehicle"]["queued"] == 0
+
+    async def test_unlimited_groups_are_not_throttled(self):
+        """Test that groups without a limit never wait"""
+        limiter = make_limiter(FakeClock(), {"vehicle": None})
+
+        assert [await limiter.acquire("vehicle") for _ in range(100)] == [0] * 100
+        assert await limiter.acquire("unknown") == 0
+        assert limiter.stats() == {}
+
+    async def test_throttles_to_rate(self):
+        """Test that calls beyond the burst are spread out at the rate"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, {"product": (4, 1)})
+
+        await asyncio.gather(*(limiter.acquire("product") for _ in range(5)))
+
+        assert clock.now == pytest.approx(1.0)
+        stats = limiter.stats()["product"]
+        assert stats["acquired"] == 5
+        assert stats["queued"] == 4
+        assert stats["max_queue_depth"] == 4
+        assert stats["queue_depth"] == 0
+
+    async def test_priority_order(self):
+        """Test that queued interactive calls go ahead of bulk and background calls"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, {"vehicle": (1, 1)})
+        await limiter.acquire("vehicle")
+        order = []
+
+        async def call(name, level):
+            await limiter.acquire("vehicle", level)
+            order.append(name)
+
+        await asyncio.gather(
+            call("refresh", BACKGROUND),
+            call("dtcs", BULK),
+            call("quantity-1", INTERACTIVE),
+            call("quantity-2", INTERACTIVE),
+        )
+
+        assert order == ["quantity-1", "quantity-2", "dtcs", "refresh"]
+        waits = limiter.stats()["vehicle"]["waits"]
+        assert waits["interactive"]["wait_time_max"] == pytest.approx(2.0)
+        assert waits["background"]["wait_time_max"] == pytest.approx(4.0)
+
+    async def test_priority_from_context(self):
+        """Test that the current task's priority is used by default"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, {"vehicle": (1, 1)})
+        await limiter.acquire("vehicle")
+        order = []
+
+        async def call(name):
+            await limiter.acquire("vehicle")
+            order.append(name)
+
+        with priority(BULK):
+            bulk = asyncio.ensure_future(call("bulk"))
+        assert current_priority.get() == INTERACTIVE
+        await asyncio.gather(bulk, call("interactive"))
+
+        assert order == ["interactive", "bulk"]
+
+    async def test_cancelled_waiter_is_skipped(self):
+        """Test that a caller cancelled while queued does not use a token"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, {"vehicle": (1, 1)})
+        await limiter.acquire("vehicle")
+
+        cancelled = asyncio.ensure_future(limiter.acquire("vehicle"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await limiter.acquire("vehicle")
+
+        assert limiter.stats()["vehicle"]["acquired"] == 2
+        assert clock.now == pytest.approx(1.0)
+
+    async def test_cost(self):
+        """Test that calls making several requests use several tokens"""
+        clock = FakeClock()
+        limiter = make_limiter(clock, {"vehicle": (1, 3)})
+
+        await limiter.acquire("vehicle", cost=3)
+        await limiter.acquire("vehicle")
+
+        assert clock.now == pytest.approx(1.0)
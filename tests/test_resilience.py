@@ -0,0 +1,229 @@
+"""Tests for upstream retries and circuit breakers"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resilience import CircuitBreaker, CircuitOpenError, Resilience, UpstreamTimeoutError, attempt_timeout, is_transient
+from tests.conftest import FakeClock
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+def make_resilience(clock, delays=None, **kwargs):
+    """Resilience whose backoff advances the fake clock instead of sleeping"""
+    async def sleep(seconds):
+        if delays is not None:
+            delays.append(seconds)
+        clock.now += seconds
+    return Resilience(clock=clock, sleep=sleep, rng=lambda: 1.0, **kwargs)
+
+
+def flaky(*outcomes):
+    """Attempt factory raising or returning the given outcomes in turn"""
+    outcomes = list(outcomes)
+    calls = []
+
+    def factory():
+        async def attempt():
+            calls.append(1)
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        return attempt()
+    factory.calls = calls
+    return factory
+
+
+class TestIsTransient:
+    """Test class for is_transient"""
+
+    def test_classification(self):
+        """Test which failures are worth retrying"""
+        assert is_transient(requests.Timeout())
+        assert is_transient(requests.ConnectionError())
+        assert is_transient(TimeoutError())
+        assert is_transient(http_error(503))
+        assert is_transient(http_error(429))
+        assert not is_transient(http_error(404))
+        assert not is_transient(ValueError("bad input"))
+
+
+class TestResilience:
+    """Test class for Resilience"""
+
+    async def test_retries_transient_failures_with_backoff(self):
+        """Test that transient failures are retried with growing, capped delays"""
+        clock = FakeClock()
+        delays = []
+        resilience = make_resilience(clock, delays, attempts=4, base_delay=0.5, max_delay=1.5)
+        factory = flaky(http_error(503), requests.Timeout(), http_error(502), "ok")
+
+        assert await resilience.call("get_years", factory) == "ok"
+        assert delays == [0.5, 1.0, 1.5]
+        assert resilience.stats()["retries"] == 3
+
+    async def test_gives_up_after_attempts(self):
+        """Test that the last failure is raised once attempts run out"""
+        resilience = make_resilience(FakeClock(), attempts=2)
+        factory = flaky(http_error(503), http_error(504), "never")
+
+        with pytest.raises(requests.HTTPError, match="504"):
+            await resilience.call("get_years", factory)
+        assert len(factory.calls) == 2
+
+    async def test_client_errors_are_not_retried(self):
+        """Test that a 4xx response is raised immediately"""
+        resilience = make_resilience(FakeClock())
+        factory = flaky(http_error(404), "never")
+
+        with pytest.raises(requests.HTTPError):
+            await resilience.call("get_branch_by_number", factory)
+        assert len(factory.calls) == 1
+
+    async def test_non_idempotent_calls_are_not_retried(self):
+        """Test that retry=False makes a single attempt"""
+        resilience = make_resilience(FakeClock())
+        factory = flaky(http_error(503), "never")
+
+        with pytest.raises(requests.HTTPError):
+            await resilience.call("post_credit_card", factory, retry=False)
+        assert len(factory.calls) == 1
+
+    async def test_deadline_stops_retries(self):
+        """Test that no retry starts once its backoff would pass the deadline"""
+        clock = FakeClock()
+        resilience = make_resilience(clock, attempts=10, base_delay=1.0, max_delay=4.0, deadline=5.0)
+        factory = flaky(*[http_error(503)] * 10)
+
+        with pytest.raises(requests.HTTPError):
+            await resilience.call("get_years", factory)
+        # Attempts at t=0, 1 and 3; the next backoff (4s) would end at 7
+        assert len(factory.calls) == 3
+        assert resilience.stats()["deadline_exceeded"] == 1
+
+    async def test_attempts_are_limited_to_the_deadline(self):
+        """Test that each attempt gets the time left, and a timeout at the deadline names the endpoint"""
+        clock = FakeClock()
+        resilience = make_resilience(clock, attempts=5, base_delay=1.0, max_delay=1.0, deadline=5.0)
+        timeouts = []
+
+        def factory():
+            async def attempt():
+                timeouts.append(attempt_timeout.get())
+                clock.now += attempt_timeout.get() / 2
+                raise requests.Timeout()
+            return attempt()
+
+        with pytest.raises(UpstreamTimeoutError, match="Transend get_years timed out after"):
+            await resilience.call("get_years", factory)
+        assert timeouts[:2] == [5.0, 1.5]
+        assert attempt_timeout.get() is None
+
+    async def test_acquire_wait_is_outside_the_deadline(self):
+        """Test that time waiting before an attempt neither uses up the deadline nor fails the endpoint"""
+        clock = FakeClock()
+        resilience = make_resilience(clock, deadline=5.0, failure_threshold=1)
+        timeouts = []
+
+        async def acquire():
+            clock.now += 60
+
+        def factory():
+            async def attempt():
+                timeouts.append(attempt_timeout.get())
+                return "ok"
+            return attempt()
+
+        assert await resilience.call("get_years", factory, acquire=acquire) == "ok"
+        assert timeouts == [5.0]
+        assert resilience.stats()["breakers"]["get_years"]["failures"] == 0
+
+    async def test_bare_timeout_gets_a_message(self):
+        """Test that a timeout without a message is reported with the endpoint and time spent"""
+        resilience = make_resilience(FakeClock(), attempts=1)
+
+        with pytest.raises(UpstreamTimeoutError, match="get_years timed out after 0.0s"):
+            await resilience.call("get_years", flaky(TimeoutError()))
+
+    async def test_cancelled_probe_releases_half_open_circuit(self):
+        """Test that a probe cancelled mid-call lets the next call probe again"""
+        clock = FakeClock()
+        resilience = make_resilience(clock, attempts=1, failure_threshold=1, reset_timeout=10)
+        with pytest.raises(requests.HTTPError):
+            await resilience.call("get_years", flaky(http_error(500)))
+        clock.now = 10
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        probe = asyncio.create_task(resilience.call("get_years", hang))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        assert await resilience.call("get_years", flaky("ok")) == "ok"
+        assert resilience.stats()["breakers"]["get_years"]["state"] == "closed"
+
+    async def test_open_circuit_fails_fast(self):
+        """Test that an endpoint is short-circuited after repeated failures"""
+        clock = FakeClock()
+        resilience = make_resilience(clock, attempts=1, failure_threshold=2, reset_timeout=30)
+        for _ in range(2):
+            with pytest.raises(requests.HTTPError):
+                await resilience.call("get_years", flaky(http_error(500)))
+
+        factory = flaky("never")
+        with pytest.raises(CircuitOpenError, match="retry in 30s"):
+            await resilience.call("get_years", factory)
+        assert factory.calls == []
+        # Other endpoints are unaffected
+        assert await resilience.call("get_all_tags", flaky("tags")) == "tags"
+        assert resilience.stats()["breakers"]["get_years"]["state"] == "open"
+
+
+class TestCircuitBreaker:
+    """Test class for CircuitBreaker"""
+
+    def test_half_open_probe(self):
+        """Test that one probe is allowed after the reset timeout"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("get_years", failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+        clock.now = 10
+        breaker.before_call()
+        assert breaker.state == "half_open"
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        assert breaker.state == "closed"
+        breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        """Test that a failed probe opens the circuit for another reset timeout"""
+        clock = FakeClock()
+        breaker = CircuitBreaker("get_years", failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        breaker.before_call()
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+        assert breaker.stats()["trips"] == 2
+        clock.now = 15
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
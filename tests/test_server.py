@@ -2,15 +2,40 @@
 
 import pytest
 import asyncio
+import json
+from collections import Counter
 from unittest.mock import Mock, patch, AsyncMock
 from uuid import UUID
 from mcp.server.fastmcp import FastMCP
+from pydantic import AnyUrl
 import sys
 import os
 
 # Add the parent directory to the path to import server
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """Start every test with an empty response cache, closed circuits and full rate limit buckets"""
+    from server import rate_limiter, resilience, response_cache
+    response_cache.clear()
+    resilience.reset()
+    rate_limiter.reset()
+    yield
+    response_cache.clear()
+    resilience.reset()
+    rate_limiter.reset()
+
+
+@pytest.fixture(autouse=True)
+def vehicle_store():
+    """Give every test its own in-memory vehicle cache"""
+    from vehicle_store import PersistentCache
+    store = PersistentCache(":memory:")
+    with patch('server.vehicle_store', store):
+        yield store
+
+
 class TestMCPServer:
     """Test class for MCP server tools"""
     
@@ -76,191 +101,1216 @@ class TestMCPServer:
         return mock_client
 
     @patch('server.client')
-    def test_get_all_branches_success(self, mock_client_instance, mock_client):
+    async def test_get_all_branches_success(self, mock_client_instance, mock_client):
         """Test successful branch retrieval"""
         mock_client_instance.branch.get_all_branches.return_value = [{"id": 1, "name": "Branch 1"}]
         
         from server import get_all_branches
-        result = get_all_branches()
+        result = await get_all_branches()
         
         assert result == [{"id": 1, "name": "Branch 1"}]
         mock_client_instance.branch.get_all_branches.assert_called_once_with(active=None)
 
     @patch('server.client')
-    def test_get_all_branches_with_active_filter(self, mock_client_instance, mock_client):
+    async def test_get_all_branches_with_active_filter(self, mock_client_instance, mock_client):
         """Test branch retrieval with active filter"""
         mock_client_instance.branch.get_all_branches.return_value = [{"id": 1, "name": "Active Branch"}]
         
         from server import get_all_branches
-        result = get_all_branches(active=True)
+        result = await get_all_branches(active=True)
         
         assert result == [{"id": 1, "name": "Active Branch"}]
         mock_client_instance.branch.get_all_branches.assert_called_once_with(active=True)
 
     @patch('server.client')
-    def test_get_all_branches_error(self, mock_client_instance, mock_client):
+    async def test_get_all_branches_error(self, mock_client_instance, mock_client):
         """Test branch retrieval error handling"""
         mock_client_instance.branch.get_all_branches.side_effect = Exception("API Error")
         
         from server import get_all_branches
-        result = get_all_branches()
+        result = await get_all_branches()
         
         assert result == {"error": "API Error"}
 
     @patch('server.client')
-    def test_get_branch_by_number_success(self, mock_client_instance, mock_client):
+    async def test_get_branch_by_number_success(self, mock_client_instance, mock_client):
         """Test successful branch retrieval by number"""
         mock_client_instance.branch.get_branch_by_number.return_value = {"id": 1, "number": "001"}
         
         from server import get_branch_by_number
-        result = get_branch_by_number("001")
+        result = await get_branch_by_number("001")
         
         assert result == {"id": 1, "number": "001"}
         mock_client_instance.branch.get_branch_by_number.assert_called_once_with("001")
 
     @patch('server.client')
-    def test_get_all_sort_types_success(self, mock_client_instance, mock_client):
+    async def test_get_all_sort_types_success(self, mock_client_instance, mock_client):
         """Test successful sort types retrieval"""
         mock_client_instance.product.get_all_sort_types.return_value = [{"id": 1, "name": "Sort Type 1"}]
         
         from server import get_all_sort_types
-        result = get_all_sort_types()
+        result = await get_all_sort_types()
         
         assert result == [{"id": 1, "name": "Sort Type 1"}]
         mock_client_instance.product.get_all_sort_types.assert_called_once()
 
     @patch('server.client')
-    def test_get_all_tags_success(self, mock_client_instance, mock_client):
+    async def test_get_all_tags_success(self, mock_client_instance, mock_client):
         """Test successful tags retrieval"""
         mock_client_instance.product.get_all_tags.return_value = [{"id": 1, "name": "Tag 1"}]
         
         from server import get_all_tags
-        result = get_all_tags()
+        result = await get_all_tags()
         
         assert result == [{"id": 1, "name": "Tag 1"}]
         mock_client_instance.product.get_all_tags.assert_called_once()
 
     @patch('server.client')
-    def test_get_availability_by_item_id_success(self, mock_client_instance, mock_client):
+    async def test_get_availability_by_item_id_success(self, mock_client_instance, mock_client):
         """Test successful availability retrieval"""
         mock_client_instance.product.get_availability_by_item_id.return_value = {"available": True}
         
         from server import get_availability_by_item_id
-        result = get_availability_by_item_id("item123")
+        result = await get_availability_by_item_id("item123")
         
         assert result == {"available": True}
         mock_client_instance.product.get_availability_by_item_id.assert_called_once_with("item123")
 
     @patch('server.client')
-    def test_get_available_quantity_success(self, mock_client_instance, mock_client):
+    async def test_get_available_quantity_success(self, mock_client_instance, mock_client):
         """Test successful quantity retrieval"""
         mock_client_instance.product.get_available_quantity.return_value = {"quantity": 10}
         
         from server import get_available_quantity
-        result = get_available_quantity("item123", "001", "type1")
+        result = await get_available_quantity("item123", "001", "type1")
         
         assert result == {"quantity": 10}
         mock_client_instance.product.get_available_quantity.assert_called_once_with("item123", "001", "type1")
 
     @patch('server.client')
-    def test_delete_bank_account_success(self, mock_client_instance, mock_client):
+    async def test_delete_bank_account_success(self, mock_client_instance, mock_client):
         """Test successful bank account deletion"""
         from server import delete_bank_account
-        result = delete_bank_account(123)
+        result = await delete_bank_account(123)
         
         assert result == {"success": True}
         mock_client_instance.account.delete_bank_account.assert_called_once_with(123)
 
     @patch('server.client')
-    def test_delete_bank_account_error(self, mock_client_instance, mock_client):
+    async def test_delete_bank_account_error(self, mock_client_instance, mock_client):
         """Test bank account deletion error handling"""
         mock_client_instance.account.delete_bank_account.side_effect = Exception("Delete Error")
         
         from server import delete_bank_account
-        result = delete_bank_account(123)
+        result = await delete_bank_account(123)
         
         assert result == {"error": "Delete Error"}
 
     @patch('server.client')
-    def test_update_credit_card_default_success(self, mock_client_instance, mock_client):
+    async def test_update_credit_card_default_success(self, mock_client_instance, mock_client):
         """Test successful credit card default update"""
         from server import update_credit_card_default
-        result = update_credit_card_default("550e8400-e29b-41d4-a716-446655440000")
+        result = await update_credit_card_default("550e8400-e29b-41d4-a716-446655440000")
         
         assert result == {"success": True}
         mock_client_instance.account.update_credit_card_default.assert_called_once()
 
     @patch('server.client')
-    def test_delete_credit_card_success(self, mock_client_instance, mock_client):
+    async def test_delete_credit_card_success(self, mock_client_instance, mock_client):
         """Test successful credit card deletion"""
         from server import delete_credit_card
-        result = delete_credit_card("550e8400-e29b-41d4-a716-446655440000")
+        result = await delete_credit_card("550e8400-e29b-41d4-a716-446655440000")
         
         assert result == {"success": True}
         mock_client_instance.account.delete_credit_card.assert_called_once()
 
     @patch('server.client')
-    def test_get_vehicles_by_vin_success(self, mock_client_instance, mock_client):
+    async def test_get_vehicles_by_vin_success(self, mock_client_instance, mock_client):
         """Test successful vehicle retrieval by VIN"""
         mock_client_instance.vehicle.get_vehicles_by_vin.return_value = [{"id": 1, "vin": "TEST123"}]
         
         from server import get_vehicles_by_vin
-        result = get_vehicles_by_vin("TEST123")
+        result = await get_vehicles_by_vin("TEST123")
         
         assert result == [{"id": 1, "vin": "TEST123"}]
         mock_client_instance.vehicle.get_vehicles_by_vin.assert_called_once_with("TEST123")
 
     @patch('server.client')
-    def test_get_year_make_model_vhid_success(self, mock_client_instance, mock_client):
+    async def test_get_year_make_model_vhid_success(self, mock_client_instance, mock_client):
         """Test successful vhid retrieval by year/make/model"""
         mock_client_instance.vehicle.get_year_make_model_vhid.return_value = {"vhid": "test-vhid"}
         
         from server import get_year_make_model_vhid
-        result = get_year_make_model_vhid(2020, "Toyota", "Camry")
+        result = await get_year_make_model_vhid(2020, "Toyota", "Camry")
         
         assert result == {"vhid": "test-vhid"}
         mock_client_instance.vehicle.get_year_make_model_vhid.assert_called_once_with(2020, "Toyota", "Camry")
 
     @patch('server.client')
-    def test_get_customer_info_success(self, mock_client_instance, mock_client):
+    async def test_get_customer_info_success(self, mock_client_instance, mock_client):
         """Test successful customer info retrieval"""
         mock_client_instance.account.get_customer_info.return_value = {"id": 1, "name": "Test Customer"}
         
         from server import get_customer_info
-        result = get_customer_info()
+        result = await get_customer_info()
         
         assert result == {"id": 1, "name": "Test Customer"}
         mock_client_instance.account.get_customer_info.assert_called_once()
 
     @patch('server.client')
-    def test_get_articles_success(self, mock_client_instance, mock_client):
+    async def test_get_articles_success(self, mock_client_instance, mock_client):
         """Test successful articles retrieval"""
         mock_client_instance.content.get_articles.return_value = [{"id": 1, "title": "Article 1"}]
         
         from server import get_articles
-        result = get_articles()
+        result = await get_articles()
         
         assert result == [{"id": 1, "title": "Article 1"}]
         mock_client_instance.content.get_articles.assert_called_once()
 
     @patch('server.client')
-    def test_get_open_cores_success(self, mock_client_instance, mock_client):
+    async def test_get_open_cores_success(self, mock_client_instance, mock_client):
         """Test successful open cores retrieval"""
         mock_client_instance.core.get_open_cores.return_value = [{"id": 1, "status": "open"}]
         
         from server import get_open_cores
-        result = get_open_cores()
+        result = await get_open_cores()
         
         assert result == [{"id": 1, "status": "open"}]
         mock_client_instance.core.get_open_cores.assert_called_once()
 
     @patch('server.client')
-    def test_get_users_success(self, mock_client_instance, mock_client):
+    async def test_get_users_success(self, mock_client_instance, mock_client):
         """Test successful users retrieval"""
         mock_client_instance.customer.get_users.return_value = [{"id": 1, "username": "testuser"}]
         
         from server import get_users
-        result = get_users()
+        result = await get_users()
         
         assert result == [{"id": 1, "username": "testuser"}]
         mock_client_instance.customer.get_users.assert_called_once()
+
+    @patch('server.client')
+    async def test_tools_run_concurrently(self, mock_client_instance, mock_client):
+        """Test that blocking SDK calls overlap instead of queueing"""
+        import time
+
+        def slow_lookup(branch_number):
+            time.sleep(0.2)
+            return {"number": branch_number}
+
+        mock_client_instance.branch.get_branch_by_number.side_effect = slow_lookup
+
+        from server import get_branch_by_number
+        start = time.perf_counter()
+        results = await asyncio.gather(*(get_branch_by_number(str(n)) for n in range(4)))
+        elapsed = time.perf_counter() - start
+
+        assert results == [{"number": str(n)} for n in range(4)]
+        assert elapsed < 0.6
+
+    @patch('server.client')
+    async def test_reference_data_is_cached(self, mock_client_instance, mock_client):
+        """Test that catalog tools are served from the cache on repeat calls"""
+        mock_client_instance.product.get_all_tags.return_value = [{"id": 1, "name": "Tag 1"}]
+
+        from server import get_all_tags, response_cache
+        first = await get_all_tags()
+        second = await get_all_tags()
+
+        assert first == second == [{"id": 1, "name": "Tag 1"}]
+        mock_client_instance.product.get_all_tags.assert_called_once()
+        assert response_cache.stats()["hits"] == 1
+        assert response_cache.stats()["misses"] == 1
+
+    @patch('server.client')
+    async def test_cache_key_includes_arguments(self, mock_client_instance, mock_client):
+        """Test that different arguments are cached separately"""
+        mock_client_instance.branch.get_all_branches.side_effect = lambda active=None: [{"active": active}]
+
+        from server import get_all_branches
+        assert await get_all_branches(active=True) == [{"active": True}]
+        assert await get_all_branches(active=False) == [{"active": False}]
+        assert await get_all_branches(active=True) == [{"active": True}]
+
+        assert mock_client_instance.branch.get_all_branches.call_count == 2
+
+    @patch('server.client')
+    async def test_errors_are_not_cached(self, mock_client_instance, mock_client):
+        """Test that a failed upstream call is retried on the next request"""
+        mock_client_instance.vehicle.get_years.side_effect = [Exception("API Error"), [2020]]
+
+        from server import get_years
+        assert await get_years() == {"error": "API Error"}
+        assert await get_years() == [2020]
+
+    @patch('server.client')
+    async def test_tools_are_instrumented(self, mock_client_instance, mock_client):
+        """Test that tool calls record upstream calls, cache hits and error classes"""
+        mock_client_instance.product.get_all_tags.return_value = [{"id": 1}]
+        mock_client_instance.vehicle.get_years.side_effect = TimeoutError("read timed out")
+
+        from server import get_all_tags, get_years, metrics
+        metrics.clear()
+        await get_all_tags()
+        await get_all_tags()
+        await get_years()
+
+        tools = metrics.snapshot()["tools"]
+        assert tools["get_all_tags"]["calls"] == 2
+        assert tools["get_all_tags"]["upstream_calls"] == 1
+        assert tools["get_all_tags"]["served_from_cache"] == 1
+        assert tools["get_years"]["errors"] == {"UpstreamTimeoutError": 1}
+
+    @patch('server.client')
+    async def test_transient_failures_are_retried(self, mock_client_instance, mock_client):
+        """Test that a read tool retries a 503 instead of returning an error"""
+        import requests
+        response = requests.Response()
+        response.status_code = 503
+        mock_client_instance.branch.get_branch_by_number.side_effect = [
+            requests.HTTPError("503 Service Unavailable", response=response), {"number": "001"}]
+
+        from server import get_branch_by_number, resilience
+        with patch.object(resilience, 'base_delay', 0):
+            assert await get_branch_by_number("001") == {"number": "001"}
+        assert mock_client_instance.branch.get_branch_by_number.call_count == 2
+
+    @patch('server.client')
+    async def test_mutations_are_not_retried(self, mock_client_instance, mock_client):
+        """Test that a failed mutation is reported without a second attempt"""
+        mock_client_instance.account.post_credit_card.side_effect = TimeoutError("read timed out")
+
+        from server import post_credit_card
+        assert await post_credit_card({"number": "4242"}) == {"error": "read timed out"}
+        mock_client_instance.account.post_credit_card.assert_called_once()
+
+    @patch('server.client')
+    async def test_stale_catalog_served_while_upstream_fails(self, mock_client_instance, mock_client):
+        """Test that an expired catalog entry is served when Transend is down"""
+        from cache import make_key
+        from server import _tenant, get_all_tags, get_credit_cards, resilience, response_cache
+        response_cache.set(make_key("get_all_tags"), [{"id": 1}], ttl=-1)
+        response_cache.set(make_key("get_credit_cards", _tenant()), [{"id": 2}], ttl=-1)
+        mock_client_instance.product.get_all_tags.side_effect = TimeoutError("read timed out")
+        mock_client_instance.account.get_credit_cards.side_effect = TimeoutError("read timed out")
+
+        with patch.object(resilience, 'attempts', 1), patch('server.stale_while_revalidate', False):
+            assert await get_all_tags() == [{"id": 1}]
+            error = (await get_credit_cards())["error"]
+        assert error.startswith("Transend get_credit_cards timed out after") and error.endswith(": read timed out")
+        assert resilience.stats()["stale_served"] == 1
+
+    @patch('server.client')
+    async def test_stale_while_revalidate(self, mock_client_instance, mock_client):
+        """Test that an expired catalog is served at once and refreshed in the background"""
+        from cache import make_key
+        from server import get_all_tags, response_cache, revalidating
+        response_cache.set(make_key("get_all_tags"), [{"id": 1}], ttl=-1)
+        mock_client_instance.product.get_all_tags.return_value = [{"id": 1}, {"id": 2}]
+
+        assert await get_all_tags() == [{"id": 1}]
+        assert await get_all_tags() == [{"id": 1}]
+        await asyncio.gather(*revalidating.values())
+
+        assert await get_all_tags() == [{"id": 1}, {"id": 2}]
+        mock_client_instance.product.get_all_tags.assert_called_once()
+
+    @patch('server.client')
+    async def test_account_data_is_not_revalidated_stale(self, mock_client_instance, mock_client):
+        """Test that expired account entries are always fetched again"""
+        from cache import make_key
+        from server import _tenant, get_credit_cards, response_cache, revalidating
+        response_cache.set(make_key("get_credit_cards", _tenant()), [{"id": 1}], ttl=-1)
+        mock_client_instance.account.get_credit_cards.return_value = [{"id": 2}]
+
+        assert await get_credit_cards() == [{"id": 2}]
+        assert revalidating == {}
+
+    @patch('server.key_hits', Counter())
+    @patch('server.refresh_calls', {})
+    @patch('server.prefetching', True)
+    @patch('server.prefetch_tools', ["get_all_sort_types"])
+    @patch('server.prefetch_hot_keys', 1)
+    @patch('server.client')
+    async def test_prefetch_keeps_configured_and_hot_keys_warm(self, mock_client_instance, mock_client):
+        """Test that the prefetcher loads configured catalogs and refreshes the hottest key"""
+        from cache import make_key
+        from server import _prefetch_once, get_categories, response_cache
+        mock_client_instance.product.get_all_sort_types.return_value = [{"id": 1}]
+        mock_client_instance.product.get_categories.side_effect = lambda **kwargs: [kwargs["vhid"]]
+
+        await get_categories(vhid="v1")
+        await get_categories(vhid="v1")
+        await get_categories(vhid="v2")
+        # Make the hot entry due for a refresh
+        response_cache.set(make_key("get_categories", vhid="v1", phid=None, search_id=None), ["old"], ttl=1)
+
+        await _prefetch_once()
+
+        assert response_cache.get(make_key("get_all_sort_types")) == [{"id": 1}]
+        assert response_cache.get(make_key("get_categories", vhid="v1", phid=None, search_id=None)) == ["v1"]
+        calls = [call.kwargs["vhid"] for call in mock_client_instance.product.get_categories.call_args_list]
+        assert calls == ["v1", "v2", "v1"]
+
+    @patch('server.key_hits', Counter())
+    @patch('server.refresh_calls', {})
+    @patch('server.prefetching', False)
+    @patch('server.client')
+    async def test_hot_keys_are_not_recorded_without_the_prefetcher(self, mock_client_instance, mock_client):
+        """Test that request counts are only kept while the prefetcher runs"""
+        from server import get_categories, key_hits, refresh_calls
+        mock_client_instance.product.get_categories.return_value = []
+
+        await get_categories(vhid="v1")
+
+        assert key_hits == {} and refresh_calls == {}
+
+    @patch('server.key_hits', Counter())
+    @patch('server.refresh_calls', {})
+    @patch('server.prefetching', True)
+    @patch('server.client')
+    async def test_hot_keys_are_forgotten_when_evicted(self, mock_client_instance, mock_client):
+        """Test that recorded keys hold no client and leave with their cache entry"""
+        from cache import make_key
+        from server import get_categories, key_hits, refresh_calls, response_cache
+        mock_client_instance.product.get_categories.return_value = []
+        key = make_key("get_categories", vhid="v1", phid=None, search_id=None)
+
+        await get_categories(vhid="v1")
+        assert refresh_calls[key] == ("get_categories", "product", (), {"vhid": "v1", "phid": None, "search_id": None})
+
+        with patch.object(response_cache, "maxsize", 1):
+            response_cache.set(make_key("get_all_tags"), [], ttl=60)
+
+        assert key not in key_hits and key not in refresh_calls
+
+    @patch('server.client')
+    async def test_open_circuit_fails_fast(self, mock_client_instance, mock_client):
+        """Test that repeated upstream failures stop further calls to the endpoint"""
+        mock_client_instance.vehicle.get_years.side_effect = TimeoutError("read timed out")
+
+        from server import get_years, resilience
+        with patch.object(resilience, 'attempts', 1), patch.object(resilience, 'failure_threshold', 2):
+            await get_years()
+            await get_years()
+            result = await get_years()
+
+        assert "unavailable" in result["error"]
+        assert mock_client_instance.vehicle.get_years.call_count == 2
+
+    def test_rate_limits_are_off_by_default(self):
+        """Test that no endpoint group is rate limited unless configured"""
+        from server import rate_limiter
+        assert rate_limiter.groups == {}
+
+    @patch('server.client')
+    async def test_upstream_calls_are_rate_limited_by_group_and_priority(self, mock_client_instance, mock_client):
+        """Test that upstream calls draw from their group's bucket at the right priority"""
+        mock_client_instance.product.get_available_quantity.return_value = {"quantity": 1}
+        mock_client_instance.vehicle.get_all_dtcs.return_value = []
+
+        from rate_limit import RateLimiter
+        from server import get_all_dtcs, get_available_quantities_bulk, get_available_quantity
+        rate_limiter = RateLimiter({"product": (20, 40), "vehicle": (20, 40)})
+        with patch('server.rate_limiter', rate_limiter):
+            await get_available_quantity("A", "001", 1)
+            await get_available_quantities_bulk(["A", "B"], 1, ["002"])
+            await get_all_dtcs()
+
+        stats = rate_limiter.stats()
+        assert stats["product"]["acquired"] == 3
+        assert set(stats["product"]["waits"]) == {"interactive", "bulk"}
+        assert set(stats["vehicle"]["waits"]) == {"bulk"}
+
+    @patch('server.client')
+    async def test_rate_limit_queueing_is_not_an_upstream_failure(self, mock_client_instance, mock_client):
+        """Test that calls queued past the retry deadline still run and leave the circuit closed"""
+        from rate_limit import RateLimiter
+        from server import get_available_quantity, resilience
+        mock_client_instance.product.get_available_quantity.return_value = {"quantity": 1}
+
+        with patch('server.rate_limiter', RateLimiter({"product": (20, 1)})), \
+                patch.object(resilience, 'deadline', 0.05), patch.object(resilience, 'failure_threshold', 1):
+            results = await asyncio.gather(*(get_available_quantity(f"A{n}", "001", 1) for n in range(6)))
+
+        assert results == [{"quantity": 1}] * 6
+        assert resilience.stats()["breakers"]["get_available_quantity"]["state"] == "closed"
+
+    @patch('server.client')
+    async def test_mutation_invalidates_related_entries(self, mock_client_instance, mock_client):
+        """Test that posting a credit card drops cached credit cards"""
+        mock_client_instance.account.get_credit_cards.return_value = [{"id": 1}]
+        mock_client_instance.account.post_credit_card.return_value = {"guid": "new"}
+
+        from server import get_credit_cards, post_credit_card
+        await get_credit_cards()
+        await get_credit_cards()
+        assert await post_credit_card({"number": "4242"}) == {"guid": "new"}
+        await get_credit_cards()
+
+        assert mock_client_instance.account.get_credit_cards.call_count == 2
+        mock_client_instance.account.post_credit_card.assert_called_once_with({"number": "4242"})
+
+    @patch('server.client')
+    async def test_get_available_quantities_bulk_matrix(self, mock_client_instance, mock_client):
+        """Test that bulk availability returns one cell per item and branch"""
+        def quantity(item_id, branch_number, availability_type_id):
+            if (item_id, branch_number) == ("B", "002"):
+                raise Exception("Not Found")
+            return {"itemId": item_id, "quantityAvailable": "5" if item_id == "A" else 2, "branch": branch_number}
+
+        mock_client_instance.product.get_available_quantity.side_effect = quantity
+
+        from server import get_available_quantities_bulk
+        result = await get_available_quantities_bulk(["A", "B"], "type1", ["001", "002"])
+
+        assert result["branches"] == ["001", "002"]
+        assert result["quantities"]["A"] == {"001": 5, "002": 5}
+        assert result["quantities"]["B"]["001"] == 2
+        assert result["quantities"]["B"]["002"] == {"error": "Not Found"}
+        assert result["errors"] == 1
+        assert mock_client_instance.product.get_available_quantity.call_count == 4
+
+    @patch('server.client')
+    async def test_get_available_quantities_bulk_raw_cells(self, mock_client_instance, mock_client):
+        """Test that raw=True keeps the full quantity response in each cell"""
+        mock_client_instance.product.get_available_quantity.return_value = {"quantity": 3, "branch": "001"}
+
+        from server import get_available_quantities_bulk
+        result = await get_available_quantities_bulk(["A"], "type1", ["001"], raw=True)
+
+        assert result["quantities"] == {"A": {"001": {"quantity": 3, "branch": "001"}}}
+
+    @patch('server.client')
+    async def test_get_available_quantities_bulk_defaults_to_active_branches(self, mock_client_instance, mock_client):
+        """Test that omitting branches fans out over all active branches"""
+        mock_client_instance.branch.get_all_branches.return_value = [{"number": "001"}, {"number": "007"}]
+        mock_client_instance.product.get_available_quantity.return_value = {"quantity": 1}
+
+        from server import get_available_quantities_bulk
+        result = await get_available_quantities_bulk(["A"], "type1")
+
+        assert result["branches"] == ["001", "007"]
+        assert set(result["quantities"]["A"]) == {"001", "007"}
+        mock_client_instance.branch.get_all_branches.assert_called_once_with(active=True)
+
+    @patch('server.bulk_concurrency', 2)
+    @patch('server.client')
+    async def test_get_available_quantities_bulk_caps_concurrency(self, mock_client_instance, mock_client):
+        """Test that no more than the configured number of calls run at once"""
+        import threading
+        import time
+
+        lock = threading.Lock()
+        in_flight = peak = 0
+
+        def quantity(item_id, branch_number, availability_type_id):
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight -= 1
+            return {"quantity": 1}
+
+        mock_client_instance.product.get_available_quantity.side_effect = quantity
+
+        from server import get_available_quantities_bulk
+        await get_available_quantities_bulk(["A", "B", "C"], "type1", ["001", "002"])
+
+        assert peak == 2
+
+    @patch('server.client')
+    async def test_find_stock_nearby_stops_once_quantity_met(self, mock_client_instance, mock_client):
+        """Test that branches are checked nearest first and the search stops at the requested quantity"""
+        mock_client_instance.branch.get_all_branches.return_value = [
+            {"branchNumber": "001", "name": "Dallas", "latitude": 32.7767, "longitude": -96.7970, "active": True},
+            {"branchNumber": "002", "name": "Houston", "latitude": 29.7604, "longitude": -95.3698, "active": True},
+            {"branchNumber": "003", "name": "Fort Worth", "latitude": 32.7555, "longitude": -97.3308, "active": True},
+            {"branchNumber": "004", "name": "El Paso", "latitude": 31.7619, "longitude": -106.4850, "active": True},
+        ]
+        stock = {"001": 0, "003": 2, "002": 5, "004": 9}
+        mock_client_instance.product.get_available_quantity.side_effect = \
+            lambda item_id, branch_number, availability_type_id: {"quantity": stock[branch_number]}
+
+        with patch('server.stock_search_window', 1):
+            from server import find_stock_nearby
+            result = await find_stock_nearby("ITEM-1", "001", "1", quantity=3)
+
+        assert result["fulfilled"] is True
+        assert result["found"] == 7
+        assert [option["branch_number"] for option in result["options"]] == ["003", "002"]
+        assert result["best"]["branch_number"] == "002"
+        assert result["checked"] == 3
+        assert result["candidates"] == 4
+        checked = [call.args[1] for call in mock_client_instance.product.get_available_quantity.call_args_list]
+        assert checked == ["001", "003", "002"]
+
+    @patch('server.client')
+    async def test_find_stock_nearby_not_found(self, mock_client_instance, mock_client):
+        """Test a search that runs out of branches, and an unknown origin"""
+        mock_client_instance.branch.get_all_branches.return_value = [
+            {"branchNumber": "001", "name": "Dallas", "latitude": 32.7767, "longitude": -96.7970},
+            {"branchNumber": "002", "name": "Houston", "latitude": 29.7604, "longitude": -95.3698},
+        ]
+
+        def quantity(item_id, branch_number, availability_type_id):
+            if branch_number == "002":
+                raise Exception("Timeout")
+            return {"quantity": 1}
+
+        mock_client_instance.product.get_available_quantity.side_effect = quantity
+
+        from server import find_stock_nearby
+        result = await find_stock_nearby("ITEM-1", "001", "1", quantity=2)
+
+        assert result["fulfilled"] is False
+        assert result["checked"] == 2
+        assert result["errors"] == 1
+        assert result["best"] is None
+        assert await find_stock_nearby("ITEM-1", "999", "1") == {"error": "Branch 999 not found"}
+
+    @patch('server.client')
+    async def test_resolve_vehicle_by_ymm(self, mock_client_instance, mock_client):
+        """Test that year/make/model resolves into a merged vehicle context"""
+        mock_client_instance.vehicle.get_year_make_model_vhid.return_value = {"vhid": "v1"}
+        mock_client_instance.vehicle.get_vehicle_by_vhid.return_value = {"id": 1, "year": 2020}
+        mock_client_instance.vehicle.get_engines_by_vhid.return_value = [{"type": "V6"}]
+        mock_client_instance.vehicle.get_drive_types_by_vhid.side_effect = Exception("Timeout")
+        mock_client_instance.vehicle.get_submodels_by_vhid.return_value = [{"name": "LE"}]
+
+        from server import resolve_vehicle
+        result = await resolve_vehicle(year=2020, make="Toyota", model="Camry")
+
+        assert result == {
+            "vhid": "v1",
+            "source": "ymm",
+            "vehicle": {"id": 1, "year": 2020},
+            "engines": [{"type": "V6"}],
+            "drive_types": {"error": "Timeout"},
+            "submodels": [{"name": "LE"}],
+        }
+        mock_client_instance.vehicle.get_year_make_model_vhid.assert_called_once_with(2020, "Toyota", "Camry")
+        mock_client_instance.vehicle.get_engines_by_vhid.assert_called_once_with("v1")
+
+    @patch('server.client')
+    async def test_resolve_vehicle_by_vin(self, mock_client_instance, mock_client):
+        """Test that a VIN resolves through get_vehicles_by_vin"""
+        mock_client_instance.vehicle.get_vehicles_by_vin.return_value = [{"vhid": "v1"}, {"vhid": "v2"}]
+
+        from server import resolve_vehicle
+        result = await resolve_vehicle(vin="1HGBH41JXMN109186")
+
+        assert result["vhid"] == "v1"
+        assert result["source"] == "vin"
+        assert result["candidates"] == ["v1", "v2"]
+        mock_client_instance.vehicle.get_year_make_model_vhid.assert_not_called()
+
+    @patch('server.client')
+    async def test_find_parts_for_vehicle(self, mock_client_instance, mock_client):
+        """Test that one call resolves the vehicle, ranks its categories and fills in brands and availability"""
+        mock_client_instance.vehicle.get_year_make_model_vhid.return_value = {"vhid": "v1"}
+        mock_client_instance.product.get_categories.return_value = [
+            {"phid": "p1", "name": "Air Filters"},
+            {"phid": "p2", "name": "Brake Rotors"},
+            {"phid": "p3", "name": "Brake Pads"},
+        ]
+
+        def brands(vhid=None, phid=None):
+            if phid == "p3":
+                return [{"name": "Bosch", "itemId": "BP-1"}, {"name": "Wagner", "itemId": "BP-2"}]
+            if phid == "p2":
+                raise Exception("Timeout")
+            return [{"name": "Bosch"}, {"name": "Wagner"}, {"name": "Fram"}]
+
+        mock_client_instance.product.get_brands.side_effect = brands
+        mock_client_instance.product.get_availability_by_item_id.side_effect = lambda item_id: {"item": item_id}
+
+        from server import find_parts_for_vehicle
+        result = await find_parts_for_vehicle("brake", year=2020, make="Toyota", model="Camry", brands_limit=2)
+
+        assert result["vhid"] == "v1"
+        assert result["total_categories"] == 2
+        assert [category["name"] for category in result["categories"]] == ["Brake Rotors", "Brake Pads"]
+        assert result["categories"][0]["brands"] == {"error": "Timeout"}
+        assert result["categories"][1]["brands"] == [{"name": "Bosch", "itemId": "BP-1"}, {"name": "Wagner", "itemId": "BP-2"}]
+        assert result["brands"] == [{"name": "Bosch"}, {"name": "Wagner"}]
+        assert result["availability"] == {"BP-1": {"item": "BP-1"}, "BP-2": {"item": "BP-2"}}
+        assert result["truncated"] is False
+        mock_client_instance.product.get_categories.assert_called_once_with(vhid="v1", phid=None, search_id=None)
+
+    @patch('server.client')
+    async def test_find_parts_for_vehicle_is_size_bounded(self, mock_client_instance, mock_client):
+        """Test that the lowest ranked categories are dropped to fit the response size limit"""
+        mock_client_instance.vehicle.get_vehicles_by_vin.return_value = [{"vhid": "v1"}]
+        mock_client_instance.product.get_categories.return_value = [
+            {"phid": f"p{n}", "name": f"Category {n}", "notes": "x" * 400} for n in range(10)]
+        mock_client_instance.product.get_brands.return_value = []
+
+        with patch('server.max_response_bytes', 2000):
+            from server import find_parts_for_vehicle
+            result = await find_parts_for_vehicle(vin="1HGBH41JXMN109186", limit=10)
+
+        kept = [category["phid"] for category in result["categories"]]
+        assert result["truncated"] is True
+        assert result["total_categories"] == 10
+        assert 0 < len(kept) < 10 and kept == [f"p{n}" for n in range(len(kept))]
+        assert len(json.dumps(result, separators=(",", ":"))) <= 2000
+
+    @patch('server.client')
+    async def test_find_parts_for_vehicle_errors(self, mock_client_instance, mock_client):
+        """Test that vehicle and category failures are reported"""
+        from server import find_parts_for_vehicle
+        assert await find_parts_for_vehicle("pads") == {"error": "Provide either a VIN or year, make and model"}
+
+        mock_client_instance.vehicle.get_year_make_model_vhid.return_value = {"vhid": "v1"}
+        mock_client_instance.product.get_categories.side_effect = Exception("Bad request")
+        result = await find_parts_for_vehicle("pads", year=2020, make="Toyota", model="Camry")
+        assert result == {"vhid": "v1", "error": "Could not list categories: Bad request"}
+
+    @patch('server.client')
+    async def test_resolve_vehicle_not_found(self, mock_client_instance, mock_client):
+        """Test that a failed year/make/model lookup is passed through"""
+        mock_client_instance.vehicle.get_year_make_model_vhid.return_value = {"error": "Model not found"}
+
+        from server import resolve_vehicle
+        assert await resolve_vehicle(year=2020, make="Toyota", model="Nope") == {"error": "Model not found"}
+        assert await resolve_vehicle(make="Toyota") == {"error": "Provide either a VIN or year, make and model"}
+        mock_client_instance.vehicle.get_vehicle_by_vhid.assert_not_called()
+
+    @patch('server.client')
+    async def test_find_vehicle_candidates_indexes_year_on_demand(self, mock_client_instance, mock_client):
+        """Test fuzzy YMM lookup against a freshly indexed year"""
+        from ymm_index import YMMIndex
+        mock_client_instance.vehicle.get_years.return_value = [{"year": 2020, "vhid": "y2020"}]
+        mock_client_instance.vehicle.get_makes_by_vhid.return_value = [
+            {"name": "Chevrolet", "vhid": "m1"}, {"name": "Ford", "vhid": "m2"}
+        ]
+        mock_client_instance.vehicle.get_models_by_vhid.side_effect = lambda vhid: {
+            "m1": [{"name": "Silverado 1500", "vhid": "v1"}],
+            "m2": [{"name": "F-150", "vhid": "v2"}, {"name": "F-250", "vhid": "v3"}],
+        }[vhid]
+
+        with patch('server.ymm_index', YMMIndex()):
+            from server import find_vehicle_candidates
+            chevy = await find_vehicle_candidates(2020, "Chevy", "Silverado")
+            ford = await find_vehicle_candidates(2020, "Frod", "F150")
+
+        assert [c["vhid"] for c in chevy] == ["v1"]
+        assert ford[0] == {"year": 2020, "make": "Ford", "model": "F-150", "vhid": "v2", "score": 3}
+        mock_client_instance.vehicle.get_makes_by_vhid.assert_called_once_with("y2020")
+
+    @patch('server.client')
+    async def test_find_vehicle_candidates_survives_failed_save(self, mock_client_instance, mock_client):
+        """Test that a snapshot that cannot be written does not fail the lookup"""
+        from ymm_index import YMMIndex
+        mock_client_instance.vehicle.get_years.return_value = [{"year": 2020, "vhid": "y2020"}]
+        mock_client_instance.vehicle.get_makes_by_vhid.return_value = [{"name": "Ford", "vhid": "m2"}]
+        mock_client_instance.vehicle.get_models_by_vhid.return_value = [{"name": "F-150", "vhid": "v2"}]
+        index = YMMIndex()
+        index.save = Mock(side_effect=OSError("disk full"))
+
+        with patch('server.ymm_index', index):
+            from server import find_vehicle_candidates
+            result = await find_vehicle_candidates(2020, "Ford", "F150")
+
+        assert result[0]["vhid"] == "v2"
+        index.save.assert_called_once()
+
+    @patch('server.client')
+    async def test_find_vehicle_candidates_unknown_year(self, mock_client_instance, mock_client):
+        """Test lookup of a year the catalog does not have"""
+        from ymm_index import YMMIndex
+        mock_client_instance.vehicle.get_years.return_value = [{"year": 2020, "vhid": "y2020"}]
+
+        with patch('server.ymm_index', YMMIndex()):
+            from server import find_vehicle_candidates
+            result = await find_vehicle_candidates(1890, "Ford")
+
+        assert result == {"error": "Year not found"}
+
+    @patch('server.output_format', "csv")
+    @patch('server.tool_output_formats', {"resolve_vehicle": "compact"})
+    @patch('server.client')
+    async def test_warm_cache_ignores_output_format(self, mock_client_instance, mock_client):
+        """Test that the cache warmer checks resolved vehicles as dicts whatever format is configured"""
+        import warm_cache
+        mock_client_instance.vehicle.get_vehicles_by_vin.side_effect = lambda vin: (
+            [{"vhid": "v1"}] if vin == "GOOD" else [])
+        mock_client_instance.vehicle.get_vehicle_by_vhid.side_effect = Exception("error: upstream")
+        mock_client_instance.vehicle.get_engines_by_vhid.return_value = []
+        mock_client_instance.vehicle.get_drive_types_by_vhid.return_value = []
+        mock_client_instance.vehicle.get_submodels_by_vhid.return_value = []
+
+        assert await warm_cache.warm(["GOOD", "BAD"], 2) == 1
+
+    @patch('server.client')
+    async def test_vehicle_lookups_are_persisted(self, mock_client_instance, mock_client, vehicle_store):
+        """Test that vehicle lookups are served from the on-disk cache"""
+        mock_client_instance.vehicle.get_vehicle_by_vhid.return_value = {"id": 1, "year": 2020}
+
+        from server import get_vehicle_by_vhid
+        assert await get_vehicle_by_vhid("v1") == {"id": 1, "year": 2020}
+        assert await get_vehicle_by_vhid("v1") == {"id": 1, "year": 2020}
+
+        mock_client_instance.vehicle.get_vehicle_by_vhid.assert_called_once_with("v1")
+        assert vehicle_store.get("get_vehicle_by_vhid:v1") == {"id": 1, "year": 2020}
+
+    @patch('server.client')
+    async def test_empty_vin_results_are_not_persisted(self, mock_client_instance, mock_client, vehicle_store):
+        """Test that an unknown VIN is looked up again next time"""
+        mock_client_instance.vehicle.get_vehicles_by_vin.return_value = []
+
+        from server import get_vehicles_by_vin
+        await get_vehicles_by_vin("UNKNOWN")
+        await get_vehicles_by_vin("UNKNOWN")
+
+        assert mock_client_instance.vehicle.get_vehicles_by_vin.call_count == 2
+        assert vehicle_store.stats()["size"] == 0
+
+    @patch('server.client')
+    async def test_identical_concurrent_calls_are_coalesced(self, mock_client_instance, mock_client):
+        """Test that identical in-flight calls share one upstream request"""
+        import time
+
+        def slow_brands(vhid=None, phid=None):
+            time.sleep(0.05)
+            return [{"vhid": vhid, "phid": phid}]
+
+        mock_client_instance.product.get_brands.side_effect = slow_brands
+
+        from server import get_brands, singleflight
+        coalesced = singleflight.coalesced
+        results = await asyncio.gather(
+            get_brands(vhid="v1", phid="p1"),
+            get_brands(phid="p1", vhid="v1"),
+            get_brands(vhid="v1", phid="p1"),
+            get_brands(vhid="v2", phid="p1"),
+        )
+
+        assert results[:3] == [[{"vhid": "v1", "phid": "p1"}]] * 3
+        assert results[3] == [{"vhid": "v2", "phid": "p1"}]
+        assert mock_client_instance.product.get_brands.call_count == 2
+        assert singleflight.coalesced - coalesced == 2
+
+    @patch('server.client')
+    async def test_coalesced_calls_share_errors(self, mock_client_instance, mock_client):
+        """Test that every coalesced caller sees the upstream error"""
+        import time
+
+        def failing_categories(**kwargs):
+            time.sleep(0.05)
+            raise Exception("API Error")
+
+        mock_client_instance.product.get_categories.side_effect = failing_categories
+
+        from server import get_categories
+        results = await asyncio.gather(get_categories(vhid="v1"), get_categories(vhid="v1"))
+
+        assert results == [{"error": "API Error"}] * 2
+        mock_client_instance.product.get_categories.assert_called_once()
+
+    @patch('server.client')
+    async def test_list_tools_project_cached_responses(self, mock_client_instance, mock_client):
+        """Test that projection is applied per call on top of the cached list"""
+        mock_client_instance.vehicle.get_all_dtcs.return_value = [
+            {"code": "P0700", "description": "Transmission Control System"},
+            {"code": "P0300", "description": "Random Misfire"},
+        ]
+
+        from server import get_all_dtcs
+        page = await get_all_dtcs(fields=["code"], filter={"description": "misfire"})
+        full = await get_all_dtcs()
+
+        assert page == {"items": [{"code": "P0300"}], "total": 1, "offset": 0, "next_offset": None}
+        assert len(full) == 2
+        mock_client_instance.vehicle.get_all_dtcs.assert_called_once()
+
+    @patch('server.max_response_bytes', 100)
+    @patch('server.client')
+    async def test_large_list_is_paged(self, mock_client_instance, mock_client):
+        """Test that a list over the byte budget comes back as a page"""
+        mock_client_instance.customer.get_users.return_value = [{"id": n, "username": f"user{n}"} for n in range(20)]
+
+        from server import get_users
+        page = await get_users()
+
+        assert page["total"] == 20
+        assert 0 < len(page["items"]) < 20
+        assert page["next_offset"] == len(page["items"])
+
+    @patch('server.max_response_bytes', 2000)
+    @patch('server.client')
+    async def test_search_dtcs_pages_fit_the_size_budget(self, mock_client_instance, mock_client):
+        """Test that a huge limit still returns pages within the response size budget"""
+        mock_client_instance.vehicle.get_all_dtcs.return_value = [
+            {"code": f"P{n:04d}", "description": "Transmission fault"} for n in range(500)
+        ]
+
+        with patch('server.dtc_index', None):
+            from server import search_dtcs
+            first = await search_dtcs("", limit=100000)
+            second = await search_dtcs("", limit=100000, cursor=first["next_cursor"])
+
+        assert len(json.dumps(first["items"])) <= 2200
+        assert 0 < len(first["items"]) < 500
+        assert second["items"][0]["code"] == f"P{len(first['items']):04d}"
+
+    @patch('server.client')
+    async def test_invalid_paging_is_an_error(self, mock_client_instance, mock_client):
+        """Test that list tools reject a limit below 1 and a negative offset"""
+        mock_client_instance.vehicle.get_all_dtcs.return_value = [{"code": "P0700"}]
+
+        from server import get_all_dtcs
+        assert "limit" in (await get_all_dtcs(limit=0))["error"]
+        assert "offset" in (await get_all_dtcs(offset=-1))["error"]
+
+    @patch('server.client')
+    async def test_search_dtcs_pages_with_cursor(self, mock_client_instance, mock_client):
+        """Test that DTC search answers from the index and pages with cursors"""
+        mock_client_instance.vehicle.get_all_dtcs.return_value = [
+            {"code": f"P07{n:02d}", "description": "Transmission fault"} for n in range(5)
+        ]
+
+        with patch('server.dtc_index', None):
+            from server import get_dtc, search_dtcs
+            first = await search_dtcs("transmission", limit=3)
+            second = await search_dtcs("transmission", limit=3, cursor=first["next_cursor"])
+            dtc = await get_dtc("p0702")
+            missing = await get_dtc("P0999")
+            bad_cursor = await search_dtcs("P03", cursor=first["next_cursor"])
+
+        assert [d["code"] for d in first["items"]] == ["P0700", "P0701", "P0702"]
+        assert first["total"] == 5
+        assert [d["code"] for d in second["items"]] == ["P0703", "P0704"]
+        assert second["next_cursor"] is None
+        assert dtc == {"code": "P0702", "description": "Transmission fault"}
+        assert missing == {"error": "DTC P0999 not found"}
+        assert bad_cursor == {"error": "Cursor belongs to a different query"}
+        mock_client_instance.vehicle.get_all_dtcs.assert_called_once()
+
+
+class TestSessionCredentials:
+    """Test class for per-session credentials over HTTP"""
+
+    @pytest.fixture
+    def http_session(self):
+        """Run the test as an HTTP session sending its own credentials"""
+        from mcp.server.lowlevel.server import request_ctx
+        from mcp.shared.context import RequestContext
+
+        request = Mock()
+        request.headers = {"x-transend-api-key": "tenant-key", "x-transend-api-token": "tenant-token"}
+        token = request_ctx.set(RequestContext(request_id=1, meta=None, session=None,
+                                               lifespan_context=None, request=request))
+        yield request
+        request_ctx.reset(token)
+
+    @patch('server.client')
+    def test_default_credentials_use_shared_client(self, mock_client_instance):
+        """Test that stdio calls use the server's own client"""
+        from server import _client
+        assert _client() is mock_client_instance
+
+    @patch('server.client', None)
+    @patch('transend.client.TransendAPIClient')
+    def test_shared_client_built_on_first_use(self, mock_client_class):
+        """Test that the server's own client is built once, on the first call needing it"""
+        from server import _client, api_key, api_token, base_url
+        first = _client()
+
+        assert _client() is first
+        mock_client_class.assert_called_once_with(api_key, api_token, base_url)
+
+    def test_import_does_not_load_sdk(self):
+        """Test that importing the server leaves the SDK and requests unloaded until needed"""
+        import subprocess
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = "import server, sys; print(sorted(m for m in ('transend', 'requests') if m in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == "[]"
+
+    @patch('transend.client.TransendAPIClient')
+    def test_session_credentials_get_own_client(self, mock_client_class, http_session):
+        """Test that a session's credentials build and reuse a separate client and pool"""
+        import server
+        from tenants import TenantRegistry
+
+        with patch('server.tenants', TenantRegistry(server._new_tenant)) as registry:
+            first = server._client()
+            second = server._client()
+
+            assert first is second
+            assert first is not server.client
+            mock_client_class.assert_called_once_with("tenant-key", "tenant-token", server.base_url)
+            (tenant,) = registry.stats()["tenants"].values()
+            assert tenant["pool"]["maxsize"] == server.pool_maxsize
+            registry.clear()
+
+    @patch('server.client')
+    async def test_sessions_without_credentials_are_rejected(self, mock_client_instance, http_session):
+        """Test that HTTP sessions missing either header never act as the server's account"""
+        mock_client_instance.account.get_credit_cards.return_value = [{"id": 1}]
+
+        from server import get_credit_cards
+        for headers in ({}, {"x-transend-api-key": "tenant-key"}, {"x-transend-api-token": "tenant-token"}):
+            http_session.headers = headers
+            assert "X-Transend-Api-Key" in (await get_credit_cards())["error"]
+        mock_client_instance.account.get_credit_cards.assert_not_called()
+
+    @patch('server.allow_server_credentials', True)
+    @patch('server.client')
+    async def test_server_credentials_fallback_is_opt_in(self, mock_client_instance, http_session):
+        """Test that allowed sessions without headers use the server's account, but partial headers never do"""
+        mock_client_instance.account.get_credit_cards.return_value = [{"id": 1}]
+
+        from server import get_credit_cards
+        http_session.headers = {}
+        assert await get_credit_cards() == [{"id": 1}]
+        http_session.headers = {"x-transend-api-key": "tenant-key"}
+        assert "error" in await get_credit_cards()
+
+    @patch('server.client')
+    async def test_account_cache_is_per_session(self, mock_client_instance, http_session):
+        """Test that cached account data is not shared across credentials"""
+        from mcp.server.lowlevel.server import request_ctx
+        from tenants import TenantRegistry
+        import server
+
+        tenant_client = Mock()
+        tenant_client.account.get_customer_info.return_value = {"name": "Tenant"}
+        mock_client_instance.account.get_customer_info.return_value = {"name": "Default"}
+        registry = TenantRegistry(lambda credentials: (tenant_client, None))
+
+        with patch('server.tenants', registry):
+            assert await server.get_customer_info() == {"name": "Tenant"}
+            token = request_ctx.set(request_ctx.get().__class__(
+                request_id=2, meta=None, session=None, lifespan_context=None, request=None))
+            try:
+                assert await server.get_customer_info() == {"name": "Default"}
+            finally:
+                request_ctx.reset(token)
+            assert await server.get_customer_info() == {"name": "Tenant"}
+        tenant_client.account.get_customer_info.assert_called_once()
+
+    @patch('server.client')
+    async def test_evicted_tenant_loses_cached_account_data(self, mock_client_instance, http_session):
+        """Test that evicting a tenant drops its cached account data but not the server's"""
+        from tenants import TenantRegistry
+        import server
+
+        tenant_client = Mock()
+        tenant_client.account.get_customer_info.return_value = {"name": "Tenant"}
+        registry = TenantRegistry(lambda credentials: (tenant_client, None), on_evict=server._tenant_evicted)
+
+        with patch('server.tenants', registry):
+            await server.get_customer_info()
+            registry.clear()
+            await server.get_customer_info()
+
+        assert tenant_client.account.get_customer_info.call_count == 2
+
+    async def test_background_tasks_shared_by_sessions(self):
+        """Test that background tasks start with the first session and stop with the last"""
+        import server
+
+        started = 0
+
+        async def refresh():
+            nonlocal started
+            started += 1
+            await asyncio.sleep(3600)
+
+        with patch('server._refresh_ymm_index', refresh), patch('server.ymm_background_refresh', True):
+            async with server._lifespan(None):
+                async with server._lifespan(None):
+                    await asyncio.sleep(0)
+                    task = server.background_tasks[0]
+                assert not task.cancelled()
+            await asyncio.sleep(0)
+
+        assert started == 1
+        assert task.cancelled()
+        assert server.background_tasks == []
+
+
+class TestOutputFormats:
+    """Test class for compact tool output formats"""
+
+    @pytest.fixture
+    def session_format(self):
+        """Run the test as an HTTP session, acting as the server's account, asking for an output format"""
+        from mcp.server.lowlevel.server import request_ctx
+        from mcp.shared.context import RequestContext
+
+        request = Mock()
+        request.headers = {}
+        token = request_ctx.set(RequestContext(request_id=1, meta=None, session=None,
+                                               lifespan_context=None, request=request))
+        with patch('server.allow_server_credentials', True):
+            yield request.headers
+        request_ctx.reset(token)
+
+    @patch('server.client')
+    async def test_default_output_unchanged(self, mock_client_instance):
+        """Test that results stay Python values for FastMCP to serialize by default"""
+        mock_client_instance.product.get_all_tags.return_value = [{"id": 1, "name": "Tag 1"}]
+
+        from server import get_all_tags
+        assert await get_all_tags() == [{"id": 1, "name": "Tag 1"}]
+
+    @patch('server.tool_output_formats', {"get_all_tags": "columnar"})
+    @patch('server.client')
+    async def test_per_tool_format(self, mock_client_instance):
+        """Test that a tool configured for columnar output returns columns and rows"""
+        mock_client_instance.product.get_all_tags.return_value = [{"id": 1, "name": "Tag 1"}, {"id": 2, "name": "Tag 2"}]
+        mock_client_instance.product.get_all_sort_types.return_value = [{"id": 1}]
+
+        from server import get_all_sort_types, get_all_tags
+        assert json.loads(await get_all_tags()) == {"columns": ["id", "name"], "rows": [[1, "Tag 1"], [2, "Tag 2"]]}
+        assert await get_all_sort_types() == [{"id": 1}]
+
+    @patch('server.tool_output_formats', {"get_all_tags": "columnar"})
+    @patch('server.client')
+    async def test_session_format_overrides(self, mock_client_instance, session_format):
+        """Test that the session's header wins over the tool setting, and bad names are reported"""
+        mock_client_instance.product.get_all_tags.return_value = [{"id": 1, "name": "Tag 1"}]
+
+        from server import get_all_tags
+        session_format["x-transend-output-format"] = "csv"
+        assert await get_all_tags() == "id,name\n1,Tag 1\n"
+
+        session_format["x-transend-output-format"] = "xml"
+        assert "Unknown output format" in (await get_all_tags())["error"]
+
+    @patch('server.output_format', "compact")
+    @patch('server.client')
+    async def test_errors_keep_their_shape(self, mock_client_instance):
+        """Test that failures are returned as error dicts whatever the format"""
+        mock_client_instance.product.get_all_tags.side_effect = Exception("Timeout")
+
+        from server import get_all_tags
+        assert await get_all_tags() == {"error": "Timeout"}
+
+
+class TestCatalogResources:
+    """Test class for the catalog resources and their change notifications"""
+
+    @pytest.fixture(autouse=True)
+    def catalog_versions(self):
+        """Give every test fresh catalog versions"""
+        from catalogs import CatalogVersions
+        versions = CatalogVersions()
+        with patch('server.catalog_versions', versions):
+            yield versions
+
+    @pytest.fixture
+    def session(self):
+        """Run the test inside a request of a mock MCP session"""
+        from mcp.server.lowlevel.server import request_ctx
+        from mcp.shared.context import RequestContext
+
+        session = AsyncMock()
+        token = request_ctx.set(RequestContext(request_id=1, meta=None, session=session,
+                                               lifespan_context=None, request=None))
+        yield session
+        request_ctx.reset(token)
+
+    @patch('server.client')
+    async def test_read_catalog_with_etag(self, mock_client_instance, catalog_versions):
+        """Test that a catalog resource serves the cached catalog with its ETag in _meta"""
+        mock_client_instance.product.get_all_tags.return_value = [{"id": 1, "name": "Tag 1"}]
+
+        from server import catalog_index, get_all_tags, mcp
+        contents = list(await mcp.read_resource("transend://catalog/tags"))
+        await get_all_tags()
+
+        assert json.loads(contents[0].content) == [{"id": 1, "name": "Tag 1"}]
+        assert contents[0].meta["etag"] == catalog_versions.version("transend://catalog/tags")["etag"]
+        assert catalog_index()["catalogs"]["transend://catalog/tags"]["count"] == 1
+        mock_client_instance.product.get_all_tags.assert_called_once()
+
+    @patch('server.client')
+    async def test_changed_catalog_notifies_sessions(self, mock_client_instance, session):
+        """Test that a refresh with new content notifies subscribers and readers, and an unchanged one nobody"""
+        from cache import make_key
+        from server import _refresh, mcp, notifying, subscribe_catalog
+        mock_client_instance.product.get_all_tags.return_value = [{"id": 1}]
+        mock_client_instance.product.get_all_sort_types.return_value = [{"id": 1}]
+        await mcp.read_resource("transend://catalog/sort_types")
+        await subscribe_catalog(AnyUrl("transend://catalog/tags"))
+
+        tags = mock_client_instance.product.get_all_tags
+        await _refresh(make_key("get_all_tags"), "get_all_tags", tags)
+        await _refresh(make_key("get_all_tags"), "get_all_tags", tags)
+        assert not notifying
+        session.send_resource_updated.assert_not_called()
+
+        tags.return_value = [{"id": 1}, {"id": 2}]
+        await _refresh(make_key("get_all_tags"), "get_all_tags", tags)
+        await asyncio.gather(*notifying)
+        session.send_resource_updated.assert_awaited_once_with(AnyUrl("transend://catalog/tags"))
+        session.send_resource_list_changed.assert_awaited_once()
+
+        mock_client_instance.product.get_all_sort_types.return_value = [{"id": 2}]
+        await _refresh(make_key("get_all_sort_types"), "get_all_sort_types", mock_client_instance.product.get_all_sort_types)
+        await asyncio.gather(*notifying)
+        session.send_resource_updated.assert_awaited_once()
+        assert session.send_resource_list_changed.await_count == 2
+
+    @patch('server.client')
+    async def test_notifications_do_not_hold_up_the_caller(self, mock_client_instance, session, catalog_versions):
+        """Test that a changed catalog is returned before slow sessions are notified, and failing ones are forgotten"""
+        from cache import make_key
+        from server import _refresh, get_all_tags, notifying
+        tags = mock_client_instance.product.get_all_tags
+        tags.return_value = [{"id": 1}]
+        await get_all_tags()
+        slow, broken = AsyncMock(), AsyncMock()
+
+        async def slow_send():
+            await asyncio.sleep(0.5)
+
+        slow.send_resource_list_changed.side_effect = slow_send
+        broken.send_resource_list_changed.side_effect = ConnectionError("gone")
+        catalog_versions.read_by(slow)
+        catalog_versions.read_by(broken)
+
+        tags.return_value = [{"id": 1}, {"id": 2}]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await _refresh(make_key("get_all_tags"), "get_all_tags", tags)
+        assert loop.time() - started < 0.1
+
+        await asyncio.gather(*notifying)
+        assert catalog_versions.readers() == [slow]
+        assert catalog_versions.notifications == 1
+
+    async def test_only_catalogs_can_be_subscribed(self, session):
+        """Test that subscribing to other resources is refused, and subscriptions are advertised"""
+        from server import mcp, subscribe_catalog
+        with pytest.raises(ValueError):
+            await subscribe_catalog(AnyUrl("transend://metrics"))
+
+        capabilities = mcp._mcp_server.create_initialization_options().capabilities.resources
+        assert capabilities.subscribe and capabilities.listChanged
+
+    @patch('server.key_hits', Counter())
+    @patch('server.refresh_calls', {})
+    @patch('server.prefetch_tools', [])
+    @patch('server.prefetch_hot_keys', 0)
+    @patch('server.client')
+    async def test_prefetch_refreshes_subscribed_catalogs(self, mock_client_instance, session):
+        """Test that the prefetcher keeps catalogs with subscribers loaded"""
+        from cache import MISSING, make_key
+        from server import _prefetch_once, response_cache, subscribe_catalog
+        mock_client_instance.vehicle.get_all_dtcs.return_value = [{"code": "P0700"}]
+
+        await _prefetch_once()
+        assert response_cache.get(make_key("get_all_dtcs")) is MISSING
+
+        await subscribe_catalog(AnyUrl("transend://catalog/dtcs"))
+        await _prefetch_once()
+        assert response_cache.get(make_key("get_all_dtcs")) == [{"code": "P0700"}]
@@ -0,0 +1,88 @@
+"""Tests for the per-credential tenant registry"""
+
+import os
+import sys
+from unittest.mock import Mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tenants import TenantRegistry, tenant_id
+from tests.conftest import FakeClock
+
+
+def make_registry(clock=None, **kwargs):
+    """Registry whose factory builds a mock client and pool per credential set"""
+    built = []
+
+    def factory(credentials):
+        client, pool = Mock(name=f"client-{credentials[0]}"), Mock(name=f"pool-{credentials[0]}")
+        built.append((credentials, client, pool))
+        return client, pool
+    return TenantRegistry(factory, clock=clock or FakeClock(), **kwargs), built
+
+
+class TestTenantRegistry:
+    """Test class for TenantRegistry"""
+
+    def test_client_built_once_per_credentials(self):
+        """Test that each credential set gets one client, reused on later lookups"""
+        registry, built = make_registry()
+
+        first = registry.get(("a", "1"))
+        assert registry.get(("a", "1")) is first
+        assert registry.get(("b", "2")) is not first
+        assert len(built) == 2
+        assert registry.stats()["hits"] == 1
+        assert registry.stats()["misses"] == 2
+
+    def test_least_recently_used_tenant_evicted(self):
+        """Test that the tenant unused the longest is evicted past max_tenants"""
+        evicted = []
+        registry, built = make_registry(max_tenants=2, on_evict=evicted.append)
+
+        registry.get(("a", "1"))
+        registry.get(("b", "2"))
+        registry.get(("a", "1"))
+        registry.get(("c", "3"))
+
+        assert ("a", "1") in registry
+        assert ("b", "2") not in registry
+        assert evicted == [tenant_id(("b", "2"))]
+        built[1][2].close.assert_called_once()
+        built[0][2].close.assert_not_called()
+
+    def test_idle_tenants_evicted(self):
+        """Test that tenants idle past the timeout are evicted on the next lookup"""
+        clock = FakeClock()
+        registry, built = make_registry(clock, idle_timeout=60)
+
+        registry.get(("a", "1"))
+        clock.now = 30
+        registry.get(("b", "2"))
+        clock.now = 70
+        registry.get(("b", "2"))
+
+        assert ("a", "1") not in registry
+        assert ("b", "2") in registry
+        assert registry.stats()["evictions"] == 1
+
+    def test_evicted_tenant_rebuilt(self):
+        """Test that a lookup after eviction builds a fresh client"""
+        registry, built = make_registry()
+
+        first = registry.get(("a", "1"))
+        registry.clear()
+
+        assert registry.get(("a", "1")) is not first
+        assert len(built) == 2
+
+    def test_stats_hide_credentials(self):
+        """Test that stats key tenants by hashed id, most recently used first"""
+        registry = TenantRegistry(lambda credentials: (Mock(), None), clock=FakeClock())
+        registry.get(("secret-key", "secret-token"))
+        registry.get(("other-key", "other-token"))
+
+        stats = registry.stats()
+        assert list(stats["tenants"]) == [tenant_id(("other-key", "other-token")),
+                                          tenant_id(("secret-key", "secret-token"))]
+        assert "secret" not in str(stats)
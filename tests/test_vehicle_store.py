@@ -0,0 +1,76 @@
+"""Tests for the persistent on-disk vehicle cache"""
+
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import MISSING
+from vehicle_store import PersistentCache
+
+
+class TestPersistentCache:
+    """Test class for PersistentCache"""
+
+    def test_round_trip(self):
+        """Test storing and reading a JSON value"""
+        store = PersistentCache(":memory:")
+        store.set("get_vehicle_by_vhid:v1", {"id": 1, "trims": ["LE", "SE"]})
+
+        assert store.get("get_vehicle_by_vhid:v1") == {"id": 1, "trims": ["LE", "SE"]}
+        assert store.get("get_vehicle_by_vhid:v2") is MISSING
+        assert store.stats()["hits"] == 1
+        assert store.stats()["misses"] == 1
+
+    def test_survives_reopen(self, tmp_path):
+        """Test that entries outlive the process that wrote them"""
+        path = str(tmp_path / "cache" / "vehicles.sqlite3")
+        PersistentCache(path).set("get_vehicles_by_vin:VIN1", [{"vhid": "v1"}])
+
+        assert PersistentCache(path).get("get_vehicles_by_vin:VIN1") == [{"vhid": "v1"}]
+
+    def test_lru_eviction(self):
+        """Test that the least recently read entries are evicted first"""
+        store = PersistentCache(":memory:", max_entries=3, eviction="lru")
+        with patch("vehicle_store.time.time", side_effect=range(100)):
+            store.set("a", 1)
+            store.set("b", 2)
+            store.set("c", 3)
+            store.get("a")
+            store.set("d", 4)
+
+        # Eviction drops a tenth of the capacity (at least one entry) below the cap.
+        assert store.get("b") is MISSING
+        assert store.get("c") is MISSING
+        assert store.get("a") == 1
+        assert store.get("d") == 4
+        assert store.stats()["evictions"] == 2
+
+    def test_fifo_eviction(self):
+        """Test that the oldest written entries are evicted first"""
+        store = PersistentCache(":memory:", max_entries=3, eviction="fifo")
+        with patch("vehicle_store.time.time", side_effect=range(100)):
+            store.set("a", 1)
+            store.set("b", 2)
+            store.set("c", 3)
+            store.get("a")
+            store.set("d", 4)
+
+        assert store.get("a") is MISSING
+        assert store.get("b") is MISSING
+        assert store.get("c") == 3
+
+    def test_max_age(self):
+        """Test that entries older than max_age are treated as missing"""
+        store = PersistentCache(":memory:", max_age=10)
+        with patch("vehicle_store.time.time", return_value=100):
+            store.set("a", 1)
+        with patch("vehicle_store.time.time", return_value=110):
+            assert store.get("a") is MISSING
+
+    def test_unknown_eviction_policy(self):
+        """Test that an unknown eviction policy is rejected"""
+        with pytest.raises(ValueError):
+            PersistentCache(":memory:", eviction="random")
@@ -0,0 +1,108 @@
+"""Tests for the local year/make/model index"""
+
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ymm_index import YMMIndex, edit_distance, match_score, normalize
+
+
+@pytest.fixture
+def index():
+    """An index with one year of makes and models"""
+    index = YMMIndex()
+    index.update_year(2021, "y2021", [
+        {"name": "Chevrolet", "vhid": "m1", "models": [
+            {"name": "Silverado 1500", "vhid": "v1"},
+            {"name": "Camaro", "vhid": "v2"},
+        ]},
+        {"name": "Ford", "vhid": "m2", "models": [
+            {"name": "F-150", "vhid": "v3"},
+            {"name": "Focus", "vhid": "v4"},
+        ]},
+    ])
+    return index
+
+
+class TestMatching:
+    """Test class for name normalization and scoring"""
+
+    def test_normalize(self):
+        """Test punctuation, case and alias folding"""
+        assert normalize("F-150") == normalize("f150") == normalize("F 150") == "f150"
+        assert normalize("Chevy") == normalize("Chevrolet") == "chevrolet"
+
+    def test_edit_distance(self):
+        """Test Levenshtein distance"""
+        assert edit_distance("kitten", "sitting") == 3
+        assert edit_distance("", "abc") == 3
+        assert edit_distance("ford", "ford") == 0
+        assert edit_distance("frod", "ford") == 1
+
+    def test_match_score(self):
+        """Test exact, prefix, fuzzy and non-matching scores"""
+        assert match_score("ford", "ford") == 0
+        assert match_score("sil", "silverado1500") == 1
+        assert match_score("frod", "ford") == 3
+        assert match_score("toyota", "ford") is None
+
+
+class TestYMMIndex:
+    """Test class for YMMIndex"""
+
+    def test_lookup_exact(self, index):
+        """Test exact make and model lookup"""
+        assert index.lookup(2021, "Ford", "F-150") == [
+            {"year": 2021, "make": "Ford", "model": "F-150", "vhid": "v3", "score": 0}
+        ]
+
+    def test_lookup_ranks_prefix_matches(self, index):
+        """Test that a make-only query lists its models"""
+        result = index.lookup(2021, "Chevy")
+        assert [c["vhid"] for c in result] == ["v2", "v1"]
+
+    def test_lookup_unknown_year(self, index):
+        """Test lookup of a year that is not indexed"""
+        assert index.lookup(1999, "Ford", "F-150") == []
+
+    def test_update_year_replaces_entries(self, index):
+        """Test that refreshing a year drops models that disappeared"""
+        index.lookup(2021, "Ford")
+        index.update_year(2021, "y2021", [{"name": "Ford", "vhid": "m2", "models": []}])
+        assert index.lookup(2021, "Ford") == []
+
+    def test_snapshot_round_trip(self, index, tmp_path):
+        """Test saving and loading a snapshot"""
+        index.path = str(tmp_path / "ymm" / "index.json")
+        index.save()
+
+        loaded = YMMIndex.load(index.path)
+        assert loaded.lookup(2021, "ford", "f150")[0]["vhid"] == "v3"
+        assert loaded.age(2021) < 60
+        assert loaded.age(2020) == float("inf")
+
+    def test_load_missing_snapshot(self, tmp_path):
+        """Test that a missing snapshot yields an empty index"""
+        assert YMMIndex.load(str(tmp_path / "missing.json")).years == {}
+
+    def test_concurrent_saves_and_updates(self, index, tmp_path):
+        """Test that saves from several threads while years are updated always leave a complete snapshot"""
+        index.path = str(tmp_path / "index.json")
+        makes = [{"name": f"Make {n}", "vhid": f"m{n}", "models": [{"name": "Model", "vhid": f"v{n}"}]}
+                 for n in range(50)]
+
+        def update():
+            for year in range(1950, 2000):
+                index.update_year(year, f"y{year}", makes)
+
+        with ThreadPoolExecutor(max_workers=4) as workers:
+            futures = [workers.submit(update)] + [workers.submit(index.save) for _ in range(20)]
+            for future in futures:
+                future.result()
+        index.save()
+
+        assert len(YMMIndex.load(index.path).years) == 51
+        assert os.listdir(tmp_path) == ["index.json"]
@@ -0,0 +1,120 @@
+from typing import Any, Dict, Optional
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cache import MISSING
+
+EVICTION_POLICIES = ("lru", "fifo")
+
+
+class PersistentCache:
+    """
+    Size-capped key/value cache stored in SQLite so it survives restarts.
+
+    Values are JSON documents. When the cache grows past max_entries, the
+    oldest tenth of the entries is dropped, ordered by last access ("lru")
+    or by insertion ("fifo").
+    """
+
+    def __init__(self, path: str, max_entries: int = 50000, eviction: str = "lru", max_age: float = 0):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"eviction must be one of {EVICTION_POLICIES}, got {eviction!r}")
+        self.path = path
+        self.max_entries = max_entries
+        self.eviction = eviction
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the database on first use so importing the server stays cheap."""
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
+        return self._conn
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        """
+        Look up an entry and record the access.
+
+        Args:
+            key: The cache key
+            default: Value returned when the key is missing or expired
+
+        Returns:
+            The cached value or default
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.max_age and row[1] + self.max_age <= now):
+                self.misses += 1
+                return default
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store an entry, evicting old entries when the cache is full.
+
+        Args:
+            key: The cache key
+            value: A JSON-serializable value
+        """
+        now = time.time()
+        payload = json.dumps(value, separators=(",", ":"), default=str)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                order = "accessed" if self.eviction == "lru" else "created"
+                excess = count - self.max_entries + max(1, self.max_entries // 10)
+                conn.execute(
+                    f"DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY {order} LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._connection().execute("DELETE FROM entries")
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            Size, capacity, eviction policy, hits, misses and evictions
+        """
+        with self._lock:
+            size = self._connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "eviction": self.eviction,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,58 @@
+"""Warm the on-disk vehicle cache from a list of VINs.
+
+Usage:
+
+    uv run warm_cache.py vins.txt
+    cat vins.txt | uv run warm_cache.py -
+"""
+
+import argparse
+import asyncio
+import sys
+
+import server
+
+
+async def warm(vins, concurrency: int) -> int:
+    """
+    Resolve every VIN so its vehicle data lands in the on-disk cache.
+
+    Args:
+        vins: The VINs to resolve
+        concurrency: Maximum number of VINs resolved at once
+
+    Returns:
+        Number of VINs that failed to resolve
+    """
+    # Results are checked as dicts, whatever output format is configured
+    server.output_format = "json"
+    server.tool_output_formats.pop("resolve_vehicle", None)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm_one(vin):
+        async with semaphore:
+            result = await server.resolve_vehicle(vin=vin)
+        if "error" in result:
+            print(f"{vin}: {result['error']}", file=sys.stderr)
+            return False
+        return True
+
+    results = await asyncio.gather(*(warm_one(vin) for vin in vins))
+    return results.count(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("vins", type=argparse.FileType("r"), help="File with one VIN per line, or - for stdin")
+    parser.add_argument("--concurrency", type=int, default=server.bulk_concurrency,
+                        help="Maximum number of VINs resolved at once")
+    args = parser.parse_args()
+
+    vins = list(dict.fromkeys(line.strip() for line in args.vins if line.strip()))
+    failed = asyncio.run(warm(vins, args.concurrency))
+    print(f"Warmed {len(vins) - failed} of {len(vins)} VINs; cache stats: {server.vehicle_store.stats()}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+from typing import Any, Dict, List, Optional
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+# Common shorthand mapped to the normalized catalog spelling.
+ALIASES = {
+    "chevy": "chevrolet",
+    "vw": "volkswagen",
+    "mercedes": "mercedesbenz",
+    "benz": "mercedesbenz",
+    "caddy": "cadillac",
+    "olds": "oldsmobile",
+}
+
+
+def normalize(name: Any) -> str:
+    """
+    Normalize a make or model name for matching.
+
+    Lowercases and drops everything but letters and digits, so "F-150",
+    "f150" and "F 150" all compare equal.
+
+    Args:
+        name: The raw name
+
+    Returns:
+        The normalized name
+    """
+    key = re.sub(r"[^a-z0-9]", "", str(name).lower())
+    return ALIASES.get(key, key)
+
+
+def edit_distance(a: str, b: str) -> int:
+    """
+    Edit distance between two strings, counting adjacent swaps as one edit.
+
+    Args:
+        a: First string
+        b: Second string
+
+    Returns:
+        Minimum number of insertions, deletions, substitutions and
+        transpositions turning a into b
+    """
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        before, previous = previous, current
+    return previous[-1]
+
+
+def match_score(query: str, candidate: str, fuzzy: bool = True, reverse_prefix: bool = True) -> Optional[int]:
+    """
+    Score how well a normalized candidate matches a normalized query.
+
+    Args:
+        query: The normalized query
+        candidate: The normalized candidate
+        fuzzy: Whether to fall back to edit distance
+        reverse_prefix: Whether a candidate the query starts with is a
+            prefix match too, rather than only a candidate starting with it
+
+    Returns:
+        0 for an exact match, 1 for a prefix match, 2 plus the edit distance
+        for a close misspelling, or None when the candidate does not match
+    """
+    if not query:
+        return 1
+    if query == candidate:
+        return 0
+    if candidate.startswith(query) or (reverse_prefix and query.startswith(candidate)):
+        return 1
+    max_distance = max(1, len(query) // 3)
+    if not fuzzy or abs(len(query) - len(candidate)) > max_distance:
+        return None
+    distance = edit_distance(query, candidate)
+    if distance <= max_distance:
+        return 2 + distance
+    return None
+
+
+class YMMIndex:
+    """
+    In-memory year -> make -> model -> vhid index with a JSON snapshot on disk.
+
+    Each year is refreshed independently, so the index can be rebuilt
+    incrementally and serve lookups while it is still being filled in.
+    Years are replaced whole, never changed in place, so save() can write
+    a snapshot from a worker thread while years are being updated.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.years: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # Normalized names per year, built on first lookup of that year.
+        self._normalized: Dict[str, List[tuple]] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "YMMIndex":
+        """
+        Load an index snapshot, or start empty when none exists.
+
+        Args:
+            path: Snapshot file path
+
+        Returns:
+            The loaded index
+        """
+        index = cls(path)
+        try:
+            with open(path) as f:
+                index.years = json.load(f)["years"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return index
+
+    def save(self) -> None:
+        """Write the snapshot atomically, if the index has a path."""
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # One save at a time, so an older snapshot never replaces a newer one
+        with self._save_lock:
+            with self._lock:
+                years = dict(self.years)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"years": years}, f, separators=(",", ":"))
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def update_year(self, year: Any, vhid: str, makes: List[Dict[str, Any]]) -> None:
+        """
+        Replace the makes and models of one year.
+
+        Args:
+            year: The vehicle year
+            vhid: The year's vhid
+            makes: List of {"name", "vhid", "models": [{"name", "vhid"}]}
+        """
+        entry = {
+            "vhid": vhid,
+            "refreshed": time.time(),
+            "makes": {
+                make["name"]: {
+                    "vhid": make["vhid"],
+                    "models": {model["name"]: model["vhid"] for model in make["models"]},
+                }
+                for make in makes
+            },
+        }
+        with self._lock:
+            self.years[str(year)] = entry
+        self._normalized.pop(str(year), None)
+
+    def _entries(self, year: str) -> List[tuple]:
+        """
+        Get the pre-normalized makes and models of an indexed year.
+
+        Args:
+            year: The vehicle year
+
+        Returns:
+            List of (normalized make, make, [(normalized model, model, vhid)])
+        """
+        if year not in self._normalized:
+            self._normalized[year] = [
+                (normalize(make_name), make_name,
+                 [(normalize(model_name), model_name, vhid) for model_name, vhid in make_entry["models"].items()])
+                for make_name, make_entry in self.years[year]["makes"].items()
+            ]
+        return self._normalized[year]
+
+    def age(self, year: Any) -> float:
+        """
+        Seconds since a year was last refreshed.
+
+        Args:
+            year: The vehicle year
+
+        Returns:
+            Age in seconds, or infinity when the year is not indexed
+        """
+        entry = self.years.get(str(year))
+        return time.time() - entry["refreshed"] if entry else float("inf")
+
+    def lookup(self, year: Any, make: str, model: str = "", limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Find the best matching vehicles for a possibly misspelled make and model.
+
+        Args:
+            year: The vehicle year
+            make: The make, matched exactly, by prefix or by edit distance
+            model: Optional model, matched the same way
+            limit: Maximum number of candidates
+
+        Returns:
+            Candidates ordered best first, each with year, make, model, vhid and score
+        """
+        if str(year) not in self.years:
+            return []
+        make_query, model_query = normalize(make), normalize(model)
+        # Exact and prefix matches are cheap; only pay for edit distances
+        # when they do not fill the result.
+        candidates = self._match(str(year), make_query, model_query, fuzzy=False)
+        if len(candidates) < limit:
+            candidates = self._match(str(year), make_query, model_query, fuzzy=True)
+        candidates.sort(key=lambda c: (c["score"], c["make"], c["model"]))
+        return candidates[:limit]
+
+    def _match(self, year: str, make_query: str, model_query: str, fuzzy: bool) -> List[Dict[str, Any]]:
+        """
+        Collect every vehicle of a year matching normalized make and model queries.
+
+        Args:
+            year: The vehicle year
+            make_query: The normalized make
+            model_query: The normalized model
+            fuzzy: Whether to accept edit-distance matches
+
+        Returns:
+            Unordered scored candidates
+        """
+        candidates = []
+        for make_key, make_name, models in self._entries(year):
+            make_score = match_score(make_query, make_key, fuzzy)
+            if make_score is None:
+                continue
+            for model_key, model_name, vhid in models:
+                model_score = match_score(model_query, model_key, fuzzy)
+                if model_score is None:
+                    continue
+                candidates.append({
+                    "year": int(year),
+                    "make": make_name,
+                    "model": model_name,
+                    "vhid": vhid,
+                    "score": make_score + model_score,
+                })
+        return candidates